@@ -33,6 +33,7 @@ reference
 _xy_callback = """\
 xy_callback
     Custom callback applied to the linear term as pre-processing step. Examples are given in TODO Link Notebook.
+    Use ``'shared-pca'`` to embed the cells of all pairs with one PCA, which is fitted once and cached.
 """
 _xy_callback_kwargs = """\
 xy_callback_kwargs
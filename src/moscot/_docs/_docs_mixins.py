@@ -49,6 +49,11 @@ batch_size
     Number of data points the matrix-vector products are applied to at the same time. The larger, the more memory
     is required.
 """
+_memmap_path = """\
+memmap_path
+    Only used when ``aggregation_mode = 'cell'``. If not `None`, stream the cell-level transition matrix into
+    a memory-mapped :mod:`numpy` file at this path instead of keeping it in memory.
+"""
 _key_added_plotting = """\
 key_added
     Key in :attr:`anndata.AnnData.uns` and/or :attr:`anndata.AnnData.obs` where the results
@@ -148,7 +153,7 @@ intermediate
 """
 _seed_sampling = """\
 seed
-    Random seed for sampling from the transport matrix.
+    Random seed for sampling from the transport matrix. If a :func:`jax.random.PRNGKey`, sample on the device.
 """
 _interpolation_parameter = """\
 interpolation_parameter
@@ -190,6 +195,7 @@ d_mixins = DocstringProcessor(
     other_key=_other_key,
     other_adata=_other_adata,
     ott_jax_batch_size=_ott_jax_batch_size,
+    memmap_path=_memmap_path,
     key_added_plotting=_key_added_plotting,
     return_cell_transition=_return_cell_transition,
     notes_cell_transition=_notes_cell_transition,
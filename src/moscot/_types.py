@@ -26,6 +26,7 @@ QuadInitializer_t = Optional[LRInitializer_t]
 Initializer_t = Union[SinkhornInitializer_t, LRInitializer_t]
 ProblemStage_t = Literal["initialized", "prepared", "solved"]
 Device_t = Literal["cpu", "gpu", "tpu"]
+Executor_t = Literal["thread", "process", "vmap"]  # how to solve independent subproblems
 
 # TODO(michalk8): autogenerate from the enums
 ScaleCost_t = Optional[Union[float, Literal["mean", "max_cost", "max_bound", "max_norm", "median"]]]
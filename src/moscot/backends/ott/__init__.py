@@ -1,5 +1,11 @@
 from ott.geometry import costs
 
+from moscot.backends.ott._jit_cache import (
+    CompilationCacheInfo,
+    clear_compilation_cache,
+    enable_persistent_compilation_cache,
+    get_compilation_cache_info,
+)
 from moscot.backends.ott.output import (
     ConditionalDualPotentials,
     CondNeuralDualOutput,
@@ -15,7 +21,7 @@ from moscot.backends.ott.solver import (
 )
 from moscot.costs import register_cost
 
-__all__ = ["OTTOutput", "NeuralDualOutput", "GWSolver", "SinkhornSolver", "OTTNeuralDualSolver", "OTTNeuralDualSolver", "CondNeuralDualSolver", "MongeGapSolver"]
+__all__ = ["OTTOutput", "NeuralDualOutput", "GWSolver", "SinkhornSolver", "OTTNeuralDualSolver", "OTTNeuralDualSolver", "CondNeuralDualSolver", "MongeGapSolver", "CompilationCacheInfo", "get_compilation_cache_info", "clear_compilation_cache", "enable_persistent_compilation_cache"]
 
 register_cost("euclidean", backend="ott")(costs.Euclidean)
 register_cost("sq_euclidean", backend="ott")(costs.SqEuclidean)
@@ -0,0 +1,180 @@
+import threading
+import types
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Mapping, NamedTuple, Optional, Tuple
+
+import jax
+import numpy as np
+from jax.api_util import shaped_abstractify
+
+from moscot._logging import logger
+from moscot._types import PathLike
+
+__all__ = [
+    "CompilationCacheInfo",
+    "get_compilation_cache_info",
+    "clear_compilation_cache",
+    "enable_persistent_compilation_cache",
+]
+
+
+class CompilationCacheInfo(NamedTuple):
+    """Statistics of the compiled solver cache."""
+
+    hits: int
+    misses: int
+    size: int
+
+
+def _config_key(obj: Any) -> Hashable:
+    """Hashable key of a solver's hyperparameters.
+
+    Unlike :func:`repr`, the key does not depend on how the objects are printed: containers are converted
+    recursively, arrays by their contents, other objects by their type and attributes, and functions and classes
+    are compared by identity.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        # the type distinguishes, e.g., `1`, `1.0` and `True`
+        return type(obj).__qualname__, obj
+    if isinstance(obj, Mapping):
+        return "mapping", tuple(sorted(((repr(k), _config_key(v)) for k, v in obj.items()), key=lambda kv: kv[0]))
+    if isinstance(obj, (list, tuple)):
+        return type(obj).__qualname__, tuple(_config_key(v) for v in obj)
+    if isinstance(obj, (np.ndarray, np.generic, jax.Array)):
+        arr = np.asarray(obj)
+        return "array", arr.dtype.str, arr.shape, arr.tobytes()
+    if isinstance(obj, (type, types.FunctionType, types.BuiltinFunctionType, types.MethodType)):
+        # the object itself is kept in the key, so its identity can't be reused by another object
+        return "callable", obj
+    if hasattr(obj, "__dict__"):
+        return type(obj), _config_key(vars(obj))
+    try:
+        hash(obj)
+    except TypeError:
+        return type(obj), repr(obj)
+    return type(obj), obj
+
+
+class _CompiledSolverCache:
+    """Cache of compiled solvers shared across :class:`~moscot.backends.ott.solver.OTTJaxSolver` instances.
+
+    The executables are keyed by the solver's configuration and the abstract signature (pytree structure,
+    shapes, dtypes) of the problem, so that problems differing only in their values reuse the same executable.
+    At most ``maxsize`` executables are kept, the least recently used ones are discarded first.
+    """
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self._cache: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._maxsize = maxsize
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, config: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` using a compiled executable.
+
+        Parameters
+        ----------
+        config
+            Hashable configuration of ``fn``, e.g., of the solver it closes over.
+        fn
+            Function to compile.
+        args
+            Positional arguments of ``fn``.
+
+        Returns
+        -------
+        The output of ``fn(*args)``.
+        """
+        key = (config, self._signature(*args))
+        with self._lock:
+            compiled = self._cache.get(key, None)
+            if compiled is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._cache.move_to_end(key)
+
+        if compiled is None:
+            compiled = jax.jit(fn).lower(*args).compile()
+            with self._lock:
+                self._cache[key] = compiled
+                while len(self._cache) > self._maxsize:
+                    self._cache.popitem(last=False)
+
+        try:
+            return compiled(*args)
+        except TypeError as e:  # the signature did not capture some difference in the inputs
+            logger.debug(f"Unable to reuse the compiled solver, recompiling. Reason: `{e}`.")
+            with self._lock:
+                self._cache.pop(key, None)
+            return jax.jit(fn)(*args)
+
+    @staticmethod
+    def _signature(*args: Any) -> Tuple[str, Tuple[str, ...]]:
+        leaves, treedef = jax.tree_util.tree_flatten(args)
+        return str(treedef), tuple(str(shaped_abstractify(leaf)) for leaf in leaves)
+
+    def clear(self) -> None:
+        """Remove all executables and reset the statistics."""
+        with self._lock:
+            self._cache.clear()
+            self._hits = self._misses = 0
+
+    @property
+    def info(self) -> CompilationCacheInfo:
+        """Cache statistics."""
+        with self._lock:
+            return CompilationCacheInfo(hits=self._hits, misses=self._misses, size=len(self._cache))
+
+
+_COMPILED_SOLVERS = _CompiledSolverCache()
+
+
+def get_compilation_cache_info() -> CompilationCacheInfo:
+    """Get the statistics of the compiled solver cache.
+
+    Returns
+    -------
+    The number of cache hits, cache misses and the number of cached executables.
+    """
+    return _COMPILED_SOLVERS.info
+
+
+def clear_compilation_cache() -> None:
+    """Clear the compiled solver cache.
+
+    Returns
+    -------
+    Nothing, just removes all executables and resets the statistics.
+    """
+    _COMPILED_SOLVERS.clear()
+
+
+def enable_persistent_compilation_cache(path: PathLike, min_compile_time_secs: Optional[float] = None) -> None:
+    """Persist compiled executables in a :mod:`jax` compilation cache on disk.
+
+    This allows reusing the executables across sessions.
+
+    Parameters
+    ----------
+    path
+        Directory where to store the executables.
+    min_compile_time_secs
+        Only persist executables whose compilation took at least this many seconds.
+        If `None`, use :mod:`jax`'s default.
+
+    Returns
+    -------
+    Nothing, just updates the :mod:`jax` configuration.
+    """
+    path = str(path)
+    try:
+        jax.config.update("jax_compilation_cache_dir", path)
+    except (AttributeError, KeyError):  # older `jax` versions
+        from jax.experimental.compilation_cache import compilation_cache as cc
+
+        cc.initialize_cache(path)
+    if min_compile_time_secs is not None:
+        jax.config.update("jax_persistent_cache_min_compile_time_secs", min_compile_time_secs)
+    logger.info(f"Persisting compiled solvers in `{path}`.")
@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Sequence, Tuple
 
 from flax.training.train_state import TrainState
 import optax
+import numpy as np
 import jax
 import jax.numpy as jnp
 import jax.tree_util as jtu
@@ -12,7 +13,7 @@ from ott.geometry import costs
 from ott.geometry.pointcloud import PointCloud
 from ott.problems.linear.potentials import DualPotentials
 from ott.tools.sinkhorn_divergence import sinkhorn_divergence
-from ott.solvers.linear import sinkhorn
+from ott.solvers.linear import acceleration, sinkhorn
 from ott.problems.linear import linear_problem
 from moscot.backends.ott._icnn import ICNN
 from moscot._logging import logger
@@ -69,6 +70,92 @@ def _compute_sinkhorn_divergence(
     return float(output.divergence)
 
 
+def _compute_sinkhorn_divergences(
+    point_clouds: Sequence[ArrayLike],
+    epsilon: Optional[float] = 1e-1,
+    tau_a: float = 1.0,
+    tau_b: float = 1.0,
+    scale_cost: ScaleCost_t = 1.0,
+    batch_size: Optional[int] = None,
+    pair_batch_size: int = 16,
+    **kwargs: Any,
+) -> ArrayLike:
+    """Compute the Sinkhorn divergences between all pairs of point clouds with uniform weights.
+
+    The point clouds are padded with zero-weight points and the solver is vectorized over ``pair_batch_size``
+    pairs at a time, the `x/x` terms are solved once per point cloud and shared by all pairs.
+
+    Returns
+    -------
+    Symmetric array of shape ``[k, k]`` with zeros on the diagonal.
+    """
+    if pair_batch_size <= 0:
+        raise ValueError(f"Expected `pair_batch_size` to be positive, found `{pair_batch_size}`.")
+    k = len(point_clouds)
+    rows, cols = np.triu_indices(k, 1)
+    res = np.zeros((k, k))
+    if not len(rows):
+        return res
+
+    if epsilon is None or isinstance(scale_cost, str):
+        # `epsilon` or the cost scaling would be computed from the padded point clouds, solve the pairs one by one
+        div = [
+            _compute_sinkhorn_divergence(
+                point_clouds[i],
+                point_clouds[j],
+                epsilon=epsilon,
+                tau_a=tau_a,
+                tau_b=tau_b,
+                scale_cost=scale_cost,
+                batch_size=batch_size,
+                **kwargs,
+            )
+            for i, j in zip(rows, cols)
+        ]
+        res[rows, cols] = res[cols, rows] = div
+        return res
+
+    n = max(len(pc) for pc in point_clouds)
+    x = jnp.stack([jnp.pad(jnp.asarray(pc, dtype=float), ((0, n - len(pc)), (0, 0))) for pc in point_clouds])
+    w = jnp.stack([jnp.pad(jnp.full((len(pc),), 1.0 / len(pc)), (0, n - len(pc))) for pc in point_clouds])
+
+    def reg_ot_cost(x: jnp.ndarray, y: jnp.ndarray, a: jnp.ndarray, b: jnp.ndarray, **solver_kwargs: Any) -> Any:
+        geom = PointCloud(x, y, epsilon=epsilon, scale_cost=scale_cost, batch_size=batch_size, **kwargs)
+        out = sinkhorn.solve(geom, a=a, b=b, tau_a=tau_a, tau_b=tau_b, **solver_kwargs)
+        return out.reg_ot_cost, out.converged
+
+    # same solver for the `x/x` terms as in :func:`ott.tools.sinkhorn_divergence.sinkhorn_divergence`
+    symmetric = partial(
+        reg_ot_cost,
+        parallel_dual_updates=True,
+        momentum=acceleration.Momentum(start=0, value=0.5),
+        anderson=None,
+    )
+
+    def solve_chunked(fn: Callable[..., Any], ixs: ArrayLike, ixs_2: ArrayLike) -> Tuple[jnp.ndarray, jnp.ndarray]:
+        # the last chunk is padded by repeating its last problem, so that all chunks share the compiled solver
+        size = min(pair_batch_size, len(ixs))
+        chunk_costs, chunk_converged = [], []
+        for start in range(0, len(ixs), size):
+            sel = np.minimum(np.arange(start, start + size), len(ixs) - 1)
+            i, j = ixs[sel], ixs_2[sel]
+            cost, conv = fn(x[i], x[j], w[i], w[j])
+            chunk_costs.append(cost[: len(ixs) - start])
+            chunk_converged.append(conv[: len(ixs) - start])
+        return jnp.concatenate(chunk_costs), jnp.concatenate(chunk_converged)
+
+    cost_xx, conv_xx = solve_chunked(jax.jit(jax.vmap(symmetric)), np.arange(k), np.arange(k))
+    cost_xy, conv_xy = solve_chunked(jax.jit(jax.vmap(reg_ot_cost)), rows, cols)
+    div = cost_xy - 0.5 * (cost_xx[rows] + cost_xx[cols])
+    if not jnp.all(conv_xy):
+        logger.warning(f"Solver did not converge in the `x/y` term for `{int(jnp.sum(~conv_xy))}` pairs.")
+    if not jnp.all(conv_xx):
+        logger.warning(f"Solver did not converge in the `x/x` term for `{int(jnp.sum(~conv_xx))}` point clouds.")
+
+    res[rows, cols] = res[cols, rows] = np.asarray(div)
+    return res
+
+
 class RunningAverageMeter:
     """Computes and stores the average value."""
 
@@ -8,6 +8,9 @@ import jax
 import jax.numpy as jnp
 import numpy as np
 import scipy.sparse as sp
+from ott.geometry.geometry import Geometry
+from ott.geometry.low_rank import LRCGeometry
+from ott.geometry.pointcloud import PointCloud
 from ott.problems.linear.potentials import DualPotentials
 from ott.solvers.linear.sinkhorn import SinkhornOutput as OTTSinkhornOutput
 from ott.solvers.linear.sinkhorn_lr import LRSinkhornOutput as OTTLRSinkhornOutput
@@ -118,9 +121,20 @@ class OTTOutput(ConvergencePlotterMixin, BaseSolverOutput):
     ----------
     output
         Output of the :mod:`ott` backend.
+    shape
+        Shape of the problem before it was padded with zero-mass points. If `None`, the problem was not padded.
     """
 
-    def __init__(self, output: Union[OTTSinkhornOutput, OTTLRSinkhornOutput, OTTGWOutput]):
+    # unpadded shape, also the default for outputs pickled before it was stored
+    _shape: Optional[Tuple[int, int]] = None
+    # final epsilon and inverse cost scaling of the geometry, computed once for the transport blocks
+    _geom_scale: Optional[Tuple[float, float]] = None
+
+    def __init__(
+        self,
+        output: Union[OTTSinkhornOutput, OTTLRSinkhornOutput, OTTGWOutput],
+        shape: Optional[Tuple[int, int]] = None,
+    ):
         # TODO(michalk8): think about whether we want to plot the error in inner Sinkhorn in GW
         if isinstance(output, OTTSinkhornOutput):
             costs, errors = jnp.asarray([output.reg_ot_cost]), output.errors
@@ -128,12 +142,56 @@ class OTTOutput(ConvergencePlotterMixin, BaseSolverOutput):
             costs, errors = output.costs, None
         super().__init__(costs=costs, errors=errors)
         self._output = output
+        self._shape = shape
 
     def _apply(self, x: ArrayLike, *, forward: bool) -> ArrayLike:  # type:ignore[override]
+        if self._shape is not None:
+            (n, m), (n_pad, m_pad) = self._shape, self._padded_shape
+            n_in, n_out = (n_pad - n, m) if forward else (m_pad - m, n)
+            x = jnp.pad(x, ((0, n_in),) + ((0, 0),) * (x.ndim - 1))
+            return self._apply_padded(x, forward=forward)[:n_out]
+        return self._apply_padded(x, forward=forward)
+
+    def _apply_padded(self, x: ArrayLike, *, forward: bool) -> ArrayLike:
         if x.ndim == 1:
             return self._output.apply(x, axis=1 - forward)
         return self._output.apply(x.T, axis=1 - forward).T  # convert to batch first
 
+    def _transport_block(self, start: int, stop: int) -> ArrayLike:
+        # recompute the rows from the potentials and the geometry instead of materializing the coupling
+        lin_output = self._output.linear_state if isinstance(self._output, OTTGWOutput) else self._output
+        _, m = self.shape
+        if isinstance(lin_output, OTTLRSinkhornOutput):
+            return (lin_output.q[start:stop] / lin_output.g[None, :]) @ lin_output.r.T
+        epsilon, cost = self._block_cost(lin_output.geom, start, stop, m)
+        return jnp.exp((lin_output.f[start:stop, None] + lin_output.g[None, :m] - cost) / epsilon)
+
+    def _block_cost(self, geom: Geometry, start: int, stop: int, m: int) -> Tuple[float, jnp.ndarray]:
+        # a subset of the geometry would recompute the default epsilon and the cost scaling from the block,
+        # use the ones of the full geometry instead
+        if self._geom_scale is None:
+            self._geom_scale = float(geom.epsilon), float(geom.inv_scale_cost)
+        epsilon, inv_scale_cost = self._geom_scale
+        if isinstance(geom, PointCloud):
+            return epsilon, geom.cost_fn.all_pairs(geom.x[start:stop], geom.y[:m]) * inv_scale_cost
+        if isinstance(geom, LRCGeometry):
+            # the factors and the bias are already scaled
+            return epsilon, geom.cost_1[start:stop] @ geom.cost_2[:m].T + geom.bias
+        if type(geom) is Geometry and geom._cost_matrix is not None:
+            return epsilon, geom._cost_matrix[start:stop, :m] * inv_scale_cost
+        if type(geom) is Geometry and geom._kernel_matrix is not None:
+            # same as `Geometry.cost_matrix` of a kernel, which is not rescaled
+            kernel = geom._kernel_matrix[start:stop, :m]
+            return epsilon, -epsilon * jnp.log(kernel + jnp.finfo(kernel.dtype).tiny)
+        # other geometries, e.g., graphs or grids, only define the full cost matrix
+        return epsilon, geom.cost_matrix[start:stop, :m]
+
+    @property
+    def _padded_shape(self) -> Tuple[int, int]:
+        if isinstance(self._output, OTTSinkhornOutput):
+            return self._output.f.shape[0], self._output.g.shape[0]
+        return self._output.geom.shape
+
     @d.get_sections(base="plot_costs", sections=["Parameters", "Returns"])
     def plot_costs(
         self,
@@ -206,13 +264,14 @@ class OTTOutput(ConvergencePlotterMixin, BaseSolverOutput):
 
     @property
     def shape(self) -> Tuple[int, int]:
-        if isinstance(self._output, OTTSinkhornOutput):
-            return self._output.f.shape[0], self._output.g.shape[0]
-        return self._output.geom.shape
+        return self._padded_shape if self._shape is None else self._shape
 
     @property
     def transport_matrix(self) -> ArrayLike:
-        return self._output.matrix
+        if self._shape is None:
+            return self._output.matrix
+        n, m = self._shape
+        return self._output.matrix[:n, :m]
 
     @property
     def is_linear(self) -> bool:  # noqa: D102
@@ -231,7 +290,7 @@ class OTTOutput(ConvergencePlotterMixin, BaseSolverOutput):
             except IndexError:
                 raise IndexError(f"Unable to fetch the device with `id={idx}`.")
 
-        return OTTOutput(jax.device_put(self._output, device))
+        return OTTOutput(jax.device_put(self._output, device), shape=self._shape)
 
     @property
     def cost(self) -> float:
@@ -246,14 +305,30 @@ class OTTOutput(ConvergencePlotterMixin, BaseSolverOutput):
     @property
     def potentials(self) -> Optional[Tuple[ArrayLike, ArrayLike]]:
         if isinstance(self._output, OTTSinkhornOutput):
-            return self._output.f, self._output.g
+            if self._shape is None:
+                return self._output.f, self._output.g
+            n, m = self._shape
+            return self._output.f[:n], self._output.g[:m]
         return None
 
+    @property
+    def n_iters(self) -> Optional[int]:
+        """Number of iterations the solver needed to terminate, if available."""
+        n_iters = getattr(self._output, "n_iters", None)
+        return None if n_iters is None else int(n_iters)
+
     @property
     def rank(self) -> int:
         lin_output = self._output.linear_state if isinstance(self._output, OTTGWOutput) else self._output
         return len(lin_output.g) if isinstance(lin_output, OTTLRSinkhornOutput) else -1
 
+    @property
+    def _low_rank_factors(self) -> Optional[Tuple[ArrayLike, ArrayLike, ArrayLike]]:
+        lin_output = self._output.linear_state if isinstance(self._output, OTTGWOutput) else self._output
+        if not isinstance(lin_output, OTTLRSinkhornOutput):
+            return None
+        return lin_output.q, lin_output.r, lin_output.g
+
     def _ones(self, n: int) -> jnp.ndarray:
         return jnp.ones((n,))
 
@@ -272,7 +347,8 @@ class OTTNeuralOutput(BaseNeuralOutput):
         k: int = 30,
         length_scale: Optional[float] = None,
         seed: int = 42,
-    ) -> sp.csr_matrix:
+        aggregate_by: Optional[Tuple[sp.spmatrix, sp.spmatrix]] = None,
+    ) -> Union[sp.csr_matrix, ArrayLike]:
         get_knn_fn = jax.vmap(get_nearest_neighbors, in_axes=(0, None, None))
         row_indices: Union[jnp.ndarray, List[jnp.ndarray]] = []
         column_indices: Union[jnp.ndarray, List[jnp.ndarray]] = []
@@ -282,15 +358,33 @@ class OTTNeuralOutput(BaseNeuralOutput):
             src_batch = src_dist[jax.random.choice(key, src_dist.shape[0], shape=((batch_size,)))]
             tgt_batch = tgt_dist[jax.random.choice(key, tgt_dist.shape[0], shape=((batch_size,)))]
             length_scale = jnp.std(jnp.concatenate((func(src_batch), tgt_batch)))
+        if aggregate_by is not None:
+            # `[n_src, n_groups_src]` and `[n_tgt, n_groups_tgt]` indicators, the rows of `src_dist` come first
+            row_groups, col_groups = (sp.csr_matrix(g) for g in (aggregate_by if forward else aggregate_by[::-1]))
+            res = np.zeros((row_groups.shape[1], col_groups.shape[1]))
         for index in range(0, len(src_dist), batch_size):
             distances, indices = get_knn_fn(func(src_dist[index : index + batch_size]), tgt_dist, k)
             distances = jnp.exp(-((distances / length_scale) ** 2))
             distances /= jnp.expand_dims(jnp.sum(distances, axis=1), axis=1)
+            if aggregate_by is not None:
+                # accumulate the group-level transitions without instantiating the projected matrix
+                n_batch = distances.shape[0]
+                block = sp.csr_matrix(
+                    (
+                        np.asarray(distances).ravel(),
+                        (np.repeat(np.arange(n_batch), distances.shape[1]), np.asarray(indices).ravel()),
+                    ),
+                    shape=(n_batch, len(tgt_dist)),
+                )
+                res += np.asarray((row_groups[index : index + n_batch].T @ (block @ col_groups)).todense())
+                continue
             distances_list.append(distances.flatten())
             column_indices.append(indices.flatten())
             row_indices.append(
                 jnp.repeat(jnp.arange(index, index + min(batch_size, len(src_dist) - index)), min(k, len(tgt_dist)))
             )
+        if aggregate_by is not None:
+            return res if forward else res.T
         distances = jnp.concatenate(distances_list)
         row_indices = jnp.concatenate(row_indices)
         column_indices = jnp.concatenate(column_indices)
@@ -395,7 +489,8 @@ class NeuralDualOutput(ConvergencePlotterMixin, OTTNeuralOutput):
         k: int = 30,
         length_scale: Optional[float] = None,
         seed: int = 42,
-    ) -> sp.csr_matrix:
+        aggregate_by: Optional[Tuple[sp.spmatrix, sp.spmatrix]] = None,
+    ) -> Union[sp.csr_matrix, ArrayLike]:
         """Project neural OT map onto cells.
 
         In constrast to discrete OT, Neural OT does not necessarily map cells onto cells,
@@ -427,10 +522,14 @@ class NeuralDualOutput(ConvergencePlotterMixin, OTTNeuralOutput):
         seed
             Random seed for sampling the pairs of distributions for computing the variance in case `length_scale`
             is `None`.
+        aggregate_by
+            One-hot group indicators of shape ``[n_src, n_groups_src]`` and ``[n_tgt, n_groups_tgt]``. If not `None`,
+            return the group-level matrix :math:`G_{src}^T T G_{tgt}` of shape ``[n_groups_src, n_groups_tgt]``,
+            accumulated batch by batch without instantiating the projected transport matrix :math:`T`.
 
         Returns
         -------
-        The projected transport matrix.
+        The projected transport matrix or its aggregation if ``aggregate_by`` is not `None`.
         """
         src_cells, tgt_cells = jnp.asarray(src_cells), jnp.asarray(tgt_cells)
         func, src_dist, tgt_dist = (self.push, src_cells, tgt_cells) if forward else (self.pull, tgt_cells, src_cells)
@@ -444,6 +543,7 @@ class NeuralDualOutput(ConvergencePlotterMixin, OTTNeuralOutput):
             k=k,
             length_scale=length_scale,
             seed=seed,
+            aggregate_by=aggregate_by,
         )
 
     @property
@@ -1,13 +1,15 @@
 import math
 import types
-from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple, Union
+from typing import Any, Dict, Hashable, List, Literal, Mapping, Optional, Sequence, Tuple, Union
 
 import jax
 import jax.numpy as jnp
+import numpy as np
 import scipy.sparse as sp
 from ott.geometry import costs
 from ott.geometry.epsilon_scheduler import Epsilon
 from ott.geometry.geometry import Geometry
+from ott.geometry.low_rank import LRCGeometry
 from ott.geometry.pointcloud import PointCloud
 from ott.problems.linear.linear_problem import LinearProblem
 from ott.problems.quadratic.quadratic_problem import QuadraticProblem
@@ -16,6 +18,7 @@ from ott.solvers.linear.sinkhorn_lr import LRSinkhorn
 from ott.solvers.quadratic.gromov_wasserstein import GromovWasserstein
 from ott.solvers.was_solver import WassersteinSolver
 
+from moscot._logging import logger
 from moscot._types import (
     ArrayLike,
     ProblemKind_t,
@@ -26,11 +29,12 @@ from moscot._types import (
 from moscot.backends.ott._jax_data import JaxSampler
 from moscot.backends.ott._neuraldual import OTTNeuralDualSolver
 from moscot.backends.ott._gap_models import MongeGapSolver
+from moscot.backends.ott._jit_cache import _COMPILED_SOLVERS, _config_key
 from moscot.backends.ott._utils import _filter_kwargs
 from moscot.backends.ott.output import CondNeuralDualOutput, NeuralDualOutput, OTTOutput, GapNeuralOutput
 from moscot.base.solver import OTSolver
 from moscot.costs import get_cost
-from moscot.utils.tagged_array import TaggedArray
+from moscot.utils.tagged_array import LazyArray, TaggedArray
 
 __all__ = ["SinkhornSolver", "GWSolver", "NeuralDualSolver", "CondNeuralDualSolver"]
 
@@ -38,6 +42,17 @@ Scale_t = Union[float, Literal["mean", "median", "max_cost", "max_norm", "max_bo
 Epsilon_t = Union[float, Epsilon]
 
 
+def _densify(arr: Union[ArrayLike, sp.spmatrix, LazyArray], *, warn: bool = False) -> jnp.ndarray:
+    if isinstance(arr, LazyArray):
+        # read directly into an array of the dtype used by `jax`, which then doesn't need to be converted
+        return jax.device_put(arr.materialize(dtype=jax.dtypes.canonicalize_dtype(arr.dtype)))
+    if sp.issparse(arr):
+        if warn:
+            logger.warning(f"Densifying sparse data of shape `{arr.shape}`.")
+        return jnp.asarray(arr.toarray())
+    return jnp.asarray(arr)
+
+
 class OTTJaxSolver(OTSolver[OTTOutput]):
     """Base class for :mod:`ott` solvers :cite:`cuturi2022optimal`.
 
@@ -52,21 +67,56 @@ class OTTJaxSolver(OTSolver[OTTOutput]):
         self._solver: Optional[Union[Sinkhorn, LRSinkhorn, GromovWasserstein]] = None
         self._problem: Optional[Union[LinearProblem, QuadraticProblem]] = None
         self._jit = jit
+        # identifies the compiled solver in the shared cache, set by subclasses
+        self._config: Optional[Hashable] = None
+        # shape of the problem before padding it to a bucket, see `_get_bucket`
+        self._unpadded_shape: Optional[Tuple[int, int]] = None
+        # initial potentials when warm-starting the solver
+        self._init: Optional[Tuple[jnp.ndarray, jnp.ndarray]] = None
 
     def _create_geometry(
         self,
         x: TaggedArray,
+        pad_to: Optional[Tuple[int, int]] = None,
+        n_comps: Optional[int] = None,
         **kwargs: Any,
     ) -> Geometry:
+        # sparse data is densified unless `n_comps` is given, in which case it is approximated by `n_comps` components
         if x.is_point_cloud:
             kwargs = _filter_kwargs(PointCloud, Geometry, **kwargs)
             cost_fn = self._create_cost(x.cost)
-            x, y = self._assert2d(x.data_src), self._assert2d(x.data_tgt)
+            if n_comps is not None and (sp.issparse(x.data_src) or sp.issparse(x.data_tgt)):
+                if not isinstance(cost_fn, costs.SqEuclidean):
+                    raise ValueError(
+                        f"Projecting sparse point clouds is only implemented for `cost='sq_euclidean'`, "
+                        f"found `{type(cost_fn).__name__}`. Use `n_comps=None` to densify them."
+                    )
+                x, y = self._reduce_sparse(x.data_src, x.data_tgt, n_comps=n_comps)
+            else:
+                x, y = self._assert2d(x.data_src), self._assert2d(x.data_tgt)
             n, m = x.shape[1], (None if y is None else y.shape[1])
             if m is not None and n != m:
                 raise ValueError(f"Expected `x/y` to have the same number of dimensions, found `{n}/{m}`.")
+            if pad_to is not None:
+                # padded points are masked out, e.g., when scaling the cost, and get zero mass in the marginals
+                y = x if y is None else y
+                (n, m), (n_pad, m_pad) = (x.shape[0], y.shape[0]), pad_to
+                kwargs["src_mask"] = jnp.arange(n_pad) < n
+                kwargs["tgt_mask"] = jnp.arange(m_pad) < m
+                x = jnp.pad(x, ((0, n_pad - n), (0, 0)))
+                y = jnp.pad(y, ((0, m_pad - m), (0, 0)))
             return PointCloud(x, y=y, cost_fn=cost_fn, **kwargs)  # TODO: add ScaleCost
 
+        if n_comps is not None and sp.issparse(x.data_src):
+            if not x.is_cost_matrix:
+                raise ValueError(
+                    f"Unable to approximate a sparse `tag={x.tag!r}` by low-rank factors. "
+                    "Use `n_comps=None` to densify it."
+                )
+            if min(x.data_src.shape) > 1:
+                cost_1, cost_2 = self._factorize_sparse(x.data_src, rank=n_comps)
+                return LRCGeometry(cost_1, cost_2, **_filter_kwargs(LRCGeometry, Geometry, **kwargs))
+
         kwargs = _filter_kwargs(Geometry, **kwargs)
         arr = self._assert2d(x.data_src, allow_reshape=False)
         if x.is_cost_matrix:
@@ -75,20 +125,114 @@ class OTTJaxSolver(OTSolver[OTTOutput]):
             return Geometry(kernel_matrix=arr, **kwargs)
         raise NotImplementedError(f"Creating geometry from `tag={x.tag!r}` is not yet implemented.")
 
+    @staticmethod
+    def _reduce_sparse(
+        x: Union[ArrayLike, sp.spmatrix], y: Optional[Union[ArrayLike, sp.spmatrix]], *, n_comps: int
+    ) -> Tuple[jnp.ndarray, Optional[jnp.ndarray]]:
+        # project the point clouds onto their joint top right singular vectors using only sparse products
+        from sklearn.utils.extmath import randomized_svd
+
+        data = sp.csr_matrix(x) if y is None else sp.vstack([sp.csr_matrix(x), sp.csr_matrix(y)], format="csr")
+        if data.shape[1] <= n_comps:  # nothing to gain
+            data = jnp.asarray(data.A)
+        else:
+            logger.warning(f"Approximating sparse point clouds by projecting them onto `{n_comps}` components.")
+            _, _, vt = randomized_svd(data, n_components=n_comps, random_state=0)
+            data = jnp.asarray(data @ vt.T)
+        return data[: x.shape[0]], (None if y is None else data[x.shape[0] :])
+
+    @staticmethod
+    def _factorize_sparse(arr: sp.spmatrix, *, rank: int) -> Tuple[jnp.ndarray, jnp.ndarray]:
+        # low-rank factors of a sparse cost matrix without creating the dense matrix
+        from scipy.sparse.linalg import svds
+
+        rank = max(1, min(rank, min(arr.shape) - 1))
+        logger.warning(
+            f"Approximating sparse cost matrix of shape `{arr.shape}` by a rank `{rank}` factorization. "
+            "The approximated costs are not guaranteed to be non-negative."
+        )
+        u, s, vt = svds(arr.astype(float), k=rank, random_state=0)
+        sqrt_s = np.sqrt(s)
+        return jnp.asarray(u * sqrt_s), jnp.asarray(vt.T * sqrt_s)
+
     def _solve(  # type: ignore[override]
         self,
         prob: Union[LinearProblem, QuadraticProblem],
         **kwargs: Any,
     ) -> OTTOutput:
-        solver = jax.jit(self.solver) if self._jit else self._solver
-        out = solver(prob, **kwargs)  # type: ignore[misc]
-        return OTTOutput(out)
+        init = () if self._init is None else (self._init,)
+        if not self._jit:
+            out = self.solver(prob, *init, **kwargs)
+        elif self._config is None or kwargs:
+            out = jax.jit(self.solver)(prob, *init, **kwargs)
+        else:
+            out = _COMPILED_SOLVERS(self._config, self.solver, prob, *init)
+        return OTTOutput(out, shape=self._unpadded_shape)
+
+    def _solve_batched(  # type: ignore[override]
+        self,
+        probs: Sequence[Union[LinearProblem, QuadraticProblem]],
+        states: Optional[Sequence[Tuple[Optional[Tuple[jnp.ndarray, jnp.ndarray]], Optional[Tuple[int, int]]]]] = None,
+        **kwargs: Any,
+    ) -> List[OTTOutput]:
+        # problems of the same shape and configuration share the pytree structure,
+        # which allows stacking them and solving all of them in one vectorized call
+        try:
+            batched = jax.tree_util.tree_map(lambda *leaves: jnp.stack(leaves), *probs)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Unable to stack problems, expected them to have the same shape and structure.") from e
+
+        if states is None:
+            states = [self._get_state()] * len(probs)
+        inits = [init for init, _ in states]
+        if all(init is not None for init in inits):
+            init: Tuple[Any, ...] = (jax.tree_util.tree_map(lambda *leaves: jnp.stack(leaves), *inits),)
+        else:
+            if any(init is not None for init in inits):
+                logger.warning("Not all problems can be warm-started, solving all of them without initial potentials.")
+            init = ()
+
+        solver = jax.vmap(lambda prob, *init: self.solver(prob, *init, **kwargs))
+        if not self._jit:
+            out = solver(batched, *init)
+        elif self._config is None or kwargs:
+            out = jax.jit(solver)(batched, *init)
+        else:
+            out = _COMPILED_SOLVERS((self._config, "vmap", len(init)), solver, batched, *init)
+        return [
+            OTTOutput(jax.tree_util.tree_map(lambda arr: arr[i], out), shape=shape)  # noqa: B023
+            for i, (_, shape) in enumerate(states)
+        ]
+
+    def _get_state(self) -> Tuple[Optional[Tuple[jnp.ndarray, jnp.ndarray]], Optional[Tuple[int, int]]]:
+        return self._init, self._unpadded_shape
+
+    def _set_state(
+        self, state: Tuple[Optional[Tuple[jnp.ndarray, jnp.ndarray]], Optional[Tuple[int, int]]]
+    ) -> None:
+        self._init, self._unpadded_shape = state
+
+    @staticmethod
+    def _get_bucket(n: int, buckets: Union[int, Sequence[int]]) -> int:
+        if isinstance(buckets, int):
+            if buckets <= 0:
+                raise ValueError(f"Expected `buckets` to be positive, found `{buckets}`.")
+            return int(math.ceil(n / buckets)) * buckets
+        for bucket in sorted(buckets):
+            if bucket >= n:
+                return int(bucket)
+        return n
+
+    @staticmethod
+    def _pad_marginals(arr: Optional[ArrayLike], n: int, n_pad: int) -> jnp.ndarray:
+        arr = jnp.full((n,), 1.0 / n) if arr is None else jnp.ravel(jnp.asarray(arr))
+        return jnp.pad(arr, (0, n_pad - n))
 
     @staticmethod
     def _assert2d(arr: Optional[ArrayLike], *, allow_reshape: bool = True) -> Optional[ArrayLike]:
         if arr is None:
             return None
-        arr: ArrayLike = jnp.asarray(arr.A if sp.issparse(arr) else arr)  # type: ignore[attr-defined, no-redef]
+        arr = _densify(arr)
         if allow_reshape and arr.ndim == 1:
             return jnp.reshape(arr, (-1, 1))  # type: ignore[return-value]
         if arr.ndim != 2:
@@ -149,7 +293,7 @@ class SinkhornSolver(OTTJaxSolver):
         initializer_kwargs: Mapping[str, Any] = types.MappingProxyType({}),
         **kwargs: Any,
     ):
-        super().__init__()
+        super().__init__(jit=kwargs.pop("jit", True))
         if rank > -1:
             kwargs = _filter_kwargs(Sinkhorn, LRSinkhorn, **kwargs)
             initializer = initializer if initializer is not None else "rank2"  # set rank2 as default LR initializer
@@ -158,6 +302,8 @@ class SinkhornSolver(OTTJaxSolver):
             kwargs = _filter_kwargs(Sinkhorn, **kwargs)
             initializer = initializer if initializer is not None else "default"  # `None` not handled by backend
             self._solver = Sinkhorn(initializer=initializer, kwargs_init=initializer_kwargs, **kwargs)
+        # only the arguments of the `ott` solver, not the per-solve ones, determine the compiled solver
+        self._config = _config_key(("linear", rank, initializer, initializer_kwargs, kwargs))
 
     def _prepare(
         self,
@@ -168,14 +314,39 @@ class SinkhornSolver(OTTJaxSolver):
         batch_size: Optional[int] = None,
         scale_cost: Scale_t = 1.0,
         cost_matrix_rank: Optional[int] = None,
+        buckets: Optional[Union[int, Sequence[int]]] = None,
+        init: Optional[Tuple[ArrayLike, ArrayLike]] = None,
         **kwargs: Any,
     ) -> LinearProblem:
         del x, y
         if xy is None:
             raise ValueError(f"Unable to create geometry from `xy={xy}`.")
-
-        geom = self._create_geometry(xy, epsilon=epsilon, batch_size=batch_size, scale_cost=scale_cost, **kwargs)
-        if self.is_low_rank:
+        if init is not None and self.is_low_rank:
+            logger.warning("Warm-starting from potentials is not implemented for low-rank problems.")
+            init = None
+        self._init = None if init is None else (jnp.asarray(init[0]), jnp.asarray(init[1]))
+
+        pad_to, self._unpadded_shape = None, None
+        if buckets is not None:
+            if not xy.is_point_cloud or self.is_low_rank:
+                logger.warning("Padding to `buckets` is only implemented for full-rank problems on point clouds.")
+            else:
+                n, m = xy.shape
+                pad_to = self._get_bucket(n, buckets), self._get_bucket(m, buckets)
+                if pad_to != (n, m):
+                    self._unpadded_shape = (n, m)
+                    kwargs["a"] = self._pad_marginals(kwargs.get("a", None), n, pad_to[0])
+                    kwargs["b"] = self._pad_marginals(kwargs.get("b", None), m, pad_to[1])
+                    if self._init is not None:
+                        f, g = self._init
+                        self._init = jnp.pad(f, (0, pad_to[0] - n)), jnp.pad(g, (0, pad_to[1] - m))
+                else:
+                    pad_to = None
+
+        geom = self._create_geometry(
+            xy, pad_to=pad_to, epsilon=epsilon, batch_size=batch_size, scale_cost=scale_cost, **kwargs
+        )
+        if self.is_low_rank and not isinstance(geom, LRCGeometry):
             geom = geom.to_LRCGeometry(
                 rank=self.rank if cost_matrix_rank is None else cost_matrix_rank
             )  # batch_size cannot be passed in this function
@@ -232,7 +403,7 @@ class GWSolver(OTTJaxSolver):
         linear_solver_kwargs: Mapping[str, Any] = types.MappingProxyType({}),
         **kwargs: Any,
     ):
-        super().__init__()
+        super().__init__(jit=kwargs.pop("jit", True))
         if rank > -1:
             initializer = initializer if initializer is not None else "rank2"
             linear_ot_solver = LRSinkhorn(
@@ -249,6 +420,10 @@ class GWSolver(OTTJaxSolver):
             kwargs_init=initializer_kwargs,
             **kwargs,
         )
+        # only the arguments of the `ott` solver, not the per-solve ones, determine the compiled solver
+        self._config = _config_key(
+            ("quadratic", rank, initializer, gamma, gamma_rescale, initializer_kwargs, linear_solver_kwargs, kwargs)
+        )
 
     def _prepare(
         self,
@@ -364,7 +539,8 @@ class NeuralDualSolver(OTSolver[OTTOutput]):
 
     @staticmethod
     def _assert2d(arr: ArrayLike, *, allow_reshape: bool = True) -> jnp.ndarray:  # type:ignore[name-defined]
-        arr: jnp.ndarray = jnp.asarray(arr.A if sp.issparse(arr) else arr)  # type: ignore[no-redef, attr-defined, name-defined]   # noqa:E501
+        # the networks are trained on mini-batches sampled on the device, which requires dense arrays
+        arr = _densify(arr, warn=True)
         if allow_reshape and arr.ndim == 1:
             return jnp.reshape(arr, (-1, 1))
         if arr.ndim != 2:
@@ -556,7 +732,8 @@ class GapSolver(OTSolver[OTTOutput]):
 
     @staticmethod
     def _assert2d(arr: ArrayLike, *, allow_reshape: bool = True) -> jnp.ndarray:
-        arr: jnp.ndarray = jnp.asarray(arr.A if issparse(arr) else arr)  # type: ignore[no-redef, attr-defined]
+        # the networks are trained on mini-batches sampled on the device, which requires dense arrays
+        arr = _densify(arr, warn=True)
         if allow_reshape and arr.ndim == 1:
             return jnp.reshape(arr, (-1, 1))
         if arr.ndim != 2:
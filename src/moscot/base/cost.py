@@ -1,14 +1,173 @@
+import hashlib
+import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Tuple, Union
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, Tuple, Union
 
+import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 
 from anndata import AnnData
 
 from moscot._logging import logger
-from moscot._types import ArrayLike
+from moscot._types import ArrayLike, PathLike
 
-__all__ = ["BaseCost"]
+__all__ = ["BaseCost", "CostCacheInfo", "get_cost_cache_info", "clear_cost_cache", "set_cost_cache"]
+
+
+class CostCacheInfo(NamedTuple):
+    """Statistics of the cost matrix cache."""
+
+    hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the lookups which were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _CostCache:
+    """Least-recently-used cache of cost matrices computed by :class:`~moscot.base.cost.BaseCost`.
+
+    The matrices are keyed by a fingerprint of the cost's data, the cost's type and the keyword arguments,
+    so that re-preparing a problem with unchanged data reuses them. If a directory is set, the matrices are also
+    stored there and memory-mapped, so that they are shared across sessions. Disabled by default.
+    """
+
+    def __init__(self, maxsize: int = 0, path: Optional[PathLike] = None) -> None:
+        self._cache: "OrderedDict[str, ArrayLike]" = OrderedDict()
+        self._maxsize = maxsize
+        self._path = path
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ArrayLike]:
+        with self._lock:
+            cost = self._cache.get(key, None)
+            if cost is not None:
+                self._cache.move_to_end(key)
+            elif self._path is not None and os.path.isfile(self._file(key)):
+                cost = np.load(self._file(key), mmap_mode="r")
+                self._put(key, cost)
+
+            if cost is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return cost
+
+    def put(self, key: str, cost: ArrayLike) -> ArrayLike:
+        with self._lock:
+            if self._path is not None:
+                os.makedirs(self._path, exist_ok=True)
+                np.save(self._file(key), cost)
+                cost = np.load(self._file(key), mmap_mode="r")
+            elif isinstance(cost, np.ndarray):
+                # the matrix is shared between the callers
+                cost.setflags(write=False)
+            self._put(key, cost)
+            return cost
+
+    def _put(self, key: str, cost: ArrayLike) -> None:
+        if self._maxsize <= 0:
+            return
+        self._cache[key] = cost
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(str(self._path), f"{key}.npy")
+
+    @property
+    def enabled(self) -> bool:
+        return self._maxsize > 0 or self._path is not None
+
+    def configure(self, maxsize: Optional[int] = None, path: Union[PathLike, None, bool] = False) -> None:
+        with self._lock:
+            if maxsize is not None:
+                self._maxsize = maxsize
+            if path is not False:
+                self._path = path
+            while len(self._cache) > max(self._maxsize, 0):
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._hits = self._misses = 0
+
+    @property
+    def info(self) -> CostCacheInfo:
+        with self._lock:
+            return CostCacheInfo(hits=self._hits, misses=self._misses, size=len(self._cache))
+
+
+_COST_CACHE = _CostCache()
+_EXECUTION_KWARGS = frozenset({"n_jobs", "batch_size", "path"})
+
+
+def get_cost_cache_info() -> CostCacheInfo:
+    """Get the statistics of the cost matrix cache.
+
+    Returns
+    -------
+    The number of cache hits, cache misses and the number of cached cost matrices.
+    """
+    return _COST_CACHE.info
+
+
+def clear_cost_cache() -> None:
+    """Clear the cost matrix cache.
+
+    Returns
+    -------
+    Nothing, just removes all cost matrices held in memory and resets the statistics.
+    """
+    _COST_CACHE.clear()
+
+
+def set_cost_cache(maxsize: Optional[int] = None, path: Union[PathLike, None, bool] = False) -> None:
+    """Configure the cost matrix cache.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of cost matrices held in memory. If `0` and ``path`` is `None`, disable the cache,
+        which is the default. If `None`, don't change it.
+    path
+        Directory where to store the cost matrices, which are then memory-mapped.
+        If `None`, only keep them in memory. If `False`, don't change it.
+
+    Returns
+    -------
+    Nothing, just updates the cache.
+    """
+    _COST_CACHE.configure(maxsize=maxsize, path=path)
+
+
+def _fingerprint(obj: Any, h: "hashlib._Hash") -> None:
+    if sp.issparse(obj):
+        obj = sp.csr_matrix(obj)
+        h.update(f"{obj.shape}".encode())
+        for arr in (obj.data, obj.indices, obj.indptr):
+            _fingerprint(arr, h)
+    elif hasattr(obj, "__array__"):
+        arr = np.ascontiguousarray(obj)
+        h.update(f"{arr.dtype}{arr.shape}".encode())
+        h.update(repr(arr.tolist()).encode() if arr.dtype == object else arr.view(np.uint8))
+    elif isinstance(obj, nx.Graph):
+        h.update(repr((list(obj.nodes), list(obj.edges(data=True)))).encode())
+    elif isinstance(obj, dict):
+        h.update(repr(sorted((repr(k), repr(v)) for k, v in obj.items())).encode())
+    else:
+        h.update(repr(obj).encode())
 
 
 class BaseCost(ABC):
@@ -39,6 +198,9 @@ class BaseCost(ABC):
     def __call__(self, *args: Any, **kwargs: Any) -> ArrayLike:
         """Compute a cost matrix from :attr:`adata`.
 
+        If enabled, cost matrices are cached based on the :attr:`data`, see :func:`~moscot.costs.set_cost_cache`.
+        Cached matrices are shared between the callers and are read-only.
+
         Parameters
         ----------
         args
@@ -50,14 +212,29 @@ class BaseCost(ABC):
         -------
         The computed cost matrix.
         """
+        key = self._cache_key(*args, **kwargs) if _COST_CACHE.enabled else None
+        if key is not None:
+            cost = _COST_CACHE.get(key)
+            if cost is not None:
+                return cost
+
         cost = self._compute(*args, **kwargs)
         if not np.all(np.isnan(cost)):
             maxx = np.nanmax(cost)
             logger.warning(f"Cost matrix contains `NaN` values, setting them to the maximum value `{maxx}`.")
-            cost = np.nan_to_num(cost, nan=maxx)  # type: ignore[call-overload]
+            cost = np.nan_to_num(cost, copy=not isinstance(cost, np.memmap), nan=maxx)  # type: ignore[call-overload]
         if np.any(cost < 0):
             raise ValueError("Cost matrix contains negative values.")
-        return cost
+        return cost if key is None else _COST_CACHE.put(key, cost)
+
+    def _cache_key(self, *args: Any, **kwargs: Any) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{type(self).__module__}.{type(self).__qualname__}".encode())
+        # options which only affect how the cost is computed, not its values
+        kwargs = {k: v for k, v in kwargs.items() if k not in _EXECUTION_KWARGS}
+        for obj in (self.data, self.adata.obs_names.values, args, kwargs):
+            _fingerprint(obj, h)
+        return h.hexdigest()
 
     @property
     def adata(self) -> AnnData:
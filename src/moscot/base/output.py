@@ -1,7 +1,9 @@
+import contextlib
+import os
 from abc import ABC, abstractmethod
 from copy import copy
 from functools import partial
-from typing import Any, Callable, Iterable, List, Literal, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
 
 import numpy as np
 import scipy.sparse as sp
@@ -9,9 +11,20 @@ from scipy.sparse.linalg import LinearOperator
 
 from moscot._docs._docs import d
 from moscot._logging import logger
-from moscot._types import ArrayLike, Device_t, DTypeLike  # type: ignore[attr-defined]
-
-__all__ = ["BaseSolverOutput", "MatrixSolverOutput", "BaseNeuralOutput", "BaseCondNeuralOutput"]
+from moscot._types import (  # type: ignore[attr-defined]
+    ArrayLike,
+    Device_t,
+    DTypeLike,
+    PathLike,
+)
+
+__all__ = [
+    "BaseSolverOutput",
+    "MatrixSolverOutput",
+    "StoredSolverOutput",
+    "BaseNeuralOutput",
+    "BaseCondNeuralOutput",
+]
 
 
 @d.dedent
@@ -79,12 +92,23 @@ class BaseSolverOutput(ABC):
         """Whether the :attr:`transport_matrix` is low-rank."""
         return self.rank > -1
 
+    @property
+    def _low_rank_factors(self) -> Optional[Tuple[ArrayLike, ArrayLike, ArrayLike]]:
+        # factors `q`, `r` and `g` such that `T = q @ diag(1 / g) @ r.T`, if available
+        return None
+
     # TODO(michalk8): mention in docs it needs to be broadcastable
     @abstractmethod
     def _ones(self, n: int) -> ArrayLike:
         pass
 
-    def push(self, x: ArrayLike, scale_by_marginals: bool = False) -> ArrayLike:
+    def push(
+        self,
+        x: ArrayLike,
+        scale_by_marginals: bool = False,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+    ) -> ArrayLike:
         """Push mass through the :attr:`transport_matrix`.
 
         It is equivalent to :math:`T^T x` but without instantiating the transport matrix :math:`T`, if possible.
@@ -95,6 +119,11 @@ class BaseSolverOutput(ABC):
             Array of shape ``[n,]`` or ``[n, d]`` to push.
         scale_by_marginals
             Whether to scale by the source marginals :attr:`a`.
+        batch_size
+            If not `None`, compute the result in blocks of ``batch_size`` rows of the :attr:`transport_matrix`,
+            so that at most ``[batch_size, m]`` entries are instantiated at the same time.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
 
         Returns
         -------
@@ -106,9 +135,17 @@ class BaseSolverOutput(ABC):
             raise ValueError(f"Expected array to have shape `({self.shape[0]}, ...)`, found `{x.shape}`.")
         if scale_by_marginals:
             x = self._scale_by_marginals(x, forward=True)
+        if batch_size is not None:
+            return self._apply_blockwise(x, forward=True, batch_size=batch_size, n_jobs=n_jobs)
         return self._apply(x, forward=True)
 
-    def pull(self, x: ArrayLike, scale_by_marginals: bool = False) -> ArrayLike:
+    def pull(
+        self,
+        x: ArrayLike,
+        scale_by_marginals: bool = False,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+    ) -> ArrayLike:
         """Pull mass through the :attr:`transport_matrix`.
 
         It is equivalent to :math:`T x` but without instantiating the transport matrix :math:`T`, if possible.
@@ -119,6 +156,11 @@ class BaseSolverOutput(ABC):
             Array of shape ``[m,]`` or ``[m, d]`` to pull.
         scale_by_marginals
             Whether to scale by the target marginals :attr:`b`.
+        batch_size
+            If not `None`, compute the result in blocks of ``batch_size`` rows of the :attr:`transport_matrix`,
+            so that at most ``[batch_size, m]`` entries are instantiated at the same time.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
 
         Returns
         -------
@@ -130,8 +172,59 @@ class BaseSolverOutput(ABC):
             raise ValueError(f"Expected array to have shape `({self.shape[1]}, ...)`, found `{x.shape}`.")
         if scale_by_marginals:
             x = self._scale_by_marginals(x, forward=False)
+        if batch_size is not None:
+            return self._apply_blockwise(x, forward=False, batch_size=batch_size, n_jobs=n_jobs)
         return self._apply(x, forward=False)
 
+    def _transport_block(self, start: int, stop: int) -> ArrayLike:
+        # rows `[start, stop)` of the transport matrix, subclasses should avoid instantiating the whole matrix
+        factors = self._low_rank_factors
+        if factors is not None:
+            q, r, g = factors
+            return (q[start:stop] / g[None, :]) @ r.T
+        # pushing the indicators of the rows yields their transposed block, without instantiating the whole matrix
+        x = np.eye(self.shape[0], stop - start, -start)
+        return np.asarray(self._apply(x, forward=True)).T
+
+    def _apply_blockwise(
+        self, x: ArrayLike, *, forward: bool, batch_size: int, n_jobs: Optional[int] = None
+    ) -> ArrayLike:
+        from joblib import Parallel, delayed, effective_n_jobs
+
+        if batch_size <= 0:
+            raise ValueError(f"Expected `batch_size` to be positive, found `{batch_size}`.")
+
+        def apply_block(start: int) -> ArrayLike:
+            stop = min(start + batch_size, n)
+            tmap = self._transport_block(start, stop)
+            res = tmap.T @ x[start:stop] if forward else tmap @ x
+            return np.asarray(res.todense() if sp.issparse(res) else res)
+
+        n = self.shape[0]
+        starts = list(range(0, n, batch_size))
+        n_parallel = 1 if n_jobs is None or n_jobs == 1 else effective_n_jobs(n_jobs)
+        # when pushing, the blocks are added to the result as they arrive, only `n_parallel` of them are kept
+        res: Optional[np.ndarray] = None
+        blocks: List[np.ndarray] = []
+        with Parallel(n_jobs=n_parallel, backend="threading") as parallel:
+            for i in range(0, len(starts), n_parallel):
+                chunk = starts[i : i + n_parallel]
+                if n_parallel == 1:
+                    chunk_blocks = [apply_block(start) for start in chunk]
+                else:
+                    chunk_blocks = parallel(delayed(apply_block)(start) for start in chunk)
+                for block in chunk_blocks:
+                    if not forward:
+                        blocks.append(block)
+                    elif res is None:
+                        res = np.array(block, dtype=np.result_type(block, np.float32))
+                    else:
+                        res += block
+
+        if forward:
+            return res
+        return np.concatenate(blocks, axis=0)
+
     def as_linear_operator(self, scale_by_marginals: bool = False) -> LinearOperator:
         """Transform :attr:`transport_matrix` into a linear operator.
 
@@ -148,7 +241,9 @@ class BaseSolverOutput(ABC):
         pull = partial(self.pull, scale_by_marginals=scale_by_marginals)
         # push: a @ X (rmatvec)
         # pull: X @ a (matvec)
-        return LinearOperator(shape=self.shape, dtype=self.dtype, matvec=pull, rmatvec=push)
+        return LinearOperator(
+            shape=self.shape, dtype=self.dtype, matvec=pull, rmatvec=push, matmat=pull, rmatmat=push
+        )
 
     def chain(self, outputs: Iterable["BaseSolverOutput"], scale_by_marginals: bool = False) -> LinearOperator:
         """Chain subsequent applications of :attr:`transport_matrix`.
@@ -172,17 +267,21 @@ class BaseSolverOutput(ABC):
 
     def sparsify(
         self,
-        mode: Literal["threshold", "percentile", "min_row"],
+        mode: Literal["threshold", "percentile", "min_row", "top_k"],
         value: Optional[float] = None,
         batch_size: int = 1024,
         n_samples: Optional[int] = None,
         seed: Optional[int] = None,
+        k: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        path: Optional[PathLike] = None,
     ) -> "MatrixSolverOutput":
         """Sparsify the :attr:`transport_matrix`.
 
-        This function sets all entries of the transport matrix below `threshold` to 0 and
-        returns an instance of the `MatrixSolverOutput` with the
+        This function sets all entries of the transport matrix below `threshold` (or all but the `k` largest entries
+        in each row) to 0 and returns an instance of the `MatrixSolverOutput` with the
         sparsified transport matrix stored as a :class:`~scipy.sparse.csr_matrix`.
+        The transport matrix is processed in blocks of rows, which are assembled into the sparse matrix one at a time.
 
         .. warning::
             This function only serves for interfacing software which has to instantiate the transport matrix. Methods in
@@ -197,6 +296,7 @@ class BaseSolverOutput(ABC):
                 - 'percentile' - determine threshold by percentile below which entries are set to 0. Hence, between 0
                   and 100.
                 - 'min_row' - choose the threshold such that each row has at least one non-zero entry.
+                - 'top_k' - keep only the ``k`` largest entries in each row.
 
         value
             Value to use for sparsification depending on ``mode``:
@@ -204,21 +304,32 @@ class BaseSolverOutput(ABC):
                 - `'threshold'` - `value` sets the threshold below which entries are set to 0.
                 - `percentile` - `value` is the percentile below which entries are set to 0.
                 - `min_row` - `value` is not used.
+                - `top_k` - `value` is not used.
         batch_size
             How many rows of the transport matrix to sparsify per batch.
         n_samples
-            If ``mode = 'percentile'``, determine the number of samples based on which the percentile
-            is computed stochastically. Note this means that a matrix of shape
-            `[n_samples, min(transport_matrix.shape)]` has to be instantiated. If `None`, ``n_samples`` is set to
+            If ``mode = 'percentile'``, determine the number of rows based on which the percentile
+            is computed stochastically. The rows are taken from randomly chosen batches, i.e., a matrix of shape
+            `[n_samples, transport_matrix.shape[1]]` has to be instantiated. If `None`, ``n_samples`` is set to
             ``batch_size``.
         seed
             Random seed needed for sampling if ``mode = 'percentile'``.
+        k
+            If ``mode = 'top_k'``, the number of entries to keep in each row.
+        n_jobs
+            Number of batches to compute in parallel. If `None`, use 1 job.
+        path
+            Directory where to incrementally write the ``data`` and ``indices`` of the sparsified transport matrix.
+            The arrays of the returned matrix are memory-mapped from there. If `None`, keep them in memory.
 
         Returns
         -------
         Solve output with a sparsified transport matrix.
         """
+        if batch_size <= 0:
+            raise ValueError(f"Expected `batch_size` to be positive, found `{batch_size}`.")
         n, m = self.shape
+        thr = -np.inf
         if mode == "threshold":
             if value is None:
                 raise ValueError("If `mode` is `threshold`, `threshold` must not be `None`.")
@@ -227,33 +338,94 @@ class BaseSolverOutput(ABC):
             if value is None:
                 raise ValueError("If `mode` is `percentile`, `threshold` must not be `None`.")
             rng = np.random.RandomState(seed=seed)
-            n_samples = n_samples if n_samples is not None else batch_size
-            k = min(n_samples, n)
-            x = np.zeros((m, k))
-            rows = rng.choice(m, size=k)
-            x[rows, np.arange(k)] = 1.0
-            res = self.pull(x, scale_by_marginals=False)  # tmap @ indicator_vectors
+            n_samples = min(n_samples if n_samples is not None else batch_size, n)
+            starts = np.arange(0, n, batch_size)
+            starts = np.sort(rng.choice(starts, size=min(len(starts), -(-n_samples // batch_size)), replace=False))
+            res = np.concatenate([block for _, block in self._iter_transport_blocks(batch_size, n_jobs, starts)])
+            res = res[rng.choice(len(res), size=min(n_samples, len(res)), replace=False)]
             thr = np.percentile(res, value)
         elif mode == "min_row":
-            thr = np.inf
-            for batch in range(0, m, batch_size):
-                x = np.eye(m, min(batch_size, m - batch), -(min(batch, m)))
-                res = self.pull(x, scale_by_marginals=False)  # tmap @ indicator_vectors
-                thr = min(thr, res.max(axis=1).min())
+            # smallest row-wise maximum within any batch of `batch_size` columns
+            col_starts = np.arange(0, m, batch_size)
+            thr = min(
+                np.maximum.reduceat(block, col_starts, axis=1).min()
+                for _, block in self._iter_transport_blocks(batch_size, n_jobs)
+            )
+        elif mode == "top_k":
+            if k is None or k <= 0:
+                raise ValueError(f"If `mode` is `top_k`, `k` must be a positive integer, found `{k}`.")
+            k = min(k, m)
         else:
             raise NotImplementedError(mode)
 
-        k, func, fn_stack = (n, self.push, sp.vstack) if n < m else (m, self.pull, sp.hstack)
-        tmaps_sparse: List[sp.csr_matrix] = []
-        for batch in range(0, k, batch_size):
-            x = np.eye(k, min(batch_size, k - batch), -(min(batch, k)))
-            res = func(x, scale_by_marginals=False)
-            res[res < thr] = 0
-            tmaps_sparse.append(sp.csr_matrix(res.T if n < m else res))
+        # `scipy` would otherwise copy the (memory-mapped) arrays to cast them to its index dtype
+        index_dtype = np.int32 if n * m < np.iinfo(np.int32).max else np.int64
+        indptr, data_blocks, indices_blocks, nnz = [np.zeros(1, dtype=index_dtype)], [], [], 0
+        files = None
+        with contextlib.ExitStack() as stack:
+            if path is not None:
+                os.makedirs(path, exist_ok=True)
+                files = tuple(
+                    stack.enter_context(open(os.path.join(path, fname), "wb")) for fname in ("data.bin", "indices.bin")
+                )
+            dtype: DTypeLike = np.float64
+            for _, block in self._iter_transport_blocks(batch_size, n_jobs):
+                if mode == "top_k":
+                    cols = np.argpartition(block, m - k, axis=1)[:, m - k :]
+                    vals = np.take_along_axis(block, cols, axis=1)
+                    tmap = sp.csr_matrix(
+                        (vals.ravel(), cols.ravel(), np.arange(0, vals.size + 1, k)), shape=block.shape
+                    )
+                    tmap.eliminate_zeros()
+                    tmap.sort_indices()
+                else:
+                    tmap = sp.csr_matrix(np.where(block < thr, 0, block))
+                dtype = tmap.dtype
+                indptr.append((tmap.indptr[1:] + nnz).astype(index_dtype))
+                nnz += tmap.nnz
+                if files is None:
+                    data_blocks.append(tmap.data)
+                    indices_blocks.append(tmap.indices.astype(index_dtype, copy=False))
+                else:
+                    tmap.data.tofile(files[0])
+                    tmap.indices.astype(index_dtype, copy=False).tofile(files[1])
+
+        if files is None or nnz == 0:
+            data = np.concatenate(data_blocks) if data_blocks else np.empty((0,), dtype=dtype)
+            indices = np.concatenate(indices_blocks) if indices_blocks else np.empty((0,), dtype=index_dtype)
+        else:
+            data = np.memmap(files[0].name, dtype=dtype, mode="r", shape=(nnz,))
+            indices = np.memmap(files[1].name, dtype=index_dtype, mode="r", shape=(nnz,))
         return MatrixSolverOutput(
-            transport_matrix=fn_stack(tmaps_sparse), cost=self.cost, converged=self.converged, is_linear=self.is_linear
+            transport_matrix=sp.csr_matrix((data, indices, np.concatenate(indptr)), shape=(n, m)),
+            cost=self.cost,
+            converged=self.converged,
+            is_linear=self.is_linear,
         )
 
+    def _iter_transport_blocks(
+        self, batch_size: int, n_jobs: Optional[int] = None, starts: Optional[Iterable[int]] = None
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        # yield dense row blocks of the transport matrix in order, computing `n_jobs` of them at a time
+        from joblib import Parallel, delayed, effective_n_jobs
+
+        def get_block(start: int) -> np.ndarray:
+            tmap = self._transport_block(start, min(start + batch_size, n))
+            return np.asarray(tmap.toarray() if sp.issparse(tmap) else tmap)
+
+        n = self.shape[0]
+        starts = list(range(0, n, batch_size) if starts is None else starts)
+        if n_jobs is None or n_jobs == 1:
+            for start in starts:
+                yield start, get_block(start)
+            return
+
+        n_parallel = effective_n_jobs(n_jobs)
+        with Parallel(n_jobs=n_jobs, backend="threading") as parallel:
+            for i in range(0, len(starts), n_parallel):
+                chunk = starts[i : i + n_parallel]
+                yield from zip(chunk, parallel(delayed(get_block)(start) for start in chunk))
+
     @property
     def a(self) -> ArrayLike:
         """Marginals of the source distribution.
@@ -326,6 +498,9 @@ class MatrixSolverOutput(BaseSolverOutput):
             return self.transport_matrix.T @ x
         return self.transport_matrix @ x
 
+    def _transport_block(self, start: int, stop: int) -> ArrayLike:
+        return self.transport_matrix[start:stop]
+
     @property
     def transport_matrix(self) -> ArrayLike:  # noqa: D102
         return self._transport_matrix
@@ -371,6 +546,207 @@ class MatrixSolverOutput(BaseSolverOutput):
         return jnp.ones((n,), dtype=self.transport_matrix.dtype)
 
 
+class StoredSolverOutput(BaseSolverOutput):
+    """Optimal transport output stored in an HDF5 file.
+
+    The file is only opened on first access and the :attr:`transport_matrix` (or its low-rank factors) is read
+    in chunks of rows when pushing or pulling, so the solution never has to be loaded into memory as a whole.
+
+    Parameters
+    ----------
+    path
+        Path to the HDF5 file.
+    group
+        Name of the group containing the solution, see :meth:`write`.
+    batch_size
+        Number of rows of the :attr:`transport_matrix` to read at once.
+    """
+
+    def __init__(self, path: PathLike, group: str, *, batch_size: int = 1024):
+        super().__init__()
+        self._path = str(path)
+        self._group = group
+        self._batch_size = batch_size
+        self._file: Any = None
+
+    @staticmethod
+    def write(
+        output: BaseSolverOutput, path: PathLike, group: str, *, batch_size: int = 1024
+    ) -> "StoredSolverOutput":
+        """Write a solver output to an HDF5 file.
+
+        Parameters
+        ----------
+        output
+            Output to write.
+        path
+            Path to the HDF5 file. If it already exists, it will be appended to.
+        group
+            Name of the group where to store the solution and its marginals. If it already exists, it will be
+            overwritten.
+        batch_size
+            Chunk size along the first dimension of the stored arrays.
+
+        Returns
+        -------
+        The stored output.
+        """
+        import h5py
+
+        n, m = output.shape
+        with h5py.File(path, "a") as f:
+            if group in f:
+                del f[group]
+            g = f.create_group(group)
+            g.attrs["shape"] = (n, m)
+            g.attrs["cost"] = output.cost
+            g.attrs["converged"] = output.converged
+            g.attrs["is_linear"] = output.is_linear
+
+            factors = output._low_rank_factors
+            if factors is not None:
+                for name, arr in zip("qrg", factors):
+                    arr = np.asarray(arr)
+                    g.create_dataset(name, data=arr, chunks=(min(batch_size, len(arr)),) + arr.shape[1:])
+                a, b = np.asarray(output.a), np.asarray(output.b)
+            else:
+                ds = g.create_dataset(
+                    "transport_matrix", shape=(n, m), dtype=output.dtype, chunks=(min(batch_size, n), m)
+                )
+                # the marginals are computed from the same blocks of rows
+                a, b = np.zeros((n,), dtype=ds.dtype), np.zeros((m,), dtype=ds.dtype)
+                for start, block in output._iter_transport_blocks(batch_size):
+                    ds[start : start + len(block)] = block
+                    a[start : start + len(block)] = block.sum(axis=1)
+                    b += block.sum(axis=0)
+            for name, arr in zip("ab", (a, b)):
+                g.create_dataset(name, data=arr, chunks=(min(batch_size, len(arr)),))
+
+            if output.potentials is not None:
+                pots = g.create_group("potentials")
+                for name, arr in zip("fg", output.potentials):
+                    arr = np.asarray(arr)
+                    pots.create_dataset(name, data=arr, chunks=(min(batch_size, len(arr)),))
+
+        return StoredSolverOutput(path, group, batch_size=batch_size)
+
+    @property
+    def _data(self) -> Any:
+        if self._file is None:
+            import h5py
+
+            self._file = h5py.File(self._path, "r")
+        return self._file[self._group]
+
+    def _apply(self, x: ArrayLike, *, forward: bool) -> ArrayLike:
+        x = np.asarray(x)
+        if "q" in self._data:
+            q, r, g = self._low_rank_factors  # type: ignore[misc]
+            if forward:
+                q, r = r, q
+            g = g[:, None] if x.ndim == 2 else g
+            return q @ ((r.T @ x) / g)
+
+        tmap = self._data["transport_matrix"]
+        n, m = self.shape
+        if forward:
+            res = np.zeros((m,) + x.shape[1:], dtype=np.result_type(tmap.dtype, x.dtype))
+            for start in range(0, n, self._batch_size):
+                stop = min(start + self._batch_size, n)
+                res += tmap[start:stop].T @ x[start:stop]
+            return res
+        return np.concatenate(
+            [tmap[start : start + self._batch_size] @ x for start in range(0, n, self._batch_size)], axis=0
+        )
+
+    def _transport_block(self, start: int, stop: int) -> ArrayLike:
+        if "q" in self._data:
+            q, r, g = self._low_rank_factors  # type: ignore[misc]
+            return (q[start:stop] / g[None, :]) @ r.T
+        return self._data["transport_matrix"][start:stop]
+
+    @property
+    def a(self) -> ArrayLike:  # noqa: D102
+        # outputs written before the marginals were stored
+        return self._data["a"][()] if "a" in self._data else super().a
+
+    @property
+    def b(self) -> ArrayLike:  # noqa: D102
+        return self._data["b"][()] if "b" in self._data else super().b
+
+    @property
+    def transport_matrix(self) -> ArrayLike:  # noqa: D102
+        if "q" in self._data:
+            q, r, g = self._low_rank_factors  # type: ignore[misc]
+            return (q / g[None, :]) @ r.T
+        return self._data["transport_matrix"][()]
+
+    @property
+    def shape(self) -> Tuple[int, int]:  # noqa: D102
+        n, m = self._data.attrs["shape"]
+        return int(n), int(m)
+
+    @property
+    def cost(self) -> float:  # noqa: D102
+        return float(self._data.attrs["cost"])
+
+    @property
+    def converged(self) -> bool:  # noqa: D102
+        return bool(self._data.attrs["converged"])
+
+    @property
+    def potentials(self) -> Optional[Tuple[ArrayLike, ArrayLike]]:  # noqa: D102
+        if "potentials" not in self._data:
+            return None
+        pots = self._data["potentials"]
+        return pots["f"][()], pots["g"][()]
+
+    @property
+    def is_linear(self) -> bool:  # noqa: D102
+        return bool(self._data.attrs["is_linear"])
+
+    @property
+    def rank(self) -> int:  # noqa: D102
+        return len(self._data["g"]) if "g" in self._data else -1
+
+    @property
+    def _low_rank_factors(self) -> Optional[Tuple[ArrayLike, ArrayLike, ArrayLike]]:
+        if "q" not in self._data:
+            return None
+        return self._data["q"][()], self._data["r"][()], self._data["g"][()]
+
+    @property
+    def dtype(self) -> DTypeLike:  # noqa: D102
+        key = "q" if "q" in self._data else "transport_matrix"
+        return self._data[key].dtype
+
+    @property
+    def path(self) -> str:
+        """Path to the HDF5 file."""
+        return self._path
+
+    def to(  # noqa: D102
+        self, device: Optional[Device_t] = None
+    ) -> "BaseSolverOutput":
+        if device is not None:
+            logger.warning(f"`{self!r}` does not support the `device` argument, ignoring.")
+        return self
+
+    def _ones(self, n: int) -> ArrayLike:
+        return np.ones((n,), dtype=self.dtype)
+
+    def _relocate(self, root: PathLike) -> None:
+        # make a path relative to the saved problem absolute
+        if not os.path.isabs(self._path):
+            self._path = os.path.join(root, self._path)
+        self._file = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+
 class BaseNeuralOutput(BaseSolverOutput, ABC):
     """Base class for output of."""
 
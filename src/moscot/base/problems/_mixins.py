@@ -15,6 +15,7 @@ from typing import (
 
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from scipy.sparse.linalg import LinearOperator
 
 import scanpy as sc
@@ -23,13 +24,15 @@ from anndata import AnnData
 from moscot import _constants
 from moscot._docs._docs import d
 from moscot._logging import logger
-from moscot._types import ArrayLike, Numeric_t, Str_Dict_t
+from moscot._types import ArrayLike, Numeric_t, PathLike, Str_Dict_t
 from moscot.base.output import BaseSolverOutput
 from moscot.base.problems._utils import (
     _check_argument_compatibility_cell_transition,
     _correlation_test,
     _get_df_cell_transition,
+    _get_group_indicator,
     _order_transition_matrix,
+    _sample_categorical,
     _validate_annotations,
     _validate_args_cell_transition,
 )
@@ -68,6 +71,15 @@ class AnalysisMixinProtocol(Protocol[K, B]):
     ) -> LinearOperator:
         ...
 
+    def _transport_operator(
+        self: "AnalysisMixinProtocol[K, B]",
+        path: Sequence[Tuple[K, K]],
+        *,
+        scale_by_marginals: bool = False,
+        precompute_low_rank: bool = True,
+    ) -> LinearOperator:
+        ...
+
     def _flatten(
         self: "AnalysisMixinProtocol[K, B]",
         data: Dict[K, ArrayLike],
@@ -97,6 +109,7 @@ class AnalysisMixinProtocol(Protocol[K, B]):
         other_adata: Optional[str] = None,
         batch_size: Optional[int] = None,
         normalize: bool = True,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         ...
 
@@ -161,6 +174,7 @@ class AnalysisMixin(Generic[K, B]):
         other_adata: Optional[str] = None,
         batch_size: Optional[int] = None,
         normalize: bool = True,
+        memmap_path: Optional[PathLike] = None,
         **_: Any,
     ) -> pd.DataFrame:
         source_annotation_key, source_annotations, source_annotations_ordered = _validate_args_cell_transition(
@@ -208,6 +222,7 @@ class AnalysisMixin(Generic[K, B]):
                     annotation_key=source_annotation_key,
                     annotations_1=source_annotations_verified,
                     annotations_2=target_annotations_verified,
+                    df_from=df_source,
                     df=df_target,
                     tm=tm,
                     forward=True,
@@ -219,14 +234,19 @@ class AnalysisMixin(Generic[K, B]):
                     annotation_key=target_annotation_key,
                     annotations_1=target_annotations_verified,
                     annotations_2=source_annotations_verified,
+                    df_from=df_target,
                     df=df_source,
                     tm=tm,
                     forward=False,
                 )
         elif aggregation_mode == "cell":
-            tm = pd.DataFrame(columns=target_annotations_verified if forward else source_annotations_verified)
+            # aggregate the annotations in their final order, reordering afterwards would copy a memory-mapped result
             if forward:
-                tm = self._cell_aggregation_transition(  # type: ignore[attr-defined]
+                if target_annotations_ordered is not None:
+                    target_annotations_verified = [
+                        ann for ann in target_annotations_ordered if ann in target_annotations_verified
+                    ]
+                return self._cell_aggregation_transition(  # type: ignore[attr-defined]
                     source=source,
                     target=target,
                     annotation_key=target_annotation_key,
@@ -234,23 +254,28 @@ class AnalysisMixin(Generic[K, B]):
                     annotations_2=target_annotations_verified,
                     df_1=df_target,
                     df_2=df_source,
-                    tm=tm,
                     batch_size=batch_size,
                     forward=True,
+                    normalize=normalize,
+                    memmap_path=memmap_path,
                 )
-            else:
-                tm = self._cell_aggregation_transition(  # type: ignore[attr-defined]
-                    source=source,
-                    target=target,
-                    annotation_key=source_annotation_key,
-                    annotations_1=target_annotations_verified,
-                    annotations_2=source_annotations_verified,
-                    df_1=df_source,
-                    df_2=df_target,
-                    tm=tm,
-                    batch_size=batch_size,
-                    forward=False,
-                )
+            if source_annotations_ordered is not None:
+                source_annotations_verified = [
+                    ann for ann in source_annotations_ordered if ann in source_annotations_verified
+                ]
+            return self._cell_aggregation_transition(  # type: ignore[attr-defined]
+                source=source,
+                target=target,
+                annotation_key=source_annotation_key,
+                annotations_1=target_annotations_verified,
+                annotations_2=source_annotations_verified,
+                df_1=df_source,
+                df_2=df_target,
+                batch_size=batch_size,
+                forward=False,
+                normalize=normalize,
+                memmap_path=memmap_path,
+            )
         else:
             raise NotImplementedError(f"Aggregation mode `{aggregation_mode!r}` is not yet implemented.")
 
@@ -275,9 +300,10 @@ class AnalysisMixin(Generic[K, B]):
         batch_size: int = 256,
         account_for_unbalancedness: bool = False,
         interpolation_parameter: Optional[Numeric_t] = None,
-        seed: Optional[int] = None,
+        seed: Optional[Union[int, ArrayLike]] = None,
     ) -> Tuple[List[Any], List[ArrayLike]]:
-        rng = np.random.RandomState(seed)
+        # a `jax.random.PRNGKey` allows sampling on the device
+        rng = np.random.RandomState(seed) if seed is None or isinstance(seed, (int, np.integer)) else seed
         if account_for_unbalancedness and interpolation_parameter is None:
             raise ValueError("When accounting for unbalancedness, interpolation parameter must be provided.")
         if interpolation_parameter is not None and not (0 < interpolation_parameter < 1):
@@ -311,35 +337,46 @@ class AnalysisMixin(Generic[K, B]):
             )
         ).squeeze()
 
-        rows_sampled = rng.choice(source_dim, p=row_probability / row_probability.sum(), size=n_samples)
+        row_probability = row_probability / row_probability.sum()
+        if isinstance(rng, np.random.RandomState):
+            rows_sampled = rng.choice(source_dim, p=row_probability, size=n_samples)
+        else:
+            import jax
+
+            rng, key = jax.random.split(rng)
+            rows_sampled = np.asarray(jax.random.choice(key, source_dim, shape=(n_samples,), p=row_probability))
         rows, counts = np.unique(rows_sampled, return_counts=True)
-        all_cols_sampled: List[str] = []
-        for batch in range(0, len(rows), batch_size):
-            rows_batch = rows[batch : batch + batch_size]
-            counts_batch = counts[batch : batch + batch_size]
-            data = np.zeros((source_dim, len(rows_batch)))
-            data[rows_batch, range(len(rows_batch))] = 1
-
-            col_p_given_row = np.asarray(
-                self._apply(
-                    source=source,
-                    target=target,
-                    data=data,
-                    normalize=True,
-                    forward=True,
-                    scale_by_marginals=False,
-                    explicit_steps=[(source, target)],
-                )
-            ).squeeze()
+
+        solution = self.solutions[source, target]
+        factors = solution._low_rank_factors
+        if factors is not None:
+            # `P(col | row) = sum_z P(z | row) * P(col | z)`, so first sample the latent component `z`
+            q, r, g = (np.asarray(f) for f in factors)
+            r = r / col_sums[:, None] if account_for_unbalancedness else r
+            latent_sampled, rng = _sample_categorical(q[rows] / g[None, :] * r.sum(axis=0)[None, :], counts, rng)
+            latent = np.concatenate(latent_sampled)
+            counts_latent = np.bincount(latent, minlength=len(g))
+            nonempty = counts_latent > 0
+            cols_sampled, rng = _sample_categorical(r.T[nonempty], counts_latent[nonempty], rng)
+            cols = np.empty_like(latent)
+            cols[np.argsort(latent, kind="stable")] = np.concatenate(cols_sampled)
+            return rows, np.split(cols, np.cumsum(counts)[:-1])  # type: ignore[return-value]
+
+        # sample the columns given the rows from the corresponding rows of the transport matrix,
+        # processing `batch_size` rows of the transport matrix at a time
+        all_cols_sampled: List[ArrayLike] = []
+        for start in range(0, source_dim, batch_size):
+            lo, hi = np.searchsorted(rows, [start, start + batch_size])
+            if lo == hi:
+                continue
+            tmap = solution._transport_block(start, min(start + batch_size, source_dim))
+            tmap = np.asarray(tmap.todense() if sp.issparse(tmap) else tmap)
+            col_p_given_row = tmap[rows[lo:hi] - start]
             if account_for_unbalancedness:
                 if TYPE_CHECKING:
                     assert isinstance(col_sums, np.ndarray)
-                col_p_given_row = col_p_given_row / col_sums[:, None]
-
-            cols_sampled = [
-                rng.choice(a=target_dim, size=counts_batch[i], p=col_p_given_row[:, i] / col_p_given_row[:, i].sum())
-                for i in range(len(rows_batch))
-            ]
+                col_p_given_row = col_p_given_row / col_sums[None, :]
+            cols_sampled, rng = _sample_categorical(col_p_given_row, counts[lo:hi], rng)
             all_cols_sampled.extend(cols_sampled)
         return rows, all_cols_sampled  # type: ignore[return-value]
 
@@ -354,13 +391,15 @@ class AnalysisMixin(Generic[K, B]):
         if TYPE_CHECKING:
             assert isinstance(self._policy, SubsetPolicy)
         # TODO(@MUCDK, @giovp, discuss what exactly this function should do, seems like it could be more generic)
-        fst, *rest = path
-        return self.solutions[fst].chain([self.solutions[r] for r in rest], scale_by_marginals=scale_by_marginals)
+        return self._transport_operator(path, scale_by_marginals=scale_by_marginals)
 
     def _flatten(self: AnalysisMixinProtocol[K, B], data: Dict[K, ArrayLike], *, key: Optional[str]) -> ArrayLike:
         tmp = np.full(len(self.adata), np.nan)
         for k, v in data.items():
-            mask = self.adata.obs[key] == k
+            if key == self._policy._subset_key:
+                mask = self._policy.indices(k, allow_empty=True)
+            else:
+                mask = self.adata.obs[key] == k
             tmp[mask] = np.squeeze(v)
         return tmp
 
@@ -371,19 +410,31 @@ class AnalysisMixin(Generic[K, B]):
         annotation_key: str,
         annotations_1: List[Any],
         annotations_2: List[Any],
+        df_from: pd.DataFrame,
         df: pd.DataFrame,
         tm: pd.DataFrame,
         forward: bool,
     ) -> pd.DataFrame:
         if not forward:
             tm = tm.T
-        func = self.push if forward else self.pull
-        for subset in annotations_1:
+        groups_1 = _get_group_indicator(df_from[annotation_key], annotations_1)
+        groups_2 = _get_group_indicator(df[annotation_key], annotations_2)
+        problem = self.problems.get((source, target), None)
+        factors = None if problem is None or problem.solution is None else problem.solution._low_rank_factors
+        if factors is not None:
+            # `groups_1.T @ T @ groups_2` through the factors in `O((n + m) * rank)`
+            q, r, g = (np.asarray(f) for f in factors)
+            if not forward:
+                q, r = r, q
+            cell_dist = ((groups_1.T @ q) / g[None, :]) @ (groups_2.T @ r).T
+        else:
+            func = self.push if forward else self.pull
+            # push/pull all annotations at once, one (normalized) column per annotation in `annotations_1`
             result = func(  # TODO(@MUCDK) check how to make compatible with all policies
                 source=source,
                 target=target,
-                data=annotation_key,
-                subset=subset,
+                data=groups_1.toarray(),
+                subset=None,
                 normalize=True,
                 return_all=False,
                 scale_by_marginals=False,
@@ -391,13 +442,11 @@ class AnalysisMixin(Generic[K, B]):
                 key_added=None,
                 return_data=True,
             )
-            df["distribution"] = result
-            cell_dist = df[df[annotation_key].isin(annotations_2)].groupby(annotation_key).sum(numeric_only=True)
-            cell_dist /= cell_dist.sum()
-            tm.loc[subset, :] = [
-                cell_dist.loc[annotation, "distribution"] if annotation in cell_dist.distribution.index else 0
-                for annotation in annotations_2
-            ]
+            # aggregate the cells by their annotation in `annotations_2`
+            cell_dist = np.asarray(groups_2.T @ np.asarray(result)).T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cell_dist = cell_dist / cell_dist.sum(axis=1, keepdims=True)
+        tm.loc[list(annotations_1), list(annotations_2)] = cell_dist
         return tm
 
     def _cell_aggregation_transition(
@@ -410,13 +459,22 @@ class AnalysisMixin(Generic[K, B]):
         annotations_2: List[Any],
         df_1: pd.DataFrame,
         df_2: pd.DataFrame,
-        tm: pd.DataFrame,
         batch_size: Optional[int],
         forward: bool,
+        normalize: bool = False,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         func = self.push if forward else self.pull
         if batch_size is None:
             batch_size = len(df_2)
+        # `[n_cells_1, n_groups]`, aggregates the pushed/pulled mass of each cell in `df_2` by its annotation
+        indicator = _get_group_indicator(df_1[annotation_key], annotations_2)
+        shape = (len(df_2), len(annotations_2))
+        if memmap_path is None:
+            out = np.zeros(shape, dtype=float)
+        else:
+            out = np.lib.format.open_memmap(memmap_path, mode="w+", dtype=float, shape=shape)
+
         for batch in range(0, len(df_2), batch_size):
             result = func(  # TODO(@MUCDK) check how to make compatible with all policies
                 source=source,
@@ -430,12 +488,17 @@ class AnalysisMixin(Generic[K, B]):
                 key_added=None,
                 return_data=True,
             )
-            current_cells = df_2.iloc[range(batch, min(batch + batch_size, len(df_2)))].index.tolist()
-            df_1.loc[:, current_cells] = result
-            to_app = df_1[df_1[annotation_key].isin(annotations_2)].groupby(annotation_key).sum().transpose()
-            tm = pd.concat([tm, to_app], verify_integrity=True, axis=0)
-            df_1 = df_1.drop(current_cells, axis=1)
-        return tm
+            res = np.asarray(indicator.T @ np.asarray(result)).T
+            if normalize:
+                res = res / res.sum(axis=1, keepdims=True)
+            out[batch : batch + batch_size] = res
+
+        if isinstance(out, np.memmap):
+            out.flush()
+        if forward:
+            return pd.DataFrame(out, index=df_2.index, columns=annotations_2, copy=False)
+        # the transpose of a memory-mapped array is a view of the same file
+        return pd.DataFrame(out.T, index=annotations_2, columns=df_2.index, copy=False)
 
     # adapted from CellRank (github.com/theislab/cellrank)
     @d.dedent
@@ -534,8 +597,15 @@ class AnalysisMixin(Generic[K, B]):
         elif features is None:
             features = list(self.adata.var_names)
 
+        if adata.var_names.isin(features).sum() == len(features):
+            # keep the (sparse) expression as is, it's only accessed in blocks of cells
+            adata = adata[:, features]
+            X = adata.X if layer is None else adata.layers[layer]
+        else:
+            X = sc.get.obs_df(adata, keys=features, layer=layer).values
+
         return _correlation_test(
-            X=sc.get.obs_df(adata, keys=features, layer=layer).values,
+            X=X,
             Y=distribution,
             feature_names=features,
             corr_method=corr_method,
@@ -670,13 +740,6 @@ class NeuralAnalysisMixin(AnalysisMixin[K, B]):
             key_target, target_data, adata_tgt = target, None, self.adata  # type:ignore[attr-defined]
 
         problem = self.problems[key_source, key_target]  # type:ignore[attr-defined]
-        try:
-            tm_result = problem.solution.transport_matrix if forward else problem.solution.inverse_transport_matrix
-        except ValueError:
-            logger.info(f"Projecting transport matrix based on {k} nearest neighbors.")
-            tm_result = problem.project_transport_matrix(
-                source_data, target_data, forward=forward, save_transport_matrix=True, batch_size=batch_size, k=k
-            )
 
         annotation_key_source, annotations_present_source, annotations_ordered_source = _validate_args_cell_transition(
             adata_src, source_groups
@@ -704,16 +767,31 @@ class NeuralAnalysisMixin(AnalysisMixin[K, B]):
             aggregation_mode="annotation",
             forward=forward,
         )
+        groups_src = _get_group_indicator(df_source[annotation_key_source], annotations_verified_source)
+        groups_tgt = _get_group_indicator(df_target[annotation_key_target], annotations_verified_target)
+        try:
+            # only raises if the transport matrix has not been projected and saved
+            tm_result = problem.solution.transport_matrix if forward else problem.solution.inverse_transport_matrix
+        except ValueError:
+            logger.info(f"Projecting transport matrix based on {k} nearest neighbors.")
+            # stream the projection batch by batch into the group-level transition matrix
+            tm_agg = problem.project_transport_matrix(
+                source_data,
+                target_data,
+                forward=forward,
+                batch_size=batch_size,
+                k=k,
+                aggregate_by=(groups_src, groups_tgt),
+            )
+        else:
+            if not sp.issparse(tm_result):
+                tm_result = np.asarray(tm_result)
+            tm_agg = groups_src.T @ tm_result @ groups_tgt
         tm = pd.DataFrame(
-            np.zeros((len(annotations_verified_source), len(annotations_verified_target))),
+            np.asarray(tm_agg.todense() if sp.issparse(tm_agg) else tm_agg),
             index=annotations_verified_source,
             columns=annotations_verified_target,
         )
-        for annotation_src in annotations_verified_source:
-            for annotation_tgt in annotations_verified_target:
-                tm.loc[annotation_src, annotation_tgt] = tm_result[
-                    np.ix_((df_source == annotation_src).squeeze(), (df_target == annotation_tgt).squeeze())
-                ].sum()
         annotations_ordered_source = tm.index if annotations_ordered_source is None else annotations_ordered_source
         annotations_ordered_target = tm.columns if annotations_ordered_target is None else annotations_ordered_target
         tm = tm.reindex(annotations_ordered_source)[annotations_ordered_target]
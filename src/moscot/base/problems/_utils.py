@@ -21,6 +21,7 @@ from typing import (
 import joblib as jl
 
 if TYPE_CHECKING:
+    from moscot.base.output import BaseSolverOutput
     from moscot.base.problems.compound_problem import BaseCompoundProblem
     from moscot.base.problems.problem import BaseProblem
 
@@ -30,6 +31,7 @@ from statsmodels.stats.multitest import multipletests
 import numpy as np
 import pandas as pd
 import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator
 from scipy.stats import norm, rankdata
 
 from anndata import AnnData
@@ -40,6 +42,9 @@ from moscot._types import ArrayLike, Str_Dict_t
 
 Callback = Callable[..., Any]
 
+_CORR_BATCH_SIZE = 4096
+_PERM_BATCH_SIZE = 64
+
 
 def _validate_annotations(
     df_source: pd.DataFrame,
@@ -127,6 +132,32 @@ def _get_df_cell_transition(
     return adata.obs[list(set(annotation_keys))].copy()
 
 
+def _get_group_indicator(annotations: pd.Series, groups: Sequence[Any]) -> sp.csr_matrix:
+    # sparse one-hot matrix of shape `[n_cells, n_groups]`, cells not belonging to any of the `groups` are all 0
+    codes = pd.Categorical(annotations, categories=groups).codes
+    rows = np.flatnonzero(codes >= 0)
+    return sp.csr_matrix(
+        (np.ones(len(rows), dtype=float), (rows, codes[rows])), shape=(len(annotations), len(groups))
+    )
+
+
+def _slice_matrix(data: Union[ArrayLike, sp.spmatrix], rows: ArrayLike, cols: ArrayLike) -> ArrayLike:
+    """Get ``data[rows][:, cols]`` for sorted integer indices, using basic slicing for contiguous indices."""
+
+    def as_slice(ixs: ArrayLike) -> Union[slice, ArrayLike]:
+        if len(ixs) and ixs[-1] - ixs[0] + 1 == len(ixs):
+            return slice(ixs[0], ixs[-1] + 1)
+        return ixs
+
+    rows, cols = as_slice(rows), as_slice(cols)
+    if isinstance(rows, slice) or isinstance(cols, slice):
+        # for (memory-mapped) arrays, the basic slicing only creates a view
+        return data[rows, cols] if isinstance(cols, slice) or sp.issparse(data) else data[rows][:, cols]
+    if sp.issparse(data):
+        return data[rows][:, cols]
+    return data[np.ix_(rows, cols)]
+
+
 def _validate_args_cell_transition(
     adata: AnnData,
     arg: Str_Dict_t,
@@ -281,7 +312,7 @@ def _correlation_test(
         - ``ci_high`` - upper bound of the ``confidence_level`` correlation confidence interval.
     """
     corr, pvals, ci_low, ci_high = _correlation_test_helper(
-        X.T,
+        X,
         Y.values,
         corr_method=corr_method,
         significance_method=significance_method,
@@ -323,7 +354,7 @@ def _correlation_test(
 
 
 def _correlation_test_helper(
-    X: ArrayLike,
+    X: Union[ArrayLike, sp.spmatrix],
     Y: ArrayLike,
     corr_method: Literal["pearson", "spearman"] = "spearman",
     significance_method: Literal["fischer", "perm_test"] = "fischer",
@@ -333,12 +364,12 @@ def _correlation_test_helper(
     **kwargs: Any,
 ) -> Tuple[ArrayLike, ArrayLike, ArrayLike, ArrayLike]:
     """
-    Compute the correlation between rows in matrix ``X`` columns of matrix ``Y``.
+    Compute the correlation between columns in matrix ``X`` and columns of matrix ``Y``.
 
     Parameters
     ----------
     X
-        Array or matrix of `(M, N)` elements.
+        Array or sparse matrix of `(N, M)` elements.
     Y
         Array of `(N, K)` elements.
     corr_method
@@ -373,16 +404,18 @@ def _correlation_test_helper(
     if not (0 <= confidence_level <= 1):
         raise ValueError(f"Expected `confidence_level` to be in interval `[0, 1]`, found `{confidence_level}`.")
 
-    n = X.shape[1]  # genes x cells
+    n = X.shape[0]  # cells x genes
     ql = 1 - confidence_level - (1 - confidence_level) / 2.0
     qh = confidence_level + (1 - confidence_level) / 2.0
 
-    if sp.issparse(X):
-        X = sp.csr_matrix(X)
-
+    Y = np.asarray(Y, dtype=np.float64)
     if corr_method == "spearman":
-        X, Y = rankdata(X, method="average", axis=0), rankdata(Y, method="average", axis=0)
-    corr = _pearson_mat_mat_corr_sparse(X, Y) if sp.issparse(X) else _pearson_mat_mat_corr_dense(X, Y)
+        X, Y = _rank_columns(X), rankdata(Y, method="average", axis=0)
+    elif sp.issparse(X):
+        X = sp.csr_matrix(X)
+    else:
+        X = np.asarray(X)
+    corr = _pearson_mat_mat_corr(X, Y)
 
     if significance_method == "fischer":
         # see: https://en.wikipedia.org/wiki/Pearson_correlation_coefficient#Using_the_Fisher_transformation
@@ -416,34 +449,77 @@ def _correlation_test_helper(
     return corr, pvals, corr_ci_low, corr_ci_high
 
 
-def _pearson_mat_mat_corr_sparse(
-    X: sp.csr_matrix,
+def _rank_columns(X: Union[ArrayLike, sp.spmatrix]) -> Union[ArrayLike, sp.csr_matrix]:
+    """Rank the columns of ``X``.
+
+    For sparse ``X``, the ranks are shifted such that the zeros have rank `0`, which keeps the sparsity pattern
+    and doesn't change the correlations.
+    """
+    if not sp.issparse(X):
+        return rankdata(np.asarray(X), method="average", axis=0)
+
+    X = sp.csc_matrix(X, dtype=np.float64, copy=True)
+    X.sum_duplicates()
+    X.eliminate_zeros()
+    n, n_cols = X.shape
+    cols = np.repeat(np.arange(n_cols), np.diff(X.indptr))
+    order = np.lexsort((X.data, cols))
+    data, cols = X.data[order], cols[order]
+
+    # average the 1-based ranks of the ties within each column
+    is_new = np.r_[True, (data[1:] != data[:-1]) | (cols[1:] != cols[:-1])]
+    starts = np.flatnonzero(is_new)
+    ends = np.r_[starts[1:], len(data)]
+    ranks = ((starts + ends - 1) / 2.0)[np.cumsum(is_new) - 1] - X.indptr[cols] + 1
+
+    n_zeros = n - np.diff(X.indptr)
+    n_negative = np.bincount(cols[data < 0], minlength=n_cols)
+    ranks += np.where(data > 0, n_zeros[cols], 0)
+    ranks -= (n_negative + (n_zeros + 1) / 2.0)[cols]
+
+    X.data[order] = ranks
+    return X.tocsr()
+
+
+def _xt_dot(
+    X: Union[ArrayLike, sp.csr_matrix], A: ArrayLike, B: ArrayLike, batch_size: int = _CORR_BATCH_SIZE
+) -> Tuple[ArrayLike, ArrayLike]:
+    """Compute ``X.T @ A`` and ``(X ** 2).T @ B`` in one pass over the row blocks of ``X``."""
+    XtA = np.zeros((X.shape[1], A.shape[1]))
+    X2tB = np.zeros((X.shape[1], B.shape[1]))
+    for start in range(0, X.shape[0], batch_size):
+        block = X[start : start + batch_size].astype(np.float64)
+        block_2 = block.power(2) if sp.issparse(block) else block**2
+        XtA += block.T @ A[start : start + batch_size]
+        X2tB += block_2.T @ B[start : start + batch_size]
+    return XtA, X2tB
+
+
+def _pearson_mat_mat_corr(
+    X: Union[ArrayLike, sp.csr_matrix],
     Y: ArrayLike,
+    weights: Optional[ArrayLike] = None,
 ) -> ArrayLike:
-    n = X.shape[1]
-    X_bar = np.reshape(np.array(X.mean(axis=1)), (-1, 1))
-    X_std = np.reshape(np.sqrt(np.array(X.power(2).mean(axis=1)) - (X_bar**2)), (-1, 1))
-
-    y_bar = np.reshape(np.mean(Y, axis=0), (1, -1))
-    y_std = np.reshape(np.std(Y, axis=0), (1, -1))
-
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", RuntimeWarning)
-        return (X @ Y - (n * X_bar * y_bar)) / ((n - 1) * X_std * y_std)
-
-
-def _pearson_mat_mat_corr_dense(X: ArrayLike, Y: ArrayLike) -> ArrayLike:
-    n = X.shape[1]
+    """Pearson correlation between the columns of ``X`` of shape `(N, M)` and of ``Y`` of shape `(N, K)`.
 
-    X_bar = np.reshape(np.mean(X, axis=1), (-1, 1))
-    X_std = np.reshape(np.std(X, axis=1), (-1, 1))
+    If ``weights`` of shape `(N, B)` are passed, compute `B` weighted correlations of shape `(M, B, K)`.
+    """
+    n, m = X.shape
+    w = np.ones((n, 1)) if weights is None else np.asarray(weights, dtype=np.float64)
+    b, k = w.shape[1], Y.shape[1]
 
-    y_bar = np.reshape(np.mean(Y, axis=0), (1, -1))
-    y_std = np.reshape(np.std(Y, axis=0), (1, -1))
+    # the sufficient statistics
+    XtA, sum_xx = _xt_dot(X, np.concatenate([w, (w[:, :, None] * Y[:, None, :]).reshape(n, b * k)], axis=1), w)
+    sum_x, sum_xy = XtA[:, :b], XtA[:, b:].reshape(m, b, k)
+    sum_w, sum_y, sum_yy = w.sum(axis=0), w.T @ Y, w.T @ Y**2
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", RuntimeWarning)
-        return (X @ Y - (n * X_bar * y_bar)) / ((n - 1) * X_std * y_std)
+        cov = sum_xy - sum_x[:, :, None] * sum_y[None] / sum_w[None, :, None]
+        var_x = np.maximum(sum_xx - sum_x**2 / sum_w[None], 0.0)
+        var_y = np.maximum(sum_yy - sum_y**2 / sum_w[:, None], 0.0)
+        corr = cov / np.sqrt(var_x[:, :, None] * var_y[None])
+    return corr[:, 0] if weights is None else corr
 
 
 def _perm_test(
@@ -455,22 +531,23 @@ def _perm_test(
     queue=None,
 ) -> Tuple[ArrayLike, ArrayLike]:
     rs = np.random.RandomState(None if seed is None else seed + ixs[0])
-    cell_ixs = np.arange(X.shape[1])
+    n, k = Y.shape
     pvals = np.zeros_like(corr, dtype=np.float64)
-    corr_bs = np.zeros((len(ixs), X.shape[0], Y.shape[1]))  # perms x genes x lineages
-
-    mmc = _pearson_mat_mat_corr_sparse if sp.issparse(X) else _pearson_mat_mat_corr_dense
+    corr_bs = np.zeros((len(ixs), X.shape[1], k))  # perms x genes x lineages
 
-    for i, _ in enumerate(ixs):
-        rs.shuffle(cell_ixs)
-        corr_i = mmc(X, Y[cell_ixs, :])
-        pvals += np.abs(corr_i) >= np.abs(corr)
+    # a batch of permutations (resp. bootstrap samples) is a single matrix product against `X`
+    for start in range(0, len(ixs), _PERM_BATCH_SIZE):
+        size = min(_PERM_BATCH_SIZE, len(ixs) - start)
+        perms = np.stack([rs.permutation(n) for _ in range(size)], axis=1)  # cells x perms
+        corr_perm = _pearson_mat_mat_corr(X, Y[perms].reshape(n, size * k)).reshape(-1, size, k)
+        pvals += np.sum(np.abs(corr_perm) >= np.abs(corr)[:, None, :], axis=1)
 
-        bootstrap_ixs = rs.choice(cell_ixs, replace=True, size=len(cell_ixs))
-        corr_bs[i, :, :] = mmc(X[:, bootstrap_ixs], Y[bootstrap_ixs, :])
+        weights = rs.multinomial(n, np.full(n, 1.0 / n), size=size).T  # how often is a cell bootstrapped
+        corr_bs[start : start + size] = np.moveaxis(_pearson_mat_mat_corr(X, Y, weights=weights), 1, 0)
 
         if queue is not None:
-            queue.put(1)
+            for _ in range(size):
+                queue.put(1)
 
     if queue is not None:
         queue.put(None)
@@ -712,3 +789,105 @@ def _get_n_cores(n_cores: Optional[int], n_jobs: Optional[int]) -> int:
         return cpu_count() + 1 + n_cores
 
     return n_cores
+
+
+def _compose_transport(
+    solutions: Sequence["BaseSolverOutput"], scale_by_marginals: bool = False, precompute_low_rank: bool = True
+) -> LinearOperator:
+    """
+    Compose transport matrices into a single linear operator.
+
+    Parameters
+    ----------
+    solutions
+        Solutions whose transport matrices :math:`T_1, ..., T_k` are multiplied in this order.
+    scale_by_marginals
+        Whether to scale by marginals, see :meth:`~moscot.base.output.BaseSolverOutput.push`.
+    precompute_low_rank
+        If all transport matrices are low-rank, precompute the factors of the product, so that applying
+        the operator costs as much as applying a single low-rank matrix.
+
+    Returns
+    -------
+    Linear operator of shape ``[n_1, m_k]`` whose ``matvec`` pulls and ``rmatvec`` pushes mass through the chain.
+    """
+    fst, *rest = solutions
+    factors = [sol._low_rank_factors for sol in solutions]
+    if not precompute_low_rank or any(f is None for f in factors):
+        return fst.chain(rest, scale_by_marginals=scale_by_marginals)
+
+    def fold(forward: bool) -> Tuple[ArrayLike, ArrayLike]:
+        # `T_i = q_i @ diag(1 / g_i) @ r_i.T`, so the product is `lhs @ rhs.T` with `lhs` of shape `[n_1, rank_k]`
+        lhs = rhs = None
+        for sol, (q, r, g) in zip(solutions, factors):  # type: ignore[misc]
+            q, r, g = np.asarray(q), np.asarray(r), np.asarray(g)
+            if scale_by_marginals and forward:
+                q = q / (np.asarray(sol.a)[:, None] + 1e-12)
+            elif scale_by_marginals:
+                r = r / (np.asarray(sol.b)[:, None] + 1e-12)
+            q = q / g[None, :]
+            lhs = q if lhs is None else lhs @ (rhs.T @ q)  # type: ignore[union-attr]
+            rhs = r
+        return lhs, rhs  # type: ignore[return-value]
+
+    (lhs_pull, rhs_pull), (lhs_push, rhs_push) = fold(forward=False), fold(forward=True)
+
+    def pull(x: ArrayLike) -> ArrayLike:
+        return lhs_pull @ (rhs_pull.T @ x)
+
+    def push(x: ArrayLike) -> ArrayLike:
+        return rhs_push @ (lhs_push.T @ x)
+
+    shape = (lhs_pull.shape[0], rhs_pull.shape[0])
+    return LinearOperator(shape=shape, dtype=lhs_pull.dtype, matvec=pull, rmatvec=push, matmat=pull, rmatmat=push)
+
+
+def _sample_categorical(
+    probs: ArrayLike, counts: ArrayLike, rng: Union[np.random.RandomState, Any]
+) -> Tuple[List[ArrayLike], Any]:
+    """
+    Sample from several categorical distributions at once.
+
+    Parameters
+    ----------
+    probs
+        Array of shape ``[k, m]`` containing unnormalized probabilities of ``k`` categorical distributions.
+    counts
+        Array of shape ``[k,]`` containing the number of samples to draw from each distribution.
+    rng
+        Random state for inverse transform sampling on the host or a :func:`jax.random.PRNGKey` for inverse
+        transform sampling on the device.
+
+    Returns
+    -------
+    The sampled categories for each distribution and the updated ``rng``.
+    """
+    k, m = probs.shape
+    idx = np.repeat(np.arange(k), counts)
+    if isinstance(rng, np.random.RandomState):
+        probs = np.asarray(probs, dtype=float)
+        cdf = np.cumsum(probs / probs.sum(axis=1, keepdims=True), axis=1)
+        cdf[:, -1] = 1.0
+        # shifting the `i`-th CDF by `i` makes the flattened CDFs monotonic, so that one search suffices
+        cdf += np.arange(k)[:, None]
+        cols = np.searchsorted(cdf.ravel(), rng.random_sample(len(idx)) + idx, side="right") - idx * m
+        cols = np.minimum(cols, m - 1)
+    else:
+        import jax
+        import jax.numpy as jnp
+
+        rng, key = jax.random.split(rng)
+        probs = jnp.asarray(probs)
+        cdf = jnp.cumsum(probs / probs.sum(axis=1, keepdims=True), axis=1).at[:, -1].set(1.0)
+        u = jax.random.uniform(key, (len(idx),), dtype=cdf.dtype)
+        # sort the CDFs and the samples by their distribution and value, the CDF values first in case of ties,
+        # so that a sample's category is the number of its distribution's CDF values preceding it
+        dist = jnp.concatenate([jnp.repeat(jnp.arange(k), m), jnp.asarray(idx)])
+        is_sample = jnp.concatenate([jnp.zeros(k * m, dtype=bool), jnp.ones(len(idx), dtype=bool)])
+        order = jnp.lexsort((is_sample, jnp.concatenate([cdf.ravel(), u]), dist))
+        n_cdf = jnp.cumsum(~is_sample[order]) - dist[order] * m
+        samples = is_sample[order]
+        cols = jnp.zeros(len(idx), dtype=int).at[order[samples] - k * m].set(n_cdf[samples])
+        cols = np.minimum(np.asarray(cols), m - 1)
+
+    return np.split(cols, np.cumsum(counts)[:-1]), rng
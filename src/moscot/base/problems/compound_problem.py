@@ -1,18 +1,27 @@
 import abc
+import hashlib
+import itertools
 import os
+import shutil
+import sys
+from collections import OrderedDict
 from types import MappingProxyType
 from typing import (
     TYPE_CHECKING,
     Any,
     Callable,
+    Collection,
     Dict,
     Generic,
     Hashable,
     Iterator,
+    List,
     Literal,
     Mapping,
+    NamedTuple,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Type,
     TypeVar,
@@ -21,15 +30,27 @@ from typing import (
 
 import cloudpickle
 
+import numpy as np
+import pandas as pd
 import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator
+from sklearn.preprocessing import StandardScaler
 
+import scanpy as sc
 from anndata import AnnData
 
 from moscot._docs._docs import d
 from moscot._logging import logger
-from moscot._types import ArrayLike, Policy_t, ProblemStage_t
-from moscot.base.output import BaseSolverOutput
-from moscot.base.problems._utils import attributedispatch, require_prepare
+from moscot._types import ArrayLike, Executor_t, PathLike, Policy_t, ProblemStage_t
+from moscot.base.cost import _CostCache, _fingerprint
+from moscot.base.output import BaseSolverOutput, StoredSolverOutput
+from moscot.base.problems._utils import (
+    _compose_transport,
+    _get_n_cores,
+    _slice_matrix,
+    attributedispatch,
+    require_prepare,
+)
 from moscot.base.problems.manager import ProblemManager
 from moscot.base.problems.problem import BaseProblem, OTProblem
 from moscot.utils.subset_policy import (
@@ -55,6 +76,43 @@ ApplyOutput_t = Union[ArrayLike, Dict[K, ArrayLike]]
 # ApplyOutput_t = Union[ArrayLike, Dict[Tuple[K, K], ArrayLike]]
 
 
+# PCA embeddings of the `shared-pca` callback, keyed by a fingerprint of the data
+_PCA_CACHE = _CostCache(maxsize=8)
+
+
+class _AnnDataRef(NamedTuple):
+    # placeholder for an annotated data object stored outside of a saved problem
+    name: str
+    path: str
+
+
+class _AnnDataViewRef(NamedTuple):
+    # placeholder for a view of an annotated data object, rebuilt from the indices into its parent on load
+    parent: _AnnDataRef
+    obs: ArrayLike
+    var: ArrayLike
+
+
+# errors raised by failing solvers, e.g., invalid parameters or failures of the backend (`XlaRuntimeError`),
+# other errors, e.g., `TypeError` or `KeyError`, are bugs and are always raised
+_SOLVER_ERRORS = (ValueError, RuntimeError, FloatingPointError)
+
+
+def _solve_problem(
+    key: Tuple[K, K], problem: B, jax_x64: Optional[bool] = None, **kwargs: Any
+) -> Tuple[Tuple[K, K], Optional[B], Optional[Exception]]:
+    if jax_x64 is not None:
+        # worker processes don't inherit the configuration of the parent process
+        import jax
+
+        jax.config.update("jax_enable_x64", jax_x64)
+    logger.info(f"Solving problem {problem}.")
+    try:
+        return key, problem.solve(**kwargs), None
+    except _SOLVER_ERRORS as e:
+        return key, None, e
+
+
 @d.get_sections(base="BaseCompoundProblem", sections=["Parameters", "Raises"])
 @d.dedent
 class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
@@ -73,10 +131,23 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         If `base_problem_type` is not a subclass of :class:`~moscot.base.problems.OTProblem`.
     """
 
+    # maximum number of composed transport operators to cache
+    TRANSPORT_CACHE_SIZE: int = 16
+
     def __init__(self, adata: AnnData, **kwargs: Any):
         super().__init__(**kwargs)
         self._adata = adata
         self._problem_manager: Optional[ProblemManager[K, B]] = None
+        self._failed_problems: Dict[Tuple[K, K], Exception] = {}
+        # arguments of the last `prepare` and `solve`, reused by `update`
+        self._prepare_args: Dict[str, Any] = {}
+        self._solve_args: Dict[str, Any] = {}
+        # fingerprints of the data of each category and each pair of the policy, used by `update`
+        self._fingerprints: Tuple[Dict[K, str], Dict[Tuple[K, K], str]] = ({}, {})
+        # composed transport operators, keyed by the path and valid as long as the solutions along it are unchanged
+        self._transport_cache: OrderedDict[Hashable, Tuple[Tuple[BaseSolverOutput, ...], LinearOperator]] = (
+            OrderedDict()
+        )
 
     @abc.abstractmethod
     def _create_problem(self, src: K, tgt: K, src_mask: ArrayLike, tgt_mask: ArrayLike, **kwargs: Any) -> B:
@@ -134,6 +205,7 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         xy_callback_kwargs: Mapping[str, Any] = MappingProxyType({}),
         x_callback_kwargs: Mapping[str, Any] = MappingProxyType({}),
         y_callback_kwargs: Mapping[str, Any] = MappingProxyType({}),
+        keys: Optional[Collection[Tuple[K, K]]] = None,
         **kwargs: Any,
     ) -> Dict[Tuple[K, K], B]:
         from moscot.base.problems.birth_death import BirthDeathProblem
@@ -143,12 +215,9 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
 
         problems: Dict[Tuple[K, K], B] = {}
         for (src, tgt), (src_mask, tgt_mask) in self._policy.create_masks().items():
-            if isinstance(self._policy, FormatterMixin):
-                src_name = self._policy._format(src, is_source=True)
-                tgt_name = self._policy._format(tgt, is_source=False)
-            else:
-                src_name = src
-                tgt_name = tgt
+            if keys is not None and (src, tgt) not in keys:
+                continue
+            src_name, tgt_name = self._format_key(src, tgt)
 
             problem = self._create_problem(src, tgt, src_mask=src_mask, tgt_mask=tgt_mask)
 
@@ -211,40 +280,201 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         -------
         The prepared problem.
         """
+        self._prepare_args = {"key": key, "policy": policy, "subset": subset, "reference": reference}
+        policy = self._build_policy(**self._prepare_args)
+        self._prepare_args["callbacks"] = callbacks = {
+            "xy_callback": xy_callback,
+            "x_callback": x_callback,
+            "y_callback": y_callback,
+            "xy_callback_kwargs": xy_callback_kwargs,
+            "x_callback_kwargs": x_callback_kwargs,
+            "y_callback_kwargs": y_callback_kwargs,
+        }
+        self._prepare_args["kwargs"] = kwargs
+
+        # TODO(michalk8): manager must be currently instantiated first, since `_create_problems` accesses the policy
+        # when refactoring the callback, consider changing this
+        self._problem_manager = ProblemManager(self, policy=policy)
+        problems = self._create_problems(**callbacks, **kwargs)
+        self._problem_manager.add_problems(problems)
+        self._fingerprints = self._data_fingerprints()
+
+        for p in self.problems.values():
+            self._problem_kind = p._problem_kind
+            break
+        return self
+
+    def _build_policy(
+        self, key: str, policy: Policy_t, subset: Optional[Sequence[Tuple[K, K]]], reference: Optional[Any]
+    ) -> SubsetPolicy[K]:
         self._ensure_valid_policy(policy)
         policy = self._create_policy(policy=policy, key=key)
         if TYPE_CHECKING:
             assert isinstance(policy, SubsetPolicy)
 
         if isinstance(policy, ExplicitPolicy):
-            policy = policy(subset=subset)
-        elif isinstance(policy, StarPolicy):
-            policy = policy(reference=reference)
-        else:
-            policy = policy()
+            return policy(subset=subset)
+        if isinstance(policy, StarPolicy):
+            return policy(reference=reference)
+        return policy()
 
-        # TODO(michalk8): manager must be currently instantiated first, since `_create_problems` accesses the policy
-        # when refactoring the callback, consider changing this
-        self._problem_manager = ProblemManager(self, policy=policy)
-        problems = self._create_problems(
-            xy_callback=xy_callback,
-            x_callback=x_callback,
-            y_callback=y_callback,
-            xy_callback_kwargs=xy_callback_kwargs,
-            x_callback_kwargs=x_callback_kwargs,
-            y_callback_kwargs=y_callback_kwargs,
-            **kwargs,
+    @require_prepare
+    def update(self, adata: Optional[AnnData] = None, solve: bool = True, **kwargs: Any) -> "BaseCompoundProblem[K, B]":
+        """Update the biological problem after cells have been added or changed, e.g., a new time point.
+
+        The policy is rebuilt and only the problems which are new or whose data changed are prepared again,
+        with the arguments of the last :meth:`prepare`, and solved. The other problems keep their data and solutions.
+        Problems which are no longer in the policy are removed.
+
+        Parameters
+        ----------
+        adata
+            Annotated data object which replaces :attr:`adata`. If `None`, use :attr:`adata`, e.g., if it has been
+            modified in-place.
+        solve
+            Whether to solve the new problems with the arguments of the last :meth:`solve`.
+        kwargs
+            Keyword arguments for :meth:`solve`, overriding the ones of the last :meth:`solve`.
+
+        Returns
+        -------
+        The updated problem.
+        """
+        if TYPE_CHECKING:
+            assert isinstance(self._problem_manager, ProblemManager)
+        if adata is not None:
+            self._adata = adata
+
+        args = self._prepare_args
+        old_problems = self.problems
+        old_categories, old_pairs = getattr(self, "_fingerprints", ({}, {}))
+        self._problem_manager = ProblemManager(
+            self, policy=self._build_policy(args["key"], args["policy"], args["subset"], args["reference"])
         )
+        categories, pairs = self._fingerprints = self._data_fingerprints()
+
+        changed = {cat for cat, fp in categories.items() if old_categories.get(cat, None) != fp}
+        callbacks = args["callbacks"]
+        for term in ("xy", "x", "y"):
+            if callbacks[f"{term}_callback"] != "shared-pca" or not changed:
+                continue
+            if term == "xy" or callbacks[f"{term}_callback_kwargs"].get("fit", "global") == "global":
+                # the PCA is fit on the cells of all categories
+                changed = set(categories)
+
+        masks = self._policy.create_masks()
+        keys = {
+            (src, tgt)
+            for (src, tgt) in masks
+            if src in changed
+            or tgt in changed
+            or old_pairs.get((src, tgt), None) != pairs[src, tgt]
+            or self._format_key(src, tgt) not in old_problems
+        }
+        # only the new problems and the problems whose data changed are prepared again
+        problems = self._create_problems(**callbacks, keys=keys, **args["kwargs"]) if keys else {}
+        for (src, tgt), (src_mask, tgt_mask) in masks.items():
+            if (src, tgt) in keys:
+                continue
+            # the other problems keep their data and solutions, they are only bound to the new annotated data object
+            key = self._format_key(src, tgt)
+            problem, ref = old_problems[key], self._create_problem(src, tgt, src_mask=src_mask, tgt_mask=tgt_mask)
+            for attr in ("_adata_src", "_adata_tgt", "_src_obs_mask", "_tgt_obs_mask"):
+                setattr(problem, attr, getattr(ref, attr))
+            problems[key] = problem
+        logger.info(f"Keeping `{len(problems) - len(keys)}` problems, preparing `{len(keys)}` problems.")
         self._problem_manager.add_problems(problems)
 
-        for p in self.problems.values():
-            self._problem_kind = p._problem_kind
-            break
+        if solve and keys:
+            BaseCompoundProblem.solve(self, stage="prepared", **{**self._solve_args, **kwargs})
         return self
 
+    def _data_refs(self) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+        # data read by `prepare`, as `(attr, key)` read per cell and keys in `adata.obsp` read per pair of categories
+        args = self._prepare_args
+        rows: List[Tuple[str, Optional[str]]] = []
+        pairs: List[str] = []
+        for term in ("xy", "x", "y"):
+            spec = args["kwargs"].get(term, None)
+            if isinstance(spec, Mapping):
+                if "x_attr" in spec or "y_attr" in spec:
+                    rows += [(spec.get("x_attr", "X"), spec.get("x_key", None))]
+                    rows += [(spec.get("y_attr", "X"), spec.get("y_key", None))]
+                elif spec.get("attr", "obsm") == "obsp":
+                    pairs.append(spec["key"])
+                else:
+                    rows.append((spec.get("attr", "obsm"), spec.get("key", None)))
+
+            callback = args["callbacks"][f"{term}_callback"]
+            callback_kwargs = args["callbacks"][f"{term}_callback_kwargs"]
+            if callback in ("local-pca", "shared-pca"):
+                layer = callback_kwargs.get("layer", None)
+                rows.append(("X", None) if layer is None else ("layers", layer))
+            elif callback == "cost-matrix":
+                pairs.append(callback_kwargs["key"])
+            elif callback is not None:
+                # custom callbacks can read any data of the cells
+                rows += [("X", None)] + [("layers", k) for k in self.adata.layers]
+                rows += [("obsm", k) for k in self.adata.obsm]
+        return list(dict.fromkeys(rows)), list(dict.fromkeys(pairs))
+
+    def _data_fingerprints(self) -> Tuple[Dict[K, str], Dict[Tuple[K, K], str]]:
+        # fingerprints of the data of each category and of the cost matrices of each pair of the policy
+        if TYPE_CHECKING:
+            assert isinstance(self._policy, SubsetPolicy)
+
+        def update(h: "hashlib._Hash", attr: str, key: Optional[str], *ixs: ArrayLike) -> None:
+            if adata.isbacked:
+                # the data is read lazily from the file, only fingerprint its source
+                for obj in (str(adata.filename), attr, key, *ixs):
+                    _fingerprint(obj, h)
+                return
+            data = TaggedArray._get_data(adata, attr=attr, key=key)  # type: ignore[arg-type]
+            if attr == "uns":
+                # the data is stored per category or pair of categories
+                _fingerprint(data, h)
+            elif len(ixs) == 2:
+                _fingerprint(_slice_matrix(data, *ixs), h)
+            else:
+                _fingerprint(data.iloc[ixs[0]] if isinstance(data, pd.DataFrame) else data[ixs[0]], h)
+
+        adata = self.adata
+        rows, obsp = self._data_refs()
+        indices = self._policy._category_indices
+        empty = np.array([], dtype=int)
+
+        categories: Dict[K, str] = {}
+        for cat, ixs in indices.items():
+            h = hashlib.blake2b(digest_size=20)
+            _fingerprint(adata.obs_names.values[ixs], h)
+            for col in adata.obs.columns:
+                _fingerprint(col, h)
+                _fingerprint(np.asarray(adata.obs[col])[ixs], h)
+            for attr, key in rows:
+                update(h, attr, key, ixs)
+            categories[cat] = h.hexdigest()
+
+        pairs: Dict[Tuple[K, K], str] = {}
+        for src, tgt in self._policy._graph:
+            h = hashlib.blake2b(digest_size=20)
+            for key in obsp:
+                # the `x`, `y` and `xy` terms use the source-source, target-target and source-target blocks
+                ixs = (indices.get(src, empty), indices.get(tgt, empty))
+                for rows_ixs, cols_ixs in itertools.product(ixs, repeat=2):
+                    update(h, "obsp", key, rows_ixs, cols_ixs)
+            pairs[src, tgt] = h.hexdigest()
+        return categories, pairs
+
+    def _format_key(self, src: K, tgt: K) -> Tuple[K, K]:
+        if isinstance(self._policy, FormatterMixin):
+            return self._policy._format(src, is_source=True), self._policy._format(tgt, is_source=False)
+        return src, tgt
+
     def solve(
         self,
         stage: Union[ProblemStage_t, Tuple[ProblemStage_t, ...]] = ("prepared", "solved"),
+        n_jobs: Optional[int] = None,
+        executor: Executor_t = "thread",
         **kwargs: Any,
     ) -> "BaseCompoundProblem[K,B]":
         """
@@ -254,23 +484,224 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         ----------
         stage
             Some stage TODO.
+        n_jobs
+            Number of problems to solve concurrently. If `None`, solve the problems sequentially.
+            Negative values are interpreted as in :mod:`joblib`.
+        executor
+            How to solve the independent problems:
+
+                - `'thread'` - solve the problems concurrently in a thread pool.
+                - `'process'` - solve the problems concurrently in separate processes.
+                - `'vmap'` - stack problems of the same kind and shape and solve each such group
+                  with one vectorized solver call. Remaining problems are solved sequentially.
+                  With ``warm_start = True``, each problem is initialized with the potentials of its own solution.
+                  Problems with an ``epsilon_schedule`` are always solved one by one.
         kwargs
             Keyword arguments for :meth:`~moscot.base.problems.OTProblem.solve`.
 
         Returns
         -------
-        The solver problem.
+        The solver problem. Problems which failed to solve remain in their stage and their errors are stored in
+        :attr:`failed_problems`.
+
+        Raises
+        ------
+        Exception
+            The error of the first problem, if none of the problems could be solved.
         """
         if TYPE_CHECKING:
             assert isinstance(self._problem_manager, ProblemManager)
+        if executor not in ("thread", "process", "vmap"):
+            raise ValueError(f"Expected `executor` to be one of `thread`, `process`, `vmap`, found `{executor!r}`.")
+        self._solve_args = {"n_jobs": n_jobs, "executor": executor, **kwargs}
+
         problems = self._problem_manager.get_problems(stage=stage)
-        # TODO(michalk8): print how many problems are being solved?
-        for _, problem in problems.items():
-            logger.info(f"Solving problem {problem}.")
-            _ = problem.solve(**kwargs)
+        logger.info(f"Solving `{len(problems)}` problems.")
+        if executor == "vmap":
+            failures = self._solve_vmapped(problems, **kwargs)
+        else:
+            failures = self._solve_parallel(problems, n_jobs=n_jobs, executor=executor, **kwargs)
+
+        self._failed_problems = failures
+        for key, exc in failures.items():
+            logger.warning(f"Unable to solve problem `{key}`. Reason: `{exc!r}`.")
+        if failures and len(failures) == len(problems):
+            raise next(iter(failures.values()))
 
         return self
 
+    def _solve_parallel(
+        self,
+        problems: Mapping[Tuple[K, K], B],
+        n_jobs: Optional[int] = None,
+        executor: Literal["thread", "process"] = "thread",
+        **kwargs: Any,
+    ) -> Dict[Tuple[K, K], Exception]:
+        from joblib import Parallel, delayed
+
+        n_jobs = _get_n_cores(n_jobs, len(problems))
+        if n_jobs == 1:
+            results = [_solve_problem(key, problem, **kwargs) for key, problem in problems.items()]
+        elif executor == "thread":
+            results = Parallel(n_jobs=n_jobs, backend="threading")(
+                delayed(_solve_problem)(key, problem, **kwargs) for key, problem in problems.items()
+            )
+        else:
+            jax = sys.modules.get("jax", None)
+            jax_x64 = None if jax is None else bool(jax.config.jax_enable_x64)
+            results = Parallel(n_jobs=n_jobs, backend="loky")(
+                delayed(_solve_problem)(key, problem, jax_x64=jax_x64, **kwargs) for key, problem in problems.items()
+            )
+
+        failures: Dict[Tuple[K, K], Exception] = {}
+        for key, solved, exc in results:
+            if exc is not None:
+                failures[key] = exc
+                continue
+            problem = problems[key]
+            if solved is not problem:  # solved in a different process, only transfer the results
+                problem._solver = solved._solver
+                problem._solution = solved._solution
+                problem._stage = solved._stage
+        return failures
+
+    def _solve_vmapped(self, problems: Mapping[Tuple[K, K], B], **kwargs: Any) -> Dict[Tuple[K, K], Exception]:
+        def signature(problem: B) -> Tuple[Any, ...]:
+            return (problem.problem_kind,) + tuple(
+                None if arr is None else (arr.tag, arr.shape, getattr(arr.data_src, "shape", None))
+                for arr in (problem.xy, problem.x, problem.y)
+            )
+
+        groups: Dict[Tuple[Any, ...], Dict[Tuple[K, K], B]] = {}
+        for key, problem in problems.items():
+            groups.setdefault(signature(problem), {})[key] = problem
+
+        failures: Dict[Tuple[K, K], Exception] = {}
+        for group in groups.values():
+            # epsilon-scaling is not vectorized, such problems are solved one by one
+            if len(group) > 1 and kwargs.get("epsilon_schedule", None) is None:
+                logger.info(f"Solving `{len(group)}` problems of shape `{next(iter(group.values())).shape}` jointly.")
+                try:
+                    OTProblem._solve_batched(list(group.values()), **kwargs)
+                    continue
+                except _SOLVER_ERRORS as e:
+                    logger.warning(
+                        f"Unable to solve problems `{list(group)}` jointly, solving them one by one. Reason: `{e!r}`."
+                    )
+            failures.update(self._solve_parallel(group, n_jobs=1, **kwargs))
+        return failures
+
+    @property
+    def failed_problems(self) -> Dict[Tuple[K, K], Exception]:
+        """Errors of the problems which could not be solved during the last :meth:`solve`."""
+        return self._failed_problems
+
+    def sweep(
+        self,
+        grid: Mapping[str, Sequence[Any]],
+        validation: Optional[Callable[["BaseCompoundProblem[K, B]", Tuple[K, K]], float]] = None,
+        criterion: Optional[Literal["cost", "marginal_deviation", "validation"]] = None,
+        warm_start: bool = True,
+        **kwargs: Any,
+    ) -> pd.DataFrame:
+        """Solve the problems for a grid of parameters and keep the best solution for each problem.
+
+        Only compact summaries of the intermediate solutions are retained.
+
+        Parameters
+        ----------
+        grid
+            Parameters to sweep over, e.g., ``{'epsilon': [1e-1, 1e-2], 'tau_a': [1.0, 0.9]}``. All combinations
+            are solved. If ``'epsilon'`` is present, the combinations are solved in decreasing order of it.
+        validation
+            Function called after solving each combination with this problem and the key of a subproblem,
+            e.g., using :meth:`~moscot.problems.time.TemporalProblem.compute_interpolated_distance`.
+            Lower values are considered better.
+        criterion
+            Summary statistic used to select the best solution, lower is better. Converged solutions are always
+            preferred. If `None`, use ``'validation'`` if ``validation`` is specified, otherwise ``'cost'``.
+        warm_start
+            Whether to initialize each solve with the potentials of the previous one,
+            see :meth:`~moscot.base.problems.OTProblem.solve`.
+        kwargs
+            Keyword arguments for :meth:`solve`, e.g., ``n_jobs`` to solve the subproblems in parallel.
+
+        Returns
+        -------
+        Data frame with one row per subproblem and combination of parameters, containing the parameters,
+        the ``'cost'``, whether the solution ``'converged'``, the number of iterations ``'n_iters'``,
+        the L1 distance of the solution's marginals from the problem's marginals ``'marginal_deviation'``,
+        optionally the ``'validation'`` value, and whether the solution was selected as ``'best'``.
+        Also modifies the :attr:`solutions` to the best ones.
+        """
+        if criterion is None:
+            criterion = "cost" if validation is None else "validation"
+        if criterion == "validation" and validation is None:
+            raise ValueError("Unable to use `criterion='validation'` without specifying `validation`.")
+
+        configs = [dict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+        if not configs:
+            raise ValueError("Expected `grid` to contain at least 1 combination of parameters.")
+        if all(c.get("epsilon", None) is not None for c in configs):
+            configs = sorted(configs, key=lambda c: -c.get("epsilon", 0.0))
+
+        rows: List[Dict[str, Any]] = []
+        best: Dict[Tuple[K, K], Tuple[Tuple[bool, float], int, Any, BaseSolverOutput]] = {}
+        for i, params in enumerate(configs):
+            logger.info(f"Solving for `{params}`.")
+            try:
+                failed: Mapping[Tuple[K, K], Exception] = self.solve(
+                    **{**kwargs, **params}, warm_start=warm_start and i > 0
+                ).failed_problems
+            except _SOLVER_ERRORS as e:
+                failed = {key: e for key in self.problems}
+
+            for key, problem in self.problems.items():
+                row: Dict[str, Any] = {"source": key[0], "target": key[1], **params}
+                if key in failed or problem.solution is None:
+                    row.update(cost=np.nan, converged=False, n_iters=np.nan, marginal_deviation=np.nan)
+                    if validation is not None:
+                        row["validation"] = np.nan
+                    rows.append(row)
+                    continue
+
+                row.update(self._summarize_solution(problem))
+                if validation is not None:
+                    row["validation"] = float(validation(self, key))
+                rows.append(row)
+
+                score = (not row["converged"], row[criterion])
+                if not np.isnan(score[1]) and (key not in best or score < best[key][0]):
+                    best[key] = (score, len(rows) - 1, problem.solver, problem.solution)
+
+        for key, (_, _, solver, solution) in best.items():
+            self.problems[key]._solver = solver
+            self.problems[key]._solution = solution
+            self.problems[key]._stage = "solved"
+
+        res = pd.DataFrame(rows)
+        res["best"] = False
+        res.loc[[ix for _, ix, _, _ in best.values()], "best"] = True
+        return res
+
+    @staticmethod
+    def _summarize_solution(problem: B) -> Dict[str, Any]:
+        solution = problem.solution
+        if TYPE_CHECKING:
+            assert isinstance(solution, BaseSolverOutput)
+
+        deviation = 0.0
+        for prior, posterior in ((problem.a, solution.a), (problem.b, solution.b)):
+            if prior is not None:
+                deviation += float(np.abs(np.ravel(prior) - np.ravel(posterior)).sum())
+        n_iters = getattr(solution, "n_iters", None)
+        return {
+            "cost": solution.cost,
+            "converged": solution.converged,
+            "n_iters": np.nan if n_iters is None else int(n_iters),
+            "marginal_deviation": deviation,
+        }
+
     @attributedispatch(attr="_policy")
     def _apply(
         self,
@@ -290,6 +721,8 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         scale_by_marginals: bool = False,
         source: Optional[K] = None,
         return_all: bool = True,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
         **kwargs: Any,
     ) -> ApplyOutput_t[K]:
         if TYPE_CHECKING:
@@ -305,7 +738,9 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         ):
             problem = self.problems[src, tgt]
             fun = problem.push if forward else problem.pull
-            res[src] = fun(data=data, scale_by_marginals=scale_by_marginals, **kwargs)
+            res[src] = fun(
+                data=data, scale_by_marginals=scale_by_marginals, batch_size=batch_size, n_jobs=n_jobs, **kwargs
+            )
         return res if return_all else res[src]
 
     @_apply.register(ExplicitPolicy)
@@ -318,6 +753,9 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         source: Optional[K] = None,
         target: Optional[K] = None,
         return_all: bool = False,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        precompute_low_rank: bool = True,
         **kwargs: Any,
     ) -> ApplyOutput_t[K]:
         explicit_steps = kwargs.pop(
@@ -337,15 +775,81 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         # TODO(michlak8): future behavior
         # res = {(None, src) if forward else (tgt, None): current_mass}
         res = {src if forward else tgt: current_mass}
-        for _src, _tgt in [(src, tgt)] + rest:
+        steps = [(src, tgt)] + rest
+        if not return_all and batch_size is None and len(steps) > 1:
+            # the intermediate masses are not needed, apply the (cached) composition of all but the last step at once
+            # normalizing the input of every step only rescales the input of the next one, so normalizing the input
+            # of the last step gives the same result
+            prefix = steps[:-1]
+            op = self._transport_operator(
+                prefix if forward else prefix[::-1],
+                scale_by_marginals=scale_by_marginals,
+                precompute_low_rank=precompute_low_rank,
+            )
+            current_mass = op.rmatmat(current_mass) if forward else op.matmat(current_mass)
+            steps = steps[-1:]
+
+        for _src, _tgt in steps:
             problem = self.problems[_src, _tgt]
             fun = problem.push if forward else problem.pull
             res[_tgt if forward else _src] = current_mass = fun(
-                current_mass, scale_by_marginals=scale_by_marginals, **kwargs
+                current_mass, scale_by_marginals=scale_by_marginals, batch_size=batch_size, n_jobs=n_jobs, **kwargs
             )
 
         return res if return_all else current_mass
 
+    @d.dedent
+    def _transport_operator(
+        self,
+        path: Sequence[Tuple[K, K]],
+        *,
+        scale_by_marginals: bool = False,
+        precompute_low_rank: bool = True,
+    ) -> LinearOperator:
+        """Get the composition of the transport matrices along a path.
+
+        The operators are kept in a least-recently-used cache of size :attr:`TRANSPORT_CACHE_SIZE`. An entry is
+        recomputed as soon as any of the subproblems along the path has been re-solved.
+
+        Parameters
+        ----------
+        path
+            Keys of the subproblems whose transport matrices are multiplied in this order.
+        %(scale_by_marginals)s
+        precompute_low_rank
+            If all transport matrices are low-rank, precompute the factors of their product.
+
+        Returns
+        -------
+        Linear operator whose ``matvec`` pulls and ``rmatvec`` pushes mass along the ``path``.
+        """
+        solutions = []
+        for step in path:
+            solution = self.problems[step].solution
+            if solution is None:
+                raise RuntimeError(f"Problem `{step}` has not been solved.")
+            solutions.append(solution)
+
+        key = (tuple(path), scale_by_marginals, precompute_low_rank)
+        cached = self._transport_cache.get(key, None)
+        if cached is not None and all(old is new for old, new in zip(cached[0], solutions)):
+            self._transport_cache.move_to_end(key)
+            return cached[1]
+
+        op = _compose_transport(
+            solutions, scale_by_marginals=scale_by_marginals, precompute_low_rank=precompute_low_rank
+        )
+        self._transport_cache[key] = (tuple(solutions), op)
+        self._transport_cache.move_to_end(key)
+        while len(self._transport_cache) > self.TRANSPORT_CACHE_SIZE:
+            self._transport_cache.popitem(last=False)
+        return op
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_transport_cache"] = OrderedDict()
+        return state
+
     @d.get_sections(base="BaseCompoundProblem_push", sections=["Parameters", "Raises"])
     @d.dedent  # TODO(@MUCDK) document private _apply
     def push(self, *args: Any, **kwargs: Any) -> ApplyOutput_t[K]:
@@ -366,6 +870,11 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
 
         %(scale_by_marginals)s
 
+        batch_size
+            If not `None`, stream the computation in blocks of ``batch_size`` rows of each transport matrix
+            instead of applying it at once.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
         kwargs
             keyword arguments for policy-specific `_apply` method of :class:`moscot.base.problems.CompoundProblem`.
 
@@ -397,6 +906,11 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
 
         %(scale_by_marginals)s
 
+        batch_size
+            If not `None`, stream the computation in blocks of ``batch_size`` rows of each transport matrix
+            instead of applying it at once.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
         kwargs
             keyword arguments for policy-specific `_apply` method of :class:`moscot.base.problems.CompoundProblem`.
 
@@ -472,11 +986,22 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         dir_path: str,
         file_prefix: Optional[str] = None,
         overwrite: bool = False,
+        format: Literal["pickle", "hdf5"] = "pickle",
+        adata_path: Optional[PathLike] = None,
+        batch_size: int = 1024,
     ) -> None:
         """
         Save the model.
 
-        As of now this method pickled the problem class instance. Modifications depend on the I/O of the backend.
+        With ``format = 'pickle'``, the problem class instance is pickled. With ``format = 'hdf5'``, a directory
+        is created which contains
+
+            - ``solutions.h5`` - one chunked group per subproblem with the transport matrix or its low-rank
+              factors, the dual potentials, the cost and the convergence status.
+            - ``problem.pkl`` - the pickled problem without the solutions, the prepared data and the
+              :class:`~anndata.AnnData` objects, which are only referenced.
+            - ``{name}.h5ad`` - the :class:`~anndata.AnnData` objects which are not yet backed by a file
+              and for which no ``adata_path`` has been passed.
 
         Parameters
         ----------
@@ -486,30 +1011,101 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
             Prefix to prepend to the file name.
         overwrite
             Whether to overwrite existing data or not.
+        format
+            Storage format, either ``'pickle'`` or ``'hdf5'``.
+        adata_path
+            Only used when ``format = 'hdf5'``. Path to an existing ``.h5ad`` file of :attr:`adata` to reference
+            instead of writing a copy.
+        batch_size
+            Only used when ``format = 'hdf5'``. Chunk size along the first dimension of the stored arrays.
 
         Returns
         -------
         Nothing, just saves the problem.
         """
+        if format not in ("pickle", "hdf5"):
+            raise NotImplementedError(f"Unable to save the problem in `{format}` format.")
         file_name = (
-            f"{file_prefix}_{self.__class__.__name__}.pkl"
-            if file_prefix is not None
-            else f"{self.__class__.__name__}.pkl"
+            f"{file_prefix}_{self.__class__.__name__}" if file_prefix is not None else f"{self.__class__.__name__}"
         )
+        if format == "pickle":
+            file_name += ".pkl"
         file_dir = os.path.join(dir_path, file_name) if dir_path is not None else file_name
 
         if not overwrite and os.path.exists(file_dir):
             raise RuntimeError(f"Unable to save to an existing file `{file_dir}` use `overwrite=True` to overwrite it.")
-        with open(file_dir, "wb") as f:
-            cloudpickle.dump(self, f)
+        if format == "pickle":
+            with open(file_dir, "wb") as f:
+                cloudpickle.dump(self, f)
+        else:
+            self._save_hdf5(file_dir, adata_path=adata_path, batch_size=batch_size)
 
         logger.info(f"Successfully saved the problem as `{file_dir}`")
 
+    def _save_hdf5(self, dir_path: str, adata_path: Optional[PathLike] = None, batch_size: int = 1024) -> None:
+        if os.path.isdir(dir_path):
+            shutil.rmtree(dir_path)
+        elif os.path.exists(dir_path):
+            os.remove(dir_path)
+        os.makedirs(dir_path)
+
+        refs: Dict[int, _AnnDataRef] = {}
+
+        def get_ref(adata: AnnData, name: str) -> Union[_AnnDataRef, _AnnDataViewRef]:
+            if adata.is_view:
+                # views, e.g., subsets of the cells of a subproblem, are stored as indices into their parent
+                parent = adata._adata_ref
+                return _AnnDataViewRef(
+                    parent=get_ref(parent, name),  # type: ignore[arg-type]
+                    obs=parent.obs_names.get_indexer(adata.obs_names),
+                    var=parent.var_names.get_indexer(adata.var_names),
+                )
+            if id(adata) in refs:
+                return refs[id(adata)]
+            if name == "adata" and adata_path is not None:
+                path = os.path.abspath(adata_path)
+            elif adata.isbacked:
+                path = os.path.abspath(adata.filename)
+            else:
+                path = f"{name}.h5ad"
+                adata.write_h5ad(os.path.join(dir_path, path))
+            refs[id(adata)] = ref = _AnnDataRef(name=name, path=path)
+            return ref
+
+        # temporarily strip the heavy attributes, they are restored below
+        stripped: List[Tuple[Any, str, Any]] = []
+        for attr, val in list(vars(self).items()):
+            if isinstance(val, AnnData):
+                stripped.append((self, attr, val))
+                setattr(self, attr, get_ref(val, attr.lstrip("_")))
+        for i, problem in enumerate(self.problems.values()):
+            for attr, val in list(vars(problem).items()):
+                if isinstance(val, AnnData):
+                    stripped.append((problem, attr, val))
+                    setattr(problem, attr, get_ref(val, f"adata_{i}{attr}"))
+                elif attr in ("_xy", "_x", "_y", "_solver"):
+                    stripped.append((problem, attr, val))
+                    setattr(problem, attr, None)
+            if problem.solution is not None:
+                stripped.append((problem, "_solution", problem.solution))
+                problem._solution = StoredSolverOutput.write(
+                    problem.solution, os.path.join(dir_path, "solutions.h5"), group=str(i), batch_size=batch_size
+                )
+                problem._solution._path = "solutions.h5"
+
+        try:
+            with open(os.path.join(dir_path, "problem.pkl"), "wb") as f:
+                cloudpickle.dump(self, f)
+        finally:
+            for obj, attr, val in stripped:
+                setattr(obj, attr, val)
+
     # TODO(MUCKD): should be on the OT problem level as well
     @classmethod
     def load(
         cls,
         filename: str,
+        adatas: Optional[Mapping[str, AnnData]] = None,
     ) -> "BaseCompoundProblem[K, B]":
         """
         Instantiate a moscot problem from a saved output.
@@ -517,7 +1113,11 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         Parameters
         ----------
         filename
-            filename of the model to load
+            filename of the model to load. If it is a directory saved with ``format = 'hdf5'``, the solutions
+            are opened lazily on first access.
+        adatas
+            Only used when loading a directory. Annotated data objects to use instead of reading the referenced
+            ``.h5ad`` files, keyed by the attribute name, e.g., ``{'adata': adata}``.
 
         Returns
         -------
@@ -529,12 +1129,44 @@ class BaseCompoundProblem(BaseProblem, abc.ABC, Generic[K, B]):
         >>> problem = ProblemClass.load(filename) # use the name of the model class used to save
         >>> problem.push....
         """
-        with open(filename, "rb") as f:
-            problem = cloudpickle.load(f)
+        if os.path.isdir(filename):
+            problem = cls._load_hdf5(filename, adatas={} if adatas is None else adatas)
+        else:
+            with open(filename, "rb") as f:
+                problem = cloudpickle.load(f)
         if type(problem) is not cls:
             raise TypeError(f"Expected the problem to be type of `{cls}`, found `{type(problem)}`.")
         return problem
 
+    @staticmethod
+    def _load_hdf5(dir_path: str, adatas: Mapping[str, AnnData]) -> "BaseCompoundProblem[K, B]":
+        import anndata
+
+        with open(os.path.join(dir_path, "problem.pkl"), "rb") as f:
+            problem = cloudpickle.load(f)
+
+        loaded: Dict[str, AnnData] = dict(adatas)
+
+        def resolve(ref: Union[_AnnDataRef, _AnnDataViewRef]) -> AnnData:
+            if isinstance(ref, _AnnDataViewRef):
+                return resolve(ref.parent)[ref.obs, ref.var]
+            if ref.name not in loaded:
+                path = ref.path if os.path.isabs(ref.path) else os.path.join(dir_path, ref.path)
+                loaded[ref.name] = anndata.read_h5ad(path)
+            return loaded[ref.name]
+
+        for attr, val in list(vars(problem).items()):
+            if isinstance(val, (_AnnDataRef, _AnnDataViewRef)):
+                setattr(problem, attr, resolve(val))
+        for subproblem in problem.problems.values():
+            for attr, val in list(vars(subproblem).items()):
+                if isinstance(val, (_AnnDataRef, _AnnDataViewRef)):
+                    setattr(subproblem, attr, resolve(val))
+            if isinstance(subproblem.solution, StoredSolverOutput):
+                subproblem.solution._relocate(dir_path)
+
+        return problem
+
     @property
     def solutions(self) -> Dict[Tuple[K, K], BaseSolverOutput]:
         """Return dictionary of solutions of OT problems which the biological problem consists of."""
@@ -609,6 +1241,42 @@ class CompoundProblem(BaseCompoundProblem[K, B], abc.ABC):
             return create_policy(policy, adata=self.adata, key=key)
         return ExplicitPolicy(self.adata, key=key)
 
+    def _create_problems(self, **kwargs: Any) -> Dict[Tuple[K, K], B]:
+        if TYPE_CHECKING:
+            assert isinstance(self._policy, SubsetPolicy)
+
+        terms = [term for term in ("xy", "x", "y") if kwargs.get(f"{term}_callback") == "cost-matrix"]
+        if terms:
+            # slice the cost matrices for all pairs concurrently, the callbacks then only look them up
+            from joblib import Parallel, delayed
+
+            callback_kwargs = {term: dict(kwargs.get(f"{term}_callback_kwargs", {})) for term in terms}
+            n_jobs = next((kws["n_jobs"] for kws in callback_kwargs.values() if "n_jobs" in kws), None)
+            indices = self._policy._category_indices
+            non_empty = {cat for cat, ixs in indices.items() if len(ixs)}
+            edges = [edge for edge in self._policy._graph if set(edge) <= non_empty]
+            if kwargs.get("keys", None) is not None:
+                edges = [edge for edge in edges if edge in kwargs["keys"]]
+            jobs = [(term, src, tgt) for term in terms for src, tgt in edges]
+            res = Parallel(n_jobs=n_jobs, backend="threading")(
+                delayed(self._cost_matrix_callback)(t, key_1=src, key_2=tgt, indices=indices, **callback_kwargs[t])
+                for t, src, tgt in jobs
+            )
+            for term in terms:
+                kwargs[f"{term}_callback_kwargs"] = {
+                    **callback_kwargs[term],
+                    "cost_matrices": {(src, tgt): data for (t, src, tgt), data in zip(jobs, res) if t == term},
+                }
+
+        for term in ("xy", "x", "y"):
+            if kwargs.get(f"{term}_callback") == "shared-pca":
+                # fit the PCA once for all pairs, the callbacks then only look up the embeddings
+                callback_kwargs = dict(kwargs.get(f"{term}_callback_kwargs", {}))
+                callback_kwargs["embeddings"] = self._pca_embeddings(term, **callback_kwargs)
+                kwargs[f"{term}_callback_kwargs"] = callback_kwargs
+
+        return super()._create_problems(**kwargs)
+
     def _callback_handler(
         self,
         term: Literal["xy", "x", "y"],
@@ -616,46 +1284,153 @@ class CompoundProblem(BaseCompoundProblem[K, B], abc.ABC):
         key_2: K,
         problem: B,
         *,
-        callback: Optional[Union[Literal["local-pca", "cost-matrix"], Callback_t]] = None,
+        callback: Optional[Union[Literal["local-pca", "shared-pca", "cost-matrix"], Callback_t]] = None,
         **kwargs: Any,
     ) -> Mapping[Literal["xy", "x", "y"], TaggedArray]:
         # TODO(michalk8): better name?
 
         if callback == "cost-matrix":
             return self._cost_matrix_callback(term=term, key_1=key_1, key_2=key_2, **kwargs)
+        if callback == "shared-pca":
+            return self._shared_pca_callback(term=term, key_1=key_1, key_2=key_2, **kwargs)
         return super()._callback_handler(
             term=term, key_1=key_1, key_2=key_2, problem=problem, callback=callback, **kwargs
         )
 
+    def _shared_pca_callback(
+        self,
+        term: Literal["xy", "x", "y"],
+        *,
+        key_1: K,
+        key_2: Optional[K] = None,
+        embeddings: Optional[Mapping[K, ArrayLike]] = None,
+        **kwargs: Any,
+    ) -> Mapping[Literal["xy", "x", "y"], TaggedArray]:
+        if embeddings is None:
+            embeddings = self._pca_embeddings(term, **kwargs)
+
+        if term == "xy":
+            if key_2 is None:
+                raise ValueError("If `term` is `xy`, `key_2` cannot be `None`.")
+            return {"xy": TaggedArray(embeddings[key_1], embeddings[key_2], tag=Tag.POINT_CLOUD)}
+        if term in ("x", "y"):
+            key = key_2 if term == "y" else key_1
+            if key is None:
+                raise ValueError(f"If `term` is `{term}`, `key_2` cannot be `None`.")
+            return {term: TaggedArray(embeddings[key], tag=Tag.POINT_CLOUD)}
+        raise ValueError(f"Expected `term` to be one of `x`, `y`, or `xy`, found `{term!r}`.")
+
+    def _pca_embeddings(
+        self,
+        term: Literal["xy", "x", "y"],
+        *,
+        fit: Literal["global", "category"] = "global",
+        layer: Optional[str] = None,
+        n_comps: int = 30,
+        scale: bool = False,
+        **kwargs: Any,
+    ) -> Dict[K, ArrayLike]:
+        """Embed the cells of all categories of the policy in a shared PCA space.
+
+        Parameters
+        ----------
+        term
+            Term for which to compute the embedding.
+        fit
+            How to fit the PCA. Valid options are:
+
+            - ``'global'`` - fit one PCA on the cells of all categories of the policy.
+            - ``'category'`` - fit one PCA per category. Only used for the ``'x'`` and ``'y'`` terms,
+              the ``'xy'`` term always uses the global PCA, since the source and the target must share the space.
+        layer
+            Layer in :attr:`~anndata.AnnData.layers` to use. If `None`, use :attr:`~anndata.AnnData.X`.
+        n_comps
+            Number of principal components.
+        scale
+            Whether to standardize the principal components.
+        kwargs
+            Keyword arguments for :func:`~scanpy.pp.pca`, e.g., ``svd_solver='randomized'`` or ``chunked=True``
+            to fit an incremental PCA.
+
+        Returns
+        -------
+        The embeddings of the categories' cells, in the order of :attr:`adata`.
+        """
+        if TYPE_CHECKING:
+            assert isinstance(self._policy, SubsetPolicy)
+        if fit not in ("global", "category"):
+            raise ValueError(f"Expected `fit` to be one of `global` or `category`, found `{fit!r}`.")
+
+        data = self.adata.X if layer is None else self.adata.layers[layer]
+        msg = "adata.X" if layer is None else f"adata.layers[{layer!r}]"
+        indices = self._policy._category_indices
+        categories = [cat for cat in dict.fromkeys(itertools.chain(*self._policy._graph)) if len(indices.get(cat, ()))]
+
+        def embed(ixs: ArrayLike) -> ArrayLike:
+            x = data[ixs]
+            h = hashlib.blake2b(digest_size=20)
+            for obj in (x, n_comps, scale, kwargs):
+                _fingerprint(obj, h)
+            key = h.hexdigest()
+
+            emb = _PCA_CACHE.get(key)
+            if emb is not None:
+                return emb
+            if x.shape[1] <= n_comps:
+                emb = x.A if sp.issparse(x) else np.asarray(x)
+            else:
+                logger.info(f"Computing pca with `n_comps={n_comps}` for `{term}` using `{msg}`")
+                emb = sc.pp.pca(x, n_comps=n_comps, **kwargs)
+                if scale:
+                    emb = StandardScaler().fit_transform(emb)
+            return _PCA_CACHE.put(key, emb)
+
+        if fit == "category" and term != "xy":
+            return {cat: embed(indices[cat]) for cat in categories}
+
+        ixs = np.sort(np.concatenate([indices[cat] for cat in categories]))
+        emb = embed(ixs)
+        return {cat: emb[np.searchsorted(ixs, indices[cat])] for cat in categories}
+
     def _cost_matrix_callback(
-        self, term: Literal["xy", "x", "y"], *, key: str, key_1: K, key_2: Optional[K] = None, **_: Any
+        self,
+        term: Literal["xy", "x", "y"],
+        *,
+        key: str,
+        key_1: K,
+        key_2: Optional[K] = None,
+        densify: bool = False,
+        indices: Optional[Mapping[K, ArrayLike]] = None,
+        cost_matrices: Optional[Mapping[Tuple[K, Optional[K]], Mapping[Literal["xy", "x", "y"], TaggedArray]]] = None,
+        **_: Any,
     ) -> Mapping[Literal["xy", "x", "y"], TaggedArray]:
         if TYPE_CHECKING:
             assert isinstance(self._policy, SubsetPolicy)
 
+        if cost_matrices is not None and (key_1, key_2) in cost_matrices:
+            return cost_matrices[key_1, key_2]
         try:
             data = self.adata.obsp[key]
         except KeyError:
             raise KeyError(f"Unable to fetch data from `adata.obsp[{key!r}]`.") from None
 
-        mask = self._policy.create_mask(key_1, allow_empty=False)
-
-        if term == "xy":
-            if key_2 is None:
-                raise ValueError("If `term` is `xy`, `key_2` cannot be `None`.")
-            mask_2 = self._policy.create_mask(key_2, allow_empty=False)
-
-            linear_cost_matrix = data[mask, :][:, mask_2]
-            if sp.issparse(linear_cost_matrix):
-                logger.warning("Linear cost matrix being densified.")
-                linear_cost_matrix = linear_cost_matrix.A
-            return {"xy": TaggedArray(linear_cost_matrix, tag=Tag.COST_MATRIX)}
-
-        if term in ("x", "y"):
-            quad_cost_matrix = data[mask, :][:, mask_2]
-            if sp.issparse(quad_cost_matrix):
-                logger.warning("Quadratic cost matrix being densified.")
-                quad_cost_matrix = quad_cost_matrix.A
-            return {term: TaggedArray(quad_cost_matrix, tag=Tag.COST_MATRIX)}
+        if term == "xy" and key_2 is None:
+            raise ValueError("If `term` is `xy`, `key_2` cannot be `None`.")
+        if term == "y" and key_2 is None:
+            raise ValueError("If `term` is `y`, `key_2` cannot be `None`.")
+
+        if term in ("xy", "x", "y"):
+            if indices is None:
+                indices = self._policy._category_indices
+            # `x` is the source-source, `y` the target-target and `xy` the source-target cost
+            rows = indices.get(key_2 if term == "y" else key_1, ())
+            cols = indices.get(key_1 if term == "x" else key_2, ())
+            if not len(rows) or not len(cols):
+                raise ValueError("Unable to construct an empty mask, use `allow_empty=True` to override.")
+            cost_matrix = _slice_matrix(data, rows, cols)
+            if sp.issparse(cost_matrix) and densify:
+                logger.warning(f"Densifying cost matrix for the `{term}` term.")
+                cost_matrix = cost_matrix.A
+            return {term: TaggedArray(cost_matrix, tag=Tag.COST_MATRIX)}
 
         raise ValueError(f"Expected `term` to be one of `x`, `y`, or `xy`, found `{term!r}`.")
@@ -7,6 +7,7 @@ from typing import (
     Literal,
     Mapping,
     Optional,
+    Sequence,
     Tuple,
     Union,
 )
@@ -313,6 +314,8 @@ class OTProblem(BaseProblem):
         backend: Literal["ott"] = "ott",
         solver_name: Optional[str] = None,
         device: Optional[Device_t] = None,
+        warm_start: bool = False,
+        epsilon_schedule: Optional[Sequence[float]] = None,
         **kwargs: Any,
     ) -> "OTProblem":
         """Solve optimal transport problem.
@@ -325,6 +328,13 @@ class OTProblem(BaseProblem):
             Literal defining the solver. If `None`, automatically infers the discrete OT solver.
         device
             Device where to transfer the solution, see :meth:`moscot.base.output.BaseSolverOutput.to`.
+        warm_start
+            Whether to initialize the solver with the :attr:`~moscot.base.output.BaseSolverOutput.potentials`
+            of the current :attr:`solution`, e.g., when re-solving with slightly different parameters.
+            Only applies to full-rank linear problems.
+        epsilon_schedule
+            Entropic regularization values to solve for before solving with the final `epsilon`. Each solve is
+            initialized with the potentials of the previous one (epsilon-scaling). Usually in decreasing order.
         kwargs
             Keyword arguments for :meth:`moscot.base.solver.BaseSolver.__call__`.
 
@@ -344,6 +354,19 @@ class OTProblem(BaseProblem):
 
         # TODO: add ScaleCost(scale_cost)
 
+        init = self._get_initial_potentials() if warm_start else None
+        for epsilon in [] if epsilon_schedule is None else epsilon_schedule:
+            solution = self._solver(  # type: ignore[misc]
+                xy=self._xy,
+                x=self._x,
+                y=self._y,
+                a=self.a,
+                b=self.b,
+                **{**kwargs, "epsilon": epsilon},
+                **({} if init is None else {"init": init}),
+            )
+            init = solution.potentials
+
         self._solution = self._solver(  # type: ignore[misc]
             xy=self._xy,
             x=self._x,
@@ -352,9 +375,86 @@ class OTProblem(BaseProblem):
             b=self.b,
             device=device,
             **kwargs,
+            **({} if init is None else {"init": init}),
         )
         return self
 
+    def _get_initial_potentials(self) -> Optional[Tuple[ArrayLike, ArrayLike]]:
+        if self._solution is None:
+            logger.info("Unable to warm-start the solver, the problem has not yet been solved.")
+            return None
+        potentials = self._solution.potentials
+        if potentials is None:
+            logger.warning("Unable to warm-start the solver, the solution does not contain any potentials.")
+            return None
+        f, g = potentials
+        if (len(f), len(g)) != self.shape:
+            logger.warning(
+                f"Unable to warm-start the solver, expected potentials of shape `{self.shape}`, "
+                f"found `{(len(f), len(g))}`."
+            )
+            return None
+        return f, g
+
+    @staticmethod
+    def _solve_batched(
+        problems: Sequence["OTProblem"],
+        backend: Literal["ott"] = "ott",
+        solver_name: Optional[str] = None,
+        device: Optional[Device_t] = None,
+        warm_start: bool = False,
+        epsilon_schedule: Optional[Sequence[float]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Solve multiple same-shaped problems with one solver call.
+
+        Parameters
+        ----------
+        problems
+            Problems to solve. They must be of the same kind and their data must have matching shapes.
+        backend
+            Which backend to use, see :func:`~moscot.backends.utils.get_available_backends`.
+        solver_name
+            Literal defining the solver. If `None`, automatically infers the discrete OT solver.
+        device
+            Device where to transfer the solutions, see :meth:`moscot.base.output.BaseSolverOutput.to`.
+        warm_start
+            Whether to initialize the solver with the potentials of each problem's current solution.
+            Only used if all problems can be warm-started.
+        epsilon_schedule
+            Not supported, the problems must be solved one by one, see :meth:`solve`.
+        kwargs
+            Keyword arguments for :meth:`moscot.base.solver.OTSolver._call_batched`.
+
+        Returns
+        -------
+        Nothing, just modifies :attr:`solver`, :attr:`solution` and :attr:`stage` of each problem.
+        """
+        for problem in problems:
+            if problem.stage not in ("prepared", "solved"):
+                raise RuntimeError(
+                    f"Expected problem's stage to be either `'prepared'` or `'solved'`, found `{problem.stage!r}`."
+                )
+        kinds = {problem.problem_kind for problem in problems}
+        if len(kinds) != 1:
+            raise ValueError(f"Expected all problems to be of the same kind, found `{sorted(kinds)}`.")
+
+        if epsilon_schedule is not None:
+            raise ValueError("Epsilon-scaling is not supported when solving problems jointly.")
+
+        solver = backends.get_solver(kinds.pop(), solver_name=solver_name, backend=backend, **kwargs)
+        data = []
+        for p in problems:
+            init = p._get_initial_potentials() if warm_start else None
+            item = {"xy": p._xy, "x": p._x, "y": p._y, "a": p.a, "b": p.b}
+            data.append(item if init is None else {**item, "init": init})
+        solutions = solver._call_batched(data, device=device, **kwargs)
+
+        for problem, solution in zip(problems, solutions):
+            problem._solver = solver
+            problem._solution = solution
+            problem._stage = "solved"
+
     @require_solution
     def push(
         self,
@@ -363,6 +463,8 @@ class OTProblem(BaseProblem):
         normalize: bool = True,
         *,
         split_mass: bool = False,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
         **kwargs: Any,
     ) -> ArrayLike:
         """Push mass through the :attr:`~moscot.base.output.BaseSolverOutput.transport_matrix`.
@@ -385,6 +487,11 @@ class OTProblem(BaseProblem):
             Whether to normalize the columns of ``data`` to sum to 1.
         split_mass
             Whether to split non-zero values in ``data`` into separate columns.
+        batch_size
+            If not `None`, stream the computation in blocks of ``batch_size`` rows of the transport matrix
+            instead of applying it at once.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
 
         Returns
         -------
@@ -393,7 +500,7 @@ class OTProblem(BaseProblem):
         if TYPE_CHECKING:
             assert isinstance(self.solution, BaseSolverOutput)
         data = self._get_mass(self.adata_src, data=data, subset=subset, normalize=normalize, split_mass=split_mass)
-        return self.solution.push(data, **kwargs)
+        return self.solution.push(data, batch_size=batch_size, n_jobs=n_jobs, **kwargs)
 
     @require_solution
     def pull(
@@ -403,6 +510,8 @@ class OTProblem(BaseProblem):
         normalize: bool = True,
         *,
         split_mass: bool = False,
+        batch_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
         **kwargs: Any,
     ) -> ArrayLike:
         """Pull mass through the :attr:`~moscot.base.output.BaseSolverOutput.transport_matrix`.
@@ -425,6 +534,11 @@ class OTProblem(BaseProblem):
             Whether to normalize the columns of ``data`` to sum to 1.
         split_mass
             Whether to split non-zero values in ``data`` into separate columns.
+        batch_size
+            If not `None`, stream the computation in blocks of ``batch_size`` rows of the transport matrix
+            instead of applying it at once.
+        n_jobs
+            Number of threads used to process the blocks. Only used when ``batch_size`` is not `None`.
 
         Returns
         -------
@@ -433,7 +547,7 @@ class OTProblem(BaseProblem):
         if TYPE_CHECKING:
             assert isinstance(self.solution, BaseSolverOutput)
         data = self._get_mass(self.adata_tgt, data=data, subset=subset, normalize=normalize, split_mass=split_mass)
-        return self.solution.pull(data, **kwargs)
+        return self.solution.pull(data, batch_size=batch_size, n_jobs=n_jobs, **kwargs)
 
     @staticmethod
     def _local_pca_callback(
@@ -706,7 +820,8 @@ class NeuralOTProblem(OTProblem):  # TODO override set_x/set_y
         k: int = 30,
         length_scale: Optional[float] = None,
         seed: int = 42,
-    ) -> sp.csr_matrix:
+        aggregate_by: Optional[Tuple[sp.spmatrix, sp.spmatrix]] = None,
+    ) -> Union[sp.csr_matrix, ArrayLike]:
         """Project Neural OT map onto cells.
 
         In constrast to discrete OT, Neural OT does not necessarily map cells onto cells,
@@ -740,11 +855,14 @@ class NeuralOTProblem(OTProblem):  # TODO override set_x/set_y
         seed
             Random seed for sampling the pairs of distributions for computing the variance in case `length_scale`
             is `None`.
+        aggregate_by
+            One-hot group indicators of the source and target cells. If not `None`, return the group-level
+            transition matrix, accumulated batch by batch without instantiating the projected transport matrix.
 
 
         Returns
         -------
-        The projected transport matrix.
+        The projected transport matrix or its aggregation if ``aggregate_by`` is not `None`.
         """
         if TYPE_CHECKING:
             assert isinstance(self._xy, TaggedArray)  # ensured by require_solution
@@ -759,6 +877,7 @@ class NeuralOTProblem(OTProblem):  # TODO override set_x/set_y
             k=k,
             length_scale=length_scale,
             seed=seed,
+            aggregate_by=aggregate_by,
         )
 
 
@@ -4,10 +4,12 @@ from typing import (
     Any,
     Dict,
     Generic,
+    List,
     Literal,
     Mapping,
     NamedTuple,
     Optional,
+    Sequence,
     Tuple,
     TypeVar,
     Union,
@@ -142,6 +144,39 @@ class BaseSolver(Generic[O], abc.ABC):
         data = self._prepare(**kwargs)
         return self._solve(data)
 
+    def _solve_batched(self, data: Sequence[Any], states: Optional[Sequence[Any]] = None, **kwargs: Any) -> List[O]:
+        """Solve multiple problems sharing the same configuration.
+
+        By default, the problems are solved one after another. Backends can override this method
+        to solve them jointly, e.g., by vectorizing over the problems.
+
+        Parameters
+        ----------
+        data
+            Objects returned by :meth:`_prepare`.
+        states
+            Per-problem solver states returned by :meth:`_get_state` after each :meth:`_prepare`.
+        kwargs
+            Additional keyword arguments.
+
+        Returns
+        -------
+        The outputs, in the same order as ``data``.
+        """
+        res = []
+        for i, d in enumerate(data):
+            if states is not None:
+                self._set_state(states[i])
+            res.append(self._solve(d, **kwargs))
+        return res
+
+    def _get_state(self) -> Any:
+        # state set by `_prepare` which is specific to the prepared problem, e.g., the initial potentials
+        return None
+
+    def _set_state(self, state: Any) -> None:
+        pass
+
 
 @d.get_sections(base="OTSolver", sections=["Parameters", "Raises"])
 @d.dedent
@@ -186,6 +221,43 @@ class OTSolver(TagConverter, BaseSolver[O], abc.ABC):
 
         return res.to(device=device)  # type: ignore[return-value]
 
+    def _call_batched(
+        self,
+        data: Sequence[Mapping[str, Any]],
+        device: Optional[Device_t] = None,
+        **kwargs: Any,
+    ) -> List[O]:
+        """Solve multiple optimal transport problems sharing the same configuration.
+
+        Parameters
+        ----------
+        data
+            Per-problem data, each containing ``xy``, ``x``, ``y``, ``tags`` and any other problem-specific
+            keyword arguments, such as the marginals ``a`` and ``b``.
+        device
+            Device to transfer the outputs to, see :meth:`~moscot.base.output.BaseSolverOutput.to`.
+        kwargs
+            Keyword arguments shared by all problems.
+
+        Returns
+        -------
+        The optimal transport solutions, in the same order as ``data``.
+        """
+        probs, states = [], []
+        for item in data:
+            item = dict(item)
+            arrs = self._get_array_data(
+                xy=item.pop("xy", None), x=item.pop("x", None), y=item.pop("y", None), tags=item.pop("tags", {})
+            )
+            probs.append(self._prepare(**{**kwargs, **item, **self._prepare_kwargs(arrs)}))
+            states.append(self._get_state())
+
+        res = self._solve_batched(probs, states=states)
+        if not all(r.converged for r in res):
+            logger.warning("Solver did not converge")
+
+        return [r.to(device=device) for r in res]  # type: ignore[misc]
+
     def _prepare_kwargs(self, data: Union[TaggedArrayData, Dict[Any, Any]]) -> Dict[str, Any]:  # dict for CondOT
         if isinstance(data, dict):  # TODO: find better solution
             return {"xy": data}
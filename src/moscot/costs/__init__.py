@@ -1,4 +1,20 @@
+from moscot.base.cost import (
+    CostCacheInfo,
+    clear_cost_cache,
+    get_cost_cache_info,
+    set_cost_cache,
+)
 from moscot.costs._costs import BarcodeDistance, LeafDistance
 from moscot.costs._utils import get_available_costs, get_cost, register_cost
 
-__all__ = ["LeafDistance", "BarcodeDistance", "get_cost", "register_cost", "get_available_costs"]
+__all__ = [
+    "LeafDistance",
+    "BarcodeDistance",
+    "get_cost",
+    "register_cost",
+    "get_available_costs",
+    "CostCacheInfo",
+    "get_cost_cache_info",
+    "clear_cost_cache",
+    "set_cost_cache",
+]
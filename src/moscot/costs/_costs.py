@@ -1,10 +1,11 @@
-from typing import Any, List, Mapping, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Union
 
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 
-from moscot._types import ArrayLike
-from moscot.base.cost import BaseCost
+from moscot._types import ArrayLike, PathLike
+from moscot.base.cost import _EXECUTION_KWARGS, BaseCost
 from moscot.costs._utils import register_cost
 
 __all__ = ["LeafDistance", "BarcodeDistance"]
@@ -27,16 +28,87 @@ class BarcodeDistance(BaseCost):
     def _compute(
         self,
         *_: Any,
+        batch_size: int = 1024,
+        n_jobs: Optional[int] = None,
+        condensed: bool = False,
+        path: Optional[PathLike] = None,
         **__: Any,
     ) -> ArrayLike:
-        barcodes = self.data
-        n_cells = barcodes.shape[0]
-        distances = np.zeros((n_cells, n_cells))
-        for i in range(n_cells):
-            distances[i, i + 1 :] = [
-                self._scaled_hamming_dist(barcodes[i, :], barcodes[j, :]) for j in range(i + 1, n_cells)
-            ]
-        return distances + np.transpose(distances)
+        """Compute the scaled Hamming distance between all pairs of barcodes.
+
+        Parameters
+        ----------
+        batch_size
+            Number of cells for which to compute the distances to all other cells at once.
+        n_jobs
+            Number of threads used to process the batches. If `None`, use 1 thread.
+        condensed
+            Whether to return the condensed distance matrix, see :func:`scipy.spatial.distance.squareform`.
+        path
+            If not `None`, store the distances in a memory-mapped :mod:`numpy` file.
+
+        Returns
+        -------
+        The distance matrix.
+        """
+        from joblib import Parallel, delayed
+
+        if batch_size <= 0:
+            raise ValueError(f"Expected `batch_size` to be positive, found `{batch_size}`.")
+
+        measured, scarred, states, scarred_states = self._encode(self.data)
+        n_cells = measured.shape[0]
+        shape = (n_cells * (n_cells - 1) // 2,) if condensed else (n_cells, n_cells)
+        if path is None:
+            distances = np.zeros(shape)
+        else:
+            distances = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+
+        def compute_batch(start: int) -> None:
+            stop = min(start + batch_size, n_cells)
+            # the number of different and double scarred sites of the shared sites
+            shared = measured[start:stop] @ measured.T
+            equal = (states[start:stop] @ states.T).toarray()
+            double_scars = scarred[start:stop] @ scarred.T - (scarred_states[start:stop] @ scarred_states.T).toarray()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                dist = (shared - equal + double_scars) / shared  # NaN if no sites were measured in both cells
+            np.fill_diagonal(dist[:, start:stop], 0.0)
+            if not condensed:
+                distances[start:stop] = dist
+                return
+            for i in range(start, stop):
+                offset = i * n_cells - i * (i + 1) // 2
+                distances[offset : offset + n_cells - i - 1] = dist[i - start, i + 1 :]
+
+        starts = range(0, n_cells, batch_size)
+        if n_jobs is None or n_jobs == 1:
+            for start in starts:
+                compute_batch(start)
+        else:
+            Parallel(n_jobs=n_jobs, backend="threading")(delayed(compute_batch)(start) for start in starts)
+
+        if isinstance(distances, np.memmap):
+            distances.flush()
+        return distances
+
+    @staticmethod
+    def _encode(barcodes: ArrayLike) -> Tuple[ArrayLike, ArrayLike, sp.csr_matrix, sp.csr_matrix]:
+        # negative states are not measured, `0` is the unscarred state
+        barcodes = np.asarray(barcodes)
+        n_cells, n_sites = barcodes.shape
+        measured, scarred = barcodes >= 0, barcodes > 0
+        _, codes = np.unique(barcodes, return_inverse=True)
+        codes = codes.reshape(n_cells, n_sites)
+
+        # one-hot encode the states per site, such that matching states can be counted using a matrix product
+        n_states = codes.max() + 1 if codes.size else 0
+        rows, sites = np.nonzero(measured)
+        states = sp.csr_matrix(
+            (np.ones(len(rows)), (rows, sites * n_states + codes[rows, sites])), shape=(n_cells, n_sites * n_states)
+        )
+        scarred_states = states.multiply(np.repeat(scarred, n_states, axis=1)).tocsr()
+
+        return measured.astype(np.float64), scarred.astype(np.float64), states, scarred_states
 
     @staticmethod
     def _scaled_hamming_dist(x: ArrayLike, y: ArrayLike) -> float:
@@ -78,21 +150,112 @@ class LeafDistance(BaseCost):
 
     def _compute(
         self,
+        *_: Any,
+        weight: Union[str, Callable[[Any, Any, Dict[str, Any]], float]] = "weight",
+        batch_size: int = 1024,
+        path: Optional[PathLike] = None,
         **kwargs: Any,
     ) -> ArrayLike:
-        tree = self.data
-        undirected_tree = tree.to_undirected()
+        """Compute the path length between all pairs of leaves.
+
+        The tree is traversed once and the distance between leaves `u` and `v` is computed as
+        `depth(u) + depth(v) - 2 * depth(lca(u, v))`, where `lca` is their lowest common ancestor.
+
+        Parameters
+        ----------
+        weight
+            Edge attribute containing the branch lengths, `1` if missing, or a function
+            ``(u, v, edge_attrs) -> float``, same as in :func:`networkx.shortest_path_length`.
+        batch_size
+            Number of rows of the distance matrix to compute at once.
+        path
+            If not `None`, store the distances in a memory-mapped :mod:`numpy` file.
+        kwargs
+            Other execution arguments, e.g., ``n_jobs``, which are ignored since the tree is traversed once.
+
+        Returns
+        -------
+        The distance matrix.
+        """
+        unexpected = sorted(set(kwargs) - _EXECUTION_KWARGS)
+        if unexpected:
+            # e.g., the `cutoff` or `target` of `networkx.multi_source_dijkstra`, used to compute the distances before
+            raise TypeError(f"Unexpected keyword arguments `{unexpected}`, only `weight` is supported.")
+        if batch_size <= 0:
+            raise ValueError(f"Expected `batch_size` to be positive, found `{batch_size}`.")
+
+        undirected_tree = self.data.to_undirected()
         leaves = self._get_leaves(undirected_tree)
         n_leaves = len(leaves)
 
-        distances = np.zeros((n_leaves, n_leaves), dtype=np.float_)
-        for i, leaf in enumerate(leaves):
-            # TODO(@MUCDK): more efficient, problem: `target`in `multi_source_dijkstra` cannot be chosen as a subset
-            distance_dictionary = nx.multi_source_dijkstra(undirected_tree, [leaf], **kwargs)[0]
-            distances[i, :] = [distance_dictionary.get(leaf) for leaf in leaves]
+        # first store the depths of the LCAs, leaves in different components are not connected
+        if path is None:
+            distances = np.full((n_leaves, n_leaves), np.nan)
+        else:
+            distances = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(n_leaves, n_leaves))
+            distances[:] = np.nan
+        leaf_depth = np.zeros(n_leaves)
+        for component in nx.connected_components(undirected_tree):
+            self._fill_lca_depth(undirected_tree, component, leaves, weight, leaf_depth, distances)
+
+        for start in range(0, n_leaves, batch_size):
+            rows = slice(start, start + batch_size)
+            distances[rows] = leaf_depth[rows, None] + leaf_depth[None, :] - 2 * distances[rows]
 
+        if isinstance(distances, np.memmap):
+            distances.flush()
         return distances
 
+    @staticmethod
+    def _fill_lca_depth(
+        tree: nx.Graph,
+        component: Set[Any],
+        leaves: Sequence[Any],
+        weight: Union[str, Callable[[Any, Any, Dict[str, Any]], float]],
+        leaf_depth: ArrayLike,
+        lca_depth: ArrayLike,
+    ) -> None:
+        # root the component arbitrarily, each subtree spans a contiguous range of the preorder
+        root = next(iter(component))
+        edges = list(nx.dfs_edges(tree, root))
+        preorder = [root] + [child for _, child in edges]
+        node_to_ix = {node: i for i, node in enumerate(preorder)}
+        n_nodes = len(preorder)
+
+        parent = np.full(n_nodes, -1)
+        depth = np.zeros(n_nodes)
+        for i, (u, v) in enumerate(edges, start=1):
+            parent[i] = node_to_ix[u]
+            attrs = tree.edges[u, v]
+            depth[i] = depth[parent[i]] + (weight(u, v, attrs) if callable(weight) else attrs.get(weight, 1))
+        size = np.ones(n_nodes, dtype=int)
+        for i in range(n_nodes - 1, 0, -1):
+            size[parent[i]] += size[i]
+
+        # cells sorted by the preorder of their leaves, `lo[i]:hi[i]` are the cells in the subtree of the `i`-th node
+        cells = sorted((node_to_ix[leaf], j) for j, leaf in enumerate(leaves) if leaf in node_to_ix)
+        if not cells:
+            return
+        cell_preorder, pos = (np.asarray(arr, dtype=int) for arr in zip(*cells))
+        leaf_depth[pos] = depth[cell_preorder]
+        lo = np.searchsorted(cell_preorder, np.arange(n_nodes))
+        hi = np.searchsorted(cell_preorder, np.arange(n_nodes) + size)
+
+        # the node is the LCA of the cells in its subtree which are not in the same child's subtree
+        for i in range(1, n_nodes):
+            rows = pos[lo[i] : hi[i]]
+            if not len(rows):
+                continue
+            p = parent[i]
+            cols = np.concatenate([pos[lo[p] : lo[i]], pos[hi[i] : hi[p]]])
+            if len(cols):
+                lca_depth[np.ix_(rows, cols)] = depth[p]
+        # a leaf is also the LCA of its own cells and the cells of its descendants, e.g., if the root has degree 1
+        for i in np.unique(cell_preorder):
+            own, subtree = pos[lo[i] : np.searchsorted(cell_preorder, i, side="right")], pos[lo[i] : hi[i]]
+            lca_depth[np.ix_(own, subtree)] = depth[i]
+            lca_depth[np.ix_(subtree, own)] = depth[i]
+
     def _get_leaves(self, tree: nx.Graph, cell_to_leaf: Optional[Mapping[str, Any]] = None) -> List[Any]:
         leaves = [node for node in tree if tree.degree(node) == 1]
         if not set(self.adata.obs_names).issubset(leaves):
@@ -6,7 +6,7 @@ from anndata import AnnData
 
 from moscot import _constants
 from moscot._docs._docs_mixins import d_mixins
-from moscot._types import ArrayLike, Str_Dict_t
+from moscot._types import ArrayLike, PathLike, Str_Dict_t
 from moscot.base.problems._mixins import AnalysisMixin, AnalysisMixinProtocol
 from moscot.base.problems.compound_problem import ApplyOutput_t, B, K
 from moscot.plotting._utils import set_plotting_vars
@@ -48,6 +48,7 @@ class GenericAnalysisMixin(AnalysisMixin[K, B]):
         batch_size: Optional[int] = None,
         normalize: bool = True,
         key_added: Optional[str] = _constants.CELL_TRANSITION,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         """
         Compute a grouped cell transition matrix.
@@ -65,6 +66,7 @@ class GenericAnalysisMixin(AnalysisMixin[K, B]):
         %(ott_jax_batch_size)s
         %(normalize)s
         %(key_added_plotting)s
+        %(memmap_path)s
 
         Returns
         -------
@@ -88,6 +90,7 @@ class GenericAnalysisMixin(AnalysisMixin[K, B]):
             normalize=normalize,
             other_key=None,
             key_added=key_added,
+            memmap_path=memmap_path,
         )
 
     @d_mixins.dedent
@@ -30,7 +30,7 @@ from moscot import _constants
 from moscot._docs._docs import d
 from moscot._docs._docs_mixins import d_mixins
 from moscot._logging import logger
-from moscot._types import ArrayLike, Device_t, Str_Dict_t
+from moscot._types import ArrayLike, Device_t, PathLike, Str_Dict_t
 from moscot.base.problems._mixins import AnalysisMixin, AnalysisMixinProtocol
 from moscot.base.problems.compound_problem import B, K
 from moscot.utils.subset_policy import StarPolicy
@@ -185,7 +185,9 @@ class SpatialAlignmentMixin(AnalysisMixin[K, B]):
         aligned_maps, aligned_metadata = self._interpolate_scheme(
             reference=reference, mode=mode, spatial_key=spatial_key
         )
-        aligned_basis = np.vstack([aligned_maps[k] for k in self._policy._cat])
+        aligned_basis = np.full((self.adata.n_obs, aligned_maps[reference].shape[1]), np.nan)
+        for k in self._policy._cat:
+            aligned_basis[self._policy.indices(k)] = aligned_maps[k]
         if mode == "affine":
             if not inplace:
                 return aligned_basis, aligned_metadata
@@ -208,6 +210,7 @@ class SpatialAlignmentMixin(AnalysisMixin[K, B]):
         batch_size: Optional[int] = None,
         normalize: bool = True,
         key_added: Optional[str] = _constants.CELL_TRANSITION,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         """
         Compute a grouped cell transition matrix.
@@ -223,6 +226,7 @@ class SpatialAlignmentMixin(AnalysisMixin[K, B]):
         %(ott_jax_batch_size)s
         %(normalize)s
         %(key_added_plotting)s
+        %(memmap_path)s
 
         Returns
         -------
@@ -248,6 +252,7 @@ class SpatialAlignmentMixin(AnalysisMixin[K, B]):
             batch_size=batch_size,
             normalize=normalize,
             key_added=key_added,
+            memmap_path=memmap_path,
         )
 
     @property
@@ -277,7 +282,7 @@ class SpatialAlignmentMixin(AnalysisMixin[K, B]):
     ) -> ArrayLike:
         if spatial_key is None:
             spatial_key = self.spatial_key
-        return self.adata[self.adata.obs[self._policy._subset_key] == k].obsm[spatial_key].astype(float, copy=True)
+        return self.adata[self._policy.indices(k)].obsm[spatial_key].astype(float, copy=True)
 
     @staticmethod
     def _affine(
@@ -367,8 +372,8 @@ class SpatialMappingMixin(AnalysisMixin[K, B]):
         corrs = {}
         gexp_sc = self.adata_sc[:, var_sc].X if not sp.issparse(self.adata_sc.X) else self.adata_sc[:, var_sc].X.A
         for key, val in self.solutions.items():
-            index_obs: List[Union[bool, int]] = (
-                self.adata_sp.obs[self._policy._subset_key] == key[0]
+            index_obs: ArrayLike = (
+                self._policy.indices(key[0])
                 if self._policy._subset_key is not None
                 else np.arange(self.adata_sp.shape[0])
             )
@@ -496,6 +501,7 @@ class SpatialMappingMixin(AnalysisMixin[K, B]):
         batch_size: Optional[int] = None,
         normalize: bool = True,
         key_added: Optional[str] = _constants.CELL_TRANSITION,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         """
         Compute a grouped cell transition matrix.
@@ -511,6 +517,7 @@ class SpatialMappingMixin(AnalysisMixin[K, B]):
         %(ott_jax_batch_size)s
         %(normalize)s
         %(key_added_plotting)s
+        %(memmap_path)s
 
         Returns
         -------
@@ -535,6 +542,7 @@ class SpatialMappingMixin(AnalysisMixin[K, B]):
             batch_size=batch_size,
             normalize=normalize,
             key_added=key_added,
+            memmap_path=memmap_path,
         )
 
     @property
@@ -1,4 +1,3 @@
-import itertools
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
@@ -22,7 +21,7 @@ from anndata import AnnData
 
 from moscot import _constants
 from moscot._docs._docs_mixins import d_mixins
-from moscot._types import ArrayLike, Numeric_t, Str_Dict_t
+from moscot._types import ArrayLike, Numeric_t, PathLike, Str_Dict_t
 from moscot.base.output import BaseSolverOutput
 from moscot.base.problems._mixins import AnalysisMixin, AnalysisMixinProtocol
 from moscot.base.problems.birth_death import BirthDeathProblem
@@ -53,6 +52,7 @@ class TemporalMixinProtocol(AnalysisMixinProtocol[K, B], Protocol[K, B]):  # typ
         batch_size: Optional[int] = None,
         normalize: bool = True,
         key_added: Optional[str] = _constants.CELL_TRANSITION,
+        memmap_path: Optional[PathLike] = None,
     ) -> pd.DataFrame:
         ...
 
@@ -80,7 +80,7 @@ class TemporalMixinProtocol(AnalysisMixinProtocol[K, B], Protocol[K, B]):  # typ
         batch_size: int = 256,
         account_for_unbalancedness: bool = False,
         interpolation_parameter: Optional[Numeric_t] = None,
-        seed: Optional[int] = None,
+        seed: Optional[Union[int, ArrayLike]] = None,
     ) -> Tuple[List[Any], List[ArrayLike]]:
         ...
 
@@ -105,7 +105,7 @@ class TemporalMixinProtocol(AnalysisMixinProtocol[K, B], Protocol[K, B]):  # typ
         interpolation_parameter: float,
         account_for_unbalancedness: bool = True,
         batch_size: int = 256,
-        seed: Optional[int] = None,
+        seed: Optional[Union[int, ArrayLike]] = None,
     ) -> ArrayLike:
         ...
 
@@ -174,6 +174,7 @@ class TemporalMixin(AnalysisMixin[K, B]):
         batch_size: Optional[int] = None,
         normalize: bool = True,
         key_added: Optional[str] = _constants.CELL_TRANSITION,
+        memmap_path: Optional[PathLike] = None,
     ) -> Optional[pd.DataFrame]:
         """
         Compute a grouped cell transition matrix.
@@ -189,6 +190,7 @@ class TemporalMixin(AnalysisMixin[K, B]):
         %(ott_jax_batch_size)s
         %(normalize)s
         %(key_added_plotting)s
+        %(memmap_path)s
 
         Returns
         -------
@@ -208,9 +210,10 @@ class TemporalMixin(AnalysisMixin[K, B]):
             target_groups=target_groups,
             forward=forward,
             aggregation_mode=aggregation_mode,
-            size=batch_size,
+            batch_size=batch_size,
             normalize=normalize,
             key_added=key_added,
+            memmap_path=memmap_path,
         )
 
     @d_mixins.dedent
@@ -585,7 +588,7 @@ class TemporalMixin(AnalysisMixin[K, B]):
         account_for_unbalancedness: bool = False,
         batch_size: int = 256,
         posterior_marginals: bool = True,
-        seed: Optional[int] = None,
+        seed: Optional[Union[int, ArrayLike]] = None,
         backend: Literal["ott"] = "ott",
         **kwargs: Any,
     ) -> Numeric_t:
@@ -756,36 +759,45 @@ class TemporalMixin(AnalysisMixin[K, B]):
         batch_key: str,
         posterior_marginals: bool = True,
         backend: Literal["ott"] = "ott",
+        pairwise: bool = False,
         **kwargs: Any,
-    ) -> np.float_:
+    ) -> Union[np.float_, pd.DataFrame]:
         """
         Compute the mean Wasserstein distance between batches of a distribution corresponding to one time point.
 
+        The distances between all pairs of batches are computed jointly.
+
         Parameters
         ----------
         %(time_batch_distance)s
         %(batch_key_batch_distance)s
         %(use_posterior_marginals)s
         %(backend)s
+        pairwise
+            Whether to return the distances between all pairs of batches instead of their mean.
         %(kwargs_divergence)
 
         Returns
         -------
         The mean Wasserstein distance between batches of a distribution corresponding to one time point.
+        If ``pairwise = True``, the :class:`~pandas.DataFrame` of shape ``[n_batches, n_batches]`` with the
+        distances between all pairs of batches.
         """
         data, adata = self._get_data(time, posterior_marginals=posterior_marginals, only_start=True)  # type: ignore[misc] # noqa: E501
         assert len(adata) == len(data), "TODO: wrong shapes"
-        dist: List[Numeric_t] = []
-        for batch_1, batch_2 in itertools.combinations(adata.obs[batch_key].unique(), 2):
-            dist.append(
-                self._compute_wasserstein_distance(
-                    point_cloud_1=data[(adata.obs[batch_key] == batch_1).values, :],
-                    point_cloud_2=data[(adata.obs[batch_key] == batch_2).values, :],
-                    backend=backend,
-                    **kwargs,
-                )
-            )
-        return np.mean(dist)
+        if backend != "ott":
+            raise NotImplementedError("Only `ott` available as backend.")
+        from moscot.backends.ott._utils import _compute_sinkhorn_divergences
+
+        # split the data into batches with one sort, cells without a batch are ignored
+        codes, batches = pd.factorize(adata.obs[batch_key])
+        order = np.argsort(codes, kind="stable")[np.sum(codes < 0) :]
+        point_clouds = np.split(np.asarray(data)[order], np.cumsum(np.bincount(codes[order]))[:-1])
+
+        dist = _compute_sinkhorn_divergences(point_clouds, **kwargs)
+        if pairwise:
+            return pd.DataFrame(dist, index=batches, columns=batches)
+        return np.mean(dist[np.triu_indices(len(batches), 1)])
 
     # TODO(@MUCDK) possibly offer two alternatives, once exact EMD with POT backend and once approximate,
     # faster with same solver as used for original problems
@@ -816,7 +828,7 @@ class TemporalMixin(AnalysisMixin[K, B]):
         interpolation_parameter: float,
         account_for_unbalancedness: bool = True,
         batch_size: int = 256,
-        seed: Optional[int] = None,
+        seed: Optional[Union[int, ArrayLike]] = None,
     ) -> ArrayLike:
         rows_sampled, cols_sampled = self._sample_from_tmap(
             source=source,
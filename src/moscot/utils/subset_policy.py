@@ -67,6 +67,7 @@ class SubsetPolicy(Generic[K], abc.ABC):
         self._graph: Set[Tuple[K, K]] = set()
         self._cat = tuple(self._data.cat.categories)
         self._subset_key: Optional[str] = key
+        self._indices: Optional[Dict[K, ArrayLike]] = None
 
         if verify_integrity and len(self._cat) < 2:
             raise ValueError(f"Policy must contain at least `2` different values, found `{len(self._cat)}`.")
@@ -127,14 +128,46 @@ class SubsetPolicy(Generic[K], abc.ABC):
     ) -> Sequence[Tuple[K, K]]:
         return [step for step in plan if step in filter]
 
-    def create_mask(self, value: Union[K, Sequence[K]], *, allow_empty: bool = False) -> ArrayLike:
+    @property
+    def _category_indices(self) -> Dict[K, ArrayLike]:
+        # sorted integer indices of the observations belonging to each category, computed once
+        if getattr(self, "_indices", None) is None:
+            codes = self._data.cat.codes.to_numpy()
+            order = np.argsort(codes, kind="stable")
+            order.setflags(write=False)
+            bounds = np.searchsorted(codes[order], np.arange(len(self._data.cat.categories) + 1))
+            self._indices = {cat: order[bounds[i] : bounds[i + 1]] for i, cat in enumerate(self._data.cat.categories)}
+        return self._indices  # type: ignore[return-value]
+
+    def indices(self, value: Union[K, Sequence[K]], *, allow_empty: bool = False) -> ArrayLike:
+        """Get the integer indices of the observations belonging to one or more categories.
+
+        The indices are sorted, so the observations of a contiguous category can be sliced without copying.
+
+        Parameters
+        ----------
+        value
+            Category or a sequence of categories.
+        allow_empty
+            Whether to allow no observations to belong to ``value``.
+
+        Returns
+        -------
+        Array of shape ``[k,]``.
+        """
+        empty = np.empty((0,), dtype=np.intp)
         if isinstance(value, str) or not isinstance(value, Iterable):
-            mask = self._data == value
+            ixs = self._category_indices.get(value, empty)
         else:
-            mask = self._data.isin(value)
-        if not allow_empty and not np.sum(mask):
+            ixs = np.sort(np.concatenate([empty] + [self._category_indices.get(v, empty) for v in set(value)]))
+        if not allow_empty and not len(ixs):
             raise ValueError("Unable to construct an empty mask, use `allow_empty=True` to override.")
-        return np.asarray(mask)
+        return ixs
+
+    def create_mask(self, value: Union[K, Sequence[K]], *, allow_empty: bool = False) -> ArrayLike:
+        mask = np.zeros((len(self._data),), dtype=bool)
+        mask[self.indices(value, allow_empty=allow_empty)] = True
+        return mask
 
     def create_masks(self, discard_empty: bool = True) -> Dict[Tuple[K, K], Tuple[ArrayLike, ArrayLike]]:
         res = {}
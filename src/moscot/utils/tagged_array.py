@@ -1,6 +1,6 @@
 import enum
 from dataclasses import dataclass
-from typing import Any, Callable, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Iterator, Literal, Optional, Tuple, Union
 
 import numpy as np
 import scipy.sparse as sp
@@ -8,10 +8,10 @@ import scipy.sparse as sp
 from anndata import AnnData
 
 from moscot._logging import logger
-from moscot._types import ArrayLike, CostFn_t
+from moscot._types import ArrayLike, CostFn_t, DTypeLike
 from moscot.costs import get_cost
 
-__all__ = ["Tag", "TaggedArray"]
+__all__ = ["Tag", "TaggedArray", "LazyArray"]
 
 
 @enum.unique
@@ -23,6 +23,108 @@ class Tag(str, enum.Enum):
     POINT_CLOUD = "point_cloud"  #: Point cloud.
 
 
+class LazyArray:
+    """Array stored in :class:`~anndata.AnnData` whose rows are only read when needed.
+
+    This is useful for backed :class:`~anndata.AnnData`, where the data is only read from disk, in blocks of rows,
+    when the geometry is created.
+
+    Parameters
+    ----------
+    adata
+        Annotated data object, possibly a (backed) view.
+    attr
+        Attribute of :class:`~anndata.AnnData` containing the data.
+    key
+        Key in the ``attr`` of :class:`~anndata.AnnData`.
+    batch_size
+        Number of rows to read at once.
+    """
+
+    def __init__(
+        self,
+        adata: AnnData,
+        *,
+        attr: Literal["X", "obsp", "obsm", "layers"],
+        key: Optional[str] = None,
+        batch_size: int = 4096,
+    ):
+        if batch_size <= 0:
+            raise ValueError(f"Expected `batch_size` to be positive, found `{batch_size}`.")
+        self._adata = adata
+        self._attr = attr
+        self._key = key
+        self._batch_size = batch_size
+        # reading a single row to validate the data and determine the number of columns and the dtype
+        row = self._read(0, 1)
+        self._shape = (adata.n_obs, row.shape[1])
+        self._dtype = row.dtype
+
+    def _read(self, start: int, stop: int) -> ArrayLike:
+        data = TaggedArray._get_data(self._adata[start:stop], attr=self._attr, key=self._key)
+        data = data.A if sp.issparse(data) else np.asarray(data)
+        if data.ndim != 2:
+            raise ValueError(f"Expected data to have `2` dimensions, found `{data.ndim}`.")
+        return data
+
+    def blocks(self) -> Iterator[ArrayLike]:
+        """Iterate over dense blocks of at most :attr:`batch_size` rows.
+
+        Yields
+        ------
+        The dense blocks.
+        """
+        for start in range(0, self.shape[0], self._batch_size):
+            yield self._read(start, min(start + self._batch_size, self.shape[0]))
+
+    def materialize(self, dtype: Optional[DTypeLike] = None) -> ArrayLike:
+        """Read the whole array into memory.
+
+        Parameters
+        ----------
+        dtype
+            Data type of the array. The blocks are cast when they are written into the array, which avoids
+            a copy of the whole array afterwards. If `None`, use :attr:`dtype`.
+
+        Returns
+        -------
+        The dense array.
+        """
+        modifier = f"adata.{self._attr}" if self._key is None else f"adata.{self._attr}[{self._key!r}]"
+        logger.warning(f"Reading data in `{modifier}` of shape `{self.shape}` into memory")
+        res = np.empty(self.shape, dtype=self.dtype if dtype is None else dtype)
+        for start, block in zip(range(0, self.shape[0], self._batch_size), self.blocks()):
+            res[start : start + len(block)] = block
+        return res
+
+    def __array__(self, dtype: Optional[Any] = None) -> ArrayLike:
+        return self.materialize(dtype=dtype)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Shape of the array."""
+        return self._shape
+
+    @property
+    def ndim(self) -> int:
+        """Number of dimensions."""
+        return 2
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Data type of the array."""
+        return self._dtype
+
+    @property
+    def batch_size(self) -> int:
+        """Number of rows read at once."""
+        return self._batch_size
+
+    def __repr__(self) -> str:
+        modifier = f"adata.{self._attr}" if self._key is None else f"adata.{self._attr}[{self._key!r}]"
+        return f"{self.__class__.__name__}[{modifier}, shape={self.shape!r}]"
+
+
 @dataclass(frozen=True, repr=True)
 class TaggedArray:
     """Tagged array."""
@@ -33,12 +135,12 @@ class TaggedArray:
     cost: Optional[Union[str, Callable[..., Any]]] = None  #: Cost function when ``tag = 'point_cloud'``.
 
     @staticmethod
-    def _extract_data(
+    def _get_data(
         adata: AnnData,
         *,
         attr: Literal["X", "obsp", "obsm", "layers", "uns"],
         key: Optional[str] = None,
-    ) -> ArrayLike:
+    ) -> Union[ArrayLike, sp.spmatrix]:
         modifier = f"adata.{attr}" if key is None else f"adata.{attr}[{key!r}]"
         try:
             data = getattr(adata, attr)
@@ -53,7 +155,19 @@ class TaggedArray:
         except IndexError:
             raise IndexError(f"Unable to fetch data from `{modifier}`.") from None
 
-        if sp.issparse(data):
+        return data
+
+    @staticmethod
+    def _extract_data(
+        adata: AnnData,
+        *,
+        attr: Literal["X", "obsp", "obsm", "layers", "uns"],
+        key: Optional[str] = None,
+        densify: bool = False,
+    ) -> Union[ArrayLike, sp.spmatrix]:
+        modifier = f"adata.{attr}" if key is None else f"adata.{attr}[{key!r}]"
+        data = TaggedArray._get_data(adata, attr=attr, key=key)
+        if densify and sp.issparse(data):
             logger.warning(f"Densifying data in `{modifier}`")
             data = data.A
         if data.ndim != 2:
@@ -71,6 +185,8 @@ class TaggedArray:
         key: Optional[str] = None,
         cost: CostFn_t = "sq_euclidean",
         backend: Literal["ott"] = "ott",
+        lazy: bool = False,
+        densify: bool = False,
         **kwargs: Any,
     ) -> "TaggedArray":
         """Create tagged array from :class:`~anndata.AnnData`.
@@ -96,6 +212,11 @@ class TaggedArray:
               Otherwise, :class:`~moscot.base.cost.BaseCost` is used to compute the cost matrix.
         backend
             Which backend to use, see :func:`~moscot.backends.utils.get_available_backends`.
+        lazy
+            Whether to read the point cloud only when the geometry is created, see :class:`LazyArray`.
+            Useful for backed :class:`~anndata.AnnData`.
+        densify
+            Whether to densify sparse arrays.
         kwargs
             Keyword arguments for :class:`~moscot.base.cost.BaseCost`.
 
@@ -105,12 +226,14 @@ class TaggedArray:
 
         Notes
         -----
-        Sparse arrays will be always densified.
+        Unless ``densify = True``, sparse arrays are kept sparse and only densified when creating the geometry.
+        If the solver is called with ``n_comps``, sparse point clouds are instead projected onto their top ``n_comps``
+        singular vectors and sparse cost matrices are approximated by low-rank factors.
         """
         if tag == Tag.COST_MATRIX:
             if cost == "custom":  # our custom cost functions
-                data = cls._extract_data(adata, attr=attr, key=key)
-                if np.any(data < 0):
+                data = cls._extract_data(adata, attr=attr, key=key, densify=densify)
+                if np.any((data.data if sp.issparse(data) else data) < 0):
                     raise ValueError("Cost matrix contains negative values.")
                 return cls(data_src=data, tag=Tag.COST_MATRIX, cost=None)
 
@@ -119,7 +242,10 @@ class TaggedArray:
             return cls(data_src=cost_matrix, tag=Tag.COST_MATRIX, cost=None)
 
         # tag is either a point cloud or a kernel
-        data = cls._extract_data(adata, attr=attr, key=key)
+        if lazy and tag == Tag.POINT_CLOUD:
+            data = LazyArray(adata, attr=attr, key=key)  # type: ignore[arg-type]
+        else:
+            data = cls._extract_data(adata, attr=attr, key=key, densify=densify)
         cost_fn = get_cost(cost, backend=backend, **kwargs)
         return cls(data_src=data, tag=tag, cost=cost_fn)
 
@@ -46,6 +46,20 @@ class MockSolverOutput(MatrixSolverOutput):
         return np.ones(n)
 
 
+class MockLowRankSolverOutput(MockSolverOutput):
+    def __init__(self, q: ArrayLike, r: ArrayLike, g: ArrayLike):
+        super().__init__((q / g[None, :]) @ r.T)
+        self._factors = q, r, g
+
+    @property
+    def rank(self) -> int:
+        return len(self._factors[2])
+
+    @property
+    def _low_rank_factors(self) -> Optional[Tuple[ArrayLike, ArrayLike, ArrayLike]]:
+        return self._factors
+
+
 def _make_adata(grid: ArrayLike, n: int, seed) -> List[AnnData]:
     rng = np.random.RandomState(seed)
     X = rng.normal(size=(100, 60))
@@ -1,3 +1,4 @@
+import pickle
 from typing import Optional, Tuple, Type, Union
 
 import pytest
@@ -5,6 +6,8 @@ import pytest
 import jax
 import jax.numpy as jnp
 import numpy as np
+import scipy.sparse as sp
+from ott.geometry import costs
 from ott.geometry.geometry import Geometry
 from ott.geometry.low_rank import LRCGeometry
 from ott.geometry.pointcloud import PointCloud
@@ -17,10 +20,17 @@ from ott.solvers.quadratic.gromov_wasserstein import GromovWasserstein
 from ott.solvers.quadratic.gromov_wasserstein import solve as gromov_wasserstein
 
 from moscot._types import ArrayLike, Device_t
-from moscot.backends.ott import GWSolver, SinkhornSolver
+from moscot.backends.ott import (
+    CompilationCacheInfo,
+    GWSolver,
+    SinkhornSolver,
+    clear_compilation_cache,
+    get_compilation_cache_info,
+)
+from moscot.backends.ott._jit_cache import _CompiledSolverCache, _config_key
 from moscot.base.output import BaseSolverOutput
 from moscot.base.solver import O, OTSolver
-from moscot.utils.tagged_array import Tag
+from moscot.utils.tagged_array import Tag, TaggedArray
 from tests._utils import ATOL, RTOL, Geom_t
 from tests.plotting.conftest import PlotTester, PlotTesterMeta
 
@@ -64,6 +74,107 @@ class TestSinkhorn:
         np.testing.assert_allclose(solver._problem.geom.cost_matrix, problem.geom.cost_matrix, rtol=RTOL, atol=ATOL)
         np.testing.assert_allclose(gt.matrix, pred.transport_matrix, rtol=RTOL, atol=ATOL)
 
+    @pytest.mark.fast()
+    def test_compilation_cache(self, x: Geom_t) -> None:
+        clear_compilation_cache()
+        gt = SinkhornSolver(jit=False)(xy=(x, x), epsilon=1e-1)
+
+        pred1 = SinkhornSolver(threshold=1e-3)(xy=(x, x), epsilon=1e-1)
+        pred2 = SinkhornSolver(threshold=1e-3)(xy=(x + 1.0, x), epsilon=1e-1)
+        info = get_compilation_cache_info()
+        assert info == CompilationCacheInfo(hits=1, misses=1, size=1)
+
+        _ = SinkhornSolver(threshold=1e-2)(xy=(x, x), epsilon=1e-1)
+        _ = SinkhornSolver(threshold=1e-3)(xy=(x[:10], x[:10]), epsilon=1e-1)
+        info = get_compilation_cache_info()
+        assert info == CompilationCacheInfo(hits=1, misses=3, size=3)
+
+        np.testing.assert_allclose(gt.transport_matrix, pred1.transport_matrix, rtol=RTOL, atol=ATOL)
+        assert not np.allclose(pred1.transport_matrix, pred2.transport_matrix)
+        clear_compilation_cache()
+        assert get_compilation_cache_info() == CompilationCacheInfo(hits=0, misses=0, size=0)
+
+    @pytest.mark.fast()
+    def test_compilation_cache_key(self) -> None:
+        # per-solve arguments passed when creating the solver don't change the compiled solver
+        solver1 = SinkhornSolver(threshold=1e-3, epsilon=1e-1, batch_size=8, buckets=16)
+        solver2 = SinkhornSolver(threshold=1e-3, epsilon=1.0, batch_size=None)
+        assert solver1._config == solver2._config
+        assert solver1._config != SinkhornSolver(threshold=1e-2)._config
+        assert hash(solver1._config) == hash(solver2._config)
+
+    @pytest.mark.fast()
+    def test_compilation_cache_config_key(self) -> None:
+        fn1 = lambda x: x  # noqa: E731
+        fn2 = lambda x: x  # noqa: E731
+
+        # callables are compared by identity, not by their `repr`
+        assert _config_key({"fn": fn1}) == _config_key({"fn": fn1})
+        assert _config_key({"fn": fn1}) != _config_key({"fn": fn2})
+        # other objects by their type and attributes
+        assert _config_key(costs.SqEuclidean()) == _config_key(costs.SqEuclidean())
+        assert _config_key(costs.SqEuclidean()) != _config_key(costs.Cosine())
+        assert _config_key(1) != _config_key(1.0)
+
+    @pytest.mark.fast()
+    def test_compilation_cache_lru(self) -> None:
+        cache = _CompiledSolverCache(maxsize=2)
+        fn = lambda x: x + 1  # noqa: E731
+
+        for n in (1, 2, 1, 3, 1, 2):
+            _ = cache("add", fn, jnp.ones(n))
+
+        assert cache.info == CompilationCacheInfo(hits=2, misses=4, size=2)
+
+    @pytest.mark.fast()
+    @pytest.mark.parametrize("buckets", [16, [32, 64]])
+    def test_buckets(self, x: Geom_t, y: Geom_t, buckets: Union[int, Tuple[int, ...]]) -> None:
+        gt = SinkhornSolver()(xy=(x, y), epsilon=1e-1, scale_cost="mean")
+        solver = SinkhornSolver()
+        pred = solver(xy=(x, y), epsilon=1e-1, scale_cost="mean", buckets=buckets)
+
+        assert solver.xy.shape == (32, 32)
+        assert pred.shape == gt.shape == (20, 30)
+        f, g = pred.potentials
+        assert f.shape == (20,)
+        assert g.shape == (30,)
+        np.testing.assert_allclose(gt.transport_matrix, pred.transport_matrix, rtol=RTOL, atol=ATOL)
+        np.testing.assert_allclose(gt.push(np.ones(20)), pred.push(np.ones(20)), rtol=RTOL, atol=ATOL)
+        np.testing.assert_allclose(gt.pull(np.ones((30, 2))), pred.pull(np.ones((30, 2))), rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.fast()
+    def test_sparse_cost_matrix(self, x: Geom_t) -> None:
+        cm = np.array(PointCloud(x).cost_matrix)
+        cm[cm > np.median(cm)] = 0.0
+        gt = SinkhornSolver()(xy=cm, tags={"xy": Tag.COST_MATRIX}, epsilon=1e-1)
+
+        solver = SinkhornSolver()
+        pred_dense = solver(xy=sp.csr_matrix(cm), tags={"xy": Tag.COST_MATRIX}, epsilon=1e-1)
+        assert not isinstance(solver.xy, LRCGeometry)
+        _ = solver(xy=sp.csr_matrix(cm), tags={"xy": Tag.COST_MATRIX}, epsilon=1e-1, n_comps=5)
+        assert isinstance(solver.xy, LRCGeometry)
+        assert solver.xy.cost_1.shape == (len(x), 5)
+
+        np.testing.assert_allclose(gt.transport_matrix, pred_dense.transport_matrix, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.fast()
+    def test_sparse_point_cloud(self, x: Geom_t, y: Geom_t) -> None:
+        rng = np.random.RandomState(0)
+        x = sp.random(len(x), 50, density=0.1, format="csr", random_state=rng)
+        y = sp.random(len(y), 50, density=0.1, format="csr", random_state=rng)
+        gt = SinkhornSolver()(xy=(x.A, y.A), epsilon=1e-1)
+
+        solver = SinkhornSolver()
+        pred = solver(xy=(x, y), epsilon=1e-1)
+        np.testing.assert_allclose(gt.transport_matrix, pred.transport_matrix, rtol=RTOL, atol=ATOL)
+
+        _ = solver(xy=(x, y), epsilon=1e-1, n_comps=10)
+        assert solver.xy.x.shape == (x.shape[0], 10)
+        assert solver.xy.y.shape == (y.shape[0], 10)
+
+        with pytest.raises(ValueError, match=r"only implemented for `cost='sq_euclidean'`"):
+            _ = solver(xy=TaggedArray(x, y, tag=Tag.POINT_CLOUD, cost="cosine"), epsilon=1e-1, n_comps=10)
+
 
 class TestGW:
     @pytest.mark.parametrize("jit", [False, True])
@@ -296,6 +407,66 @@ class TestSolverOutput:
         else:
             np.testing.assert_allclose(p.sum(), z.sum())
 
+    @pytest.mark.parametrize("n_jobs", [None, 2])
+    @pytest.mark.parametrize("forward", [False, True])
+    @pytest.mark.parametrize("rank", [-1, 5])
+    @pytest.mark.parametrize(("epsilon", "scale_cost"), [(None, 1.0), (None, "mean"), (1e-1, "mean")])
+    def test_apply_blockwise(
+        self,
+        x: Geom_t,
+        y: Geom_t,
+        ab: Tuple[ArrayLike, ArrayLike],
+        rank: int,
+        forward: bool,
+        n_jobs: Optional[int],
+        epsilon: Optional[float],
+        scale_cost: Union[float, str],
+    ) -> None:
+        solver = SinkhornSolver(rank=rank)
+        out = solver(xy=(x, y), epsilon=epsilon, scale_cost=scale_cost)
+        a, b = ab
+        z = a if forward else b[: out.shape[1]]
+        fn = out.push if forward else out.pull
+
+        expected = fn(z)
+        actual = fn(z, batch_size=7, n_jobs=n_jobs)
+
+        assert isinstance(actual, np.ndarray)
+        np.testing.assert_allclose(actual, expected, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("n_jobs", [None, 2])
+    @pytest.mark.parametrize(("epsilon", "scale_cost"), [(None, "mean"), (1e-1, "mean")])
+    def test_sparsify_blockwise(
+        self, x: Geom_t, y: Geom_t, n_jobs: Optional[int], epsilon: Optional[float], scale_cost: str
+    ) -> None:
+        solver = SinkhornSolver()
+        out = solver(xy=(x, y), epsilon=epsilon, scale_cost=scale_cost)
+        assert out.shape[0] > 7
+
+        res = out.sparsify(mode="threshold", value=0, batch_size=7, n_jobs=n_jobs)
+
+        np.testing.assert_allclose(res.transport_matrix.toarray(), out.transport_matrix, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("kind", ["low_rank", "kernel"])
+    def test_block_cost(self, x: Geom_t, y: Geom_t, kind: str) -> None:
+        out = SinkhornSolver()(xy=(x, y), epsilon=1e-1)
+        pc = PointCloud(jnp.asarray(x), jnp.asarray(y), epsilon=1e-1)
+        geom = pc.to_LRCGeometry() if kind == "low_rank" else Geometry(kernel_matrix=pc.kernel_matrix, epsilon=1e-1)
+
+        _, actual = out._block_cost(geom, 3, 7, geom.shape[1])
+
+        np.testing.assert_allclose(actual, geom.cost_matrix[3:7], rtol=RTOL, atol=ATOL)
+
+    def test_unpickle_without_shape(self, x: Geom_t) -> None:
+        out = SinkhornSolver()(xy=(x, x), epsilon=1e-1)
+        expected = out.transport_matrix
+        del out.__dict__["_shape"]  # outputs pickled before the unpadded shape was stored
+
+        out = pickle.loads(pickle.dumps(out))
+
+        assert out.shape == expected.shape
+        np.testing.assert_allclose(out.transport_matrix, expected, rtol=RTOL, atol=ATOL)
+
     @pytest.mark.parametrize("device", [None, "cpu", "cpu:0", "cpu:1", "explicit"])
     def test_to_device(self, x: Geom_t, device: Optional[Device_t]) -> None:
         # simple integration test
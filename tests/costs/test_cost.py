@@ -1,2 +1,149 @@
-class TestCost:  # TODO
-    pass
+from typing import Optional
+
+import pytest
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import squareform
+
+from anndata import AnnData
+
+from moscot.costs import (
+    BarcodeDistance,
+    LeafDistance,
+    clear_cost_cache,
+    get_cost_cache_info,
+    set_cost_cache,
+)
+
+
+class TestBarcodeDistance:
+    @staticmethod
+    def _adata(seed: int = 0) -> AnnData:
+        rng = np.random.RandomState(seed)
+        barcodes = rng.choice([-1, 0, 1, 2, 3], size=(37, 8), p=[0.2, 0.3, 0.2, 0.2, 0.1])
+        barcodes[0] = -1  # no measured sites
+        return AnnData(X=np.empty((37, 1)), obsm={"barcodes": barcodes})
+
+    @pytest.mark.parametrize("batch_size", [1, 5, 100])
+    @pytest.mark.parametrize("n_jobs", [None, 2])
+    def test_compute(self, batch_size: int, n_jobs: Optional[int]):
+        adata = self._adata()
+        barcodes = adata.obsm["barcodes"]
+        cost = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")
+
+        expected = np.zeros((adata.n_obs, adata.n_obs))
+        for i in range(adata.n_obs):
+            for j in range(i + 1, adata.n_obs):
+                expected[i, j] = expected[j, i] = BarcodeDistance._scaled_hamming_dist(barcodes[i], barcodes[j])
+        actual = cost._compute(batch_size=batch_size, n_jobs=n_jobs)
+
+        np.testing.assert_allclose(actual, expected)
+
+    def test_condensed_memmap(self, tmp_path):
+        adata = self._adata(1)
+        cost = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")
+        expected = cost._compute()
+
+        actual = cost._compute(batch_size=7, condensed=True, path=tmp_path / "dist.npy")
+
+        assert isinstance(actual, np.memmap)
+        assert (tmp_path / "dist.npy").is_file()
+        np.testing.assert_allclose(squareform(np.asarray(actual), checks=False), expected)
+        np.testing.assert_allclose(np.load(tmp_path / "dist.npy"), actual)
+
+
+class TestLeafDistance:
+    @staticmethod
+    def _adata(n_nodes: int = 60, seed: int = 0) -> AnnData:
+        rng = np.random.RandomState(seed)
+        tree = nx.DiGraph()
+        for node in range(1, n_nodes):
+            tree.add_edge(str(rng.randint(node)), str(node), weight=rng.uniform(0.1, 2.0))
+        leaves = [node for node in tree if tree.out_degree(node) == 0]
+        rng.shuffle(leaves)
+        return AnnData(X=np.empty((len(leaves), 1)), obs=pd.DataFrame(index=leaves), uns={"trees": {"x": tree}})
+
+    @pytest.mark.parametrize("batch_size", [1, 7, 1024])
+    def test_compute(self, batch_size: int):
+        adata = self._adata()
+        tree = adata.uns["trees"]["x"].to_undirected()
+        cost = LeafDistance(adata, attr="uns", key="trees", dist_key="x")
+
+        leaves = cost._get_leaves(tree)
+        expected = np.array([[nx.shortest_path_length(tree, u, v, weight="weight") for v in leaves] for u in leaves])
+        actual = cost._compute(batch_size=batch_size)
+
+        np.testing.assert_allclose(actual, expected)
+
+    def test_unweighted_memmap(self, tmp_path):
+        adata = self._adata(seed=1)
+        tree = adata.uns["trees"]["x"].to_undirected()
+        cost = LeafDistance(adata, attr="uns", key="trees", dist_key="x")
+
+        leaves = cost._get_leaves(tree)
+        expected = np.array([[nx.shortest_path_length(tree, u, v) for v in leaves] for u in leaves])
+        actual = cost._compute(weight="length", batch_size=5, path=tmp_path / "dist.npy")
+
+        assert isinstance(actual, np.memmap)
+        np.testing.assert_allclose(actual, expected)
+
+    def test_unexpected_kwargs(self):
+        cost = LeafDistance(self._adata(), attr="uns", key="trees", dist_key="x")
+
+        _ = cost._compute(n_jobs=2)
+        with pytest.raises(TypeError, match=r"Unexpected keyword arguments `\['cutoff'\]`"):
+            _ = cost._compute(cutoff=1.0)
+
+
+class TestCostCache:
+    def test_cache_disabled(self):
+        clear_cost_cache()
+        adata = TestBarcodeDistance._adata()
+
+        first = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+        second = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+
+        assert get_cost_cache_info() == (0, 0, 0)
+        assert second is not first
+        assert second.flags.writeable
+
+    def test_cache_hit(self):
+        adata = TestBarcodeDistance._adata()
+        try:
+            set_cost_cache(maxsize=4)
+            clear_cost_cache()
+            first = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+            second = BarcodeDistance(adata.copy(), attr="obsm", key="barcodes", dist_key="y")()
+            assert get_cost_cache_info() == (1, 1, 1)
+            assert second is first
+            assert not second.flags.writeable
+
+            # execution options don't change the cost matrix
+            batched = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")(batch_size=3, n_jobs=2)
+            assert get_cost_cache_info() == (2, 1, 1)
+            assert batched is first
+
+            adata.obsm["barcodes"][1, 0] = 5
+            third = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+            assert get_cost_cache_info() == (2, 2, 2)
+            assert get_cost_cache_info().hit_rate == 0.5
+            assert third is not first
+        finally:
+            set_cost_cache(maxsize=0)
+
+    def test_cache_on_disk(self, tmp_path):
+        adata = TestBarcodeDistance._adata()
+        try:
+            set_cost_cache(maxsize=0, path=tmp_path)
+            clear_cost_cache()
+            expected = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+            actual = BarcodeDistance(adata, attr="obsm", key="barcodes", dist_key="x")()
+        finally:
+            set_cost_cache(maxsize=0, path=None)
+
+        assert isinstance(actual, np.memmap)
+        assert len(list(tmp_path.glob("*.npy"))) == 1
+        assert get_cost_cache_info() == (1, 1, 0)
+        np.testing.assert_array_equal(actual, expected)
@@ -5,14 +5,18 @@ import pytest
 from pytest_mock import MockerFixture
 
 import numpy as np
+import scipy.sparse as sp
 from ott.geometry.costs import Cosine, Euclidean, SqEuclidean
 from ott.geometry.pointcloud import PointCloud
 from ott.solvers.linear.sinkhorn import solve as sinkhorn
 from sklearn.metrics.pairwise import euclidean_distances
 
+import scanpy as sc
 from anndata import AnnData
 
+from moscot.base.output import StoredSolverOutput
 from moscot.base.problems import CompoundProblem, OTProblem
+from moscot.base.problems.compound_problem import _PCA_CACHE
 from moscot.utils.tagged_array import Tag, TaggedArray
 from tests._utils import ATOL, RTOL, Problem
 
@@ -67,6 +71,122 @@ class TestCompoundProblem:
             assert isinstance(problem[key], OTProblem)
             assert problem[key].solution is problem.solutions[key]
 
+    def test_update(self, adata_time: AnnData, mocker: MockerFixture):
+        adata = adata_time[adata_time.obs["time"] != 2].copy()
+        problem = Problem(adata).prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        problem = problem.solve(max_iterations=2)
+        sol = problem[0, 1].solution
+        assert set(problem.problems) == {(0, 1)}
+
+        spy = mocker.spy(OTProblem, "solve")
+        spy_prepare = mocker.spy(OTProblem, "prepare")
+        problem = problem.update(adata_time)
+
+        assert problem.adata is adata_time
+        assert set(problem.problems) == {(0, 1), (1, 2)}
+        # kept solutions are rebound to the new data
+        assert problem[0, 1].solution is sol
+        assert problem[0, 1].adata_src.obs_names.equals(adata_time.obs_names[adata_time.obs["time"] == 0])
+        assert problem[1, 2].stage == "solved"
+        assert spy.call_count == 1
+        assert spy.call_args.kwargs["max_iterations"] == 2
+        # only the new problem is prepared
+        assert spy_prepare.call_count == 1
+
+        # a changed time point invalidates its problems
+        adata = adata_time[~((adata_time.obs["time"] == 2) & (np.arange(adata_time.n_obs) % 2 == 0))].copy()
+        problem = problem.update(adata, solve=False)
+        assert problem[0, 1].solution is sol
+        assert problem[1, 2].stage == "prepared"
+        assert problem[1, 2].shape == ((adata.obs["time"] == 1).sum(), (adata.obs["time"] == 2).sum())
+
+        # so do changed features of the same cells
+        adata = adata.copy()
+        adata.X = adata.X * 2.0
+        problem = problem.update(adata, solve=False)
+        assert problem[0, 1].stage == "prepared"
+        assert problem[0, 1].solution is None
+
+    @pytest.mark.parametrize(("n_jobs", "executor"), [(2, "thread"), (2, "process"), (None, "vmap")])
+    def test_solve_executor(self, adata_time: AnnData, n_jobs: Optional[int], executor: str):
+        expected = Problem(adata_time)
+        expected = expected.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        expected = expected.solve(epsilon=1e-1, max_iterations=100)
+
+        problem = Problem(adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        problem = problem.solve(epsilon=1e-1, max_iterations=100, n_jobs=n_jobs, executor=executor)
+
+        assert problem.failed_problems == {}
+        assert set(problem.solutions.keys()) == set(expected.solutions.keys())
+        for key, prob in problem.problems.items():
+            assert prob.stage == "solved"
+            np.testing.assert_allclose(
+                prob.solution.transport_matrix,
+                expected[key].solution.transport_matrix,
+                rtol=RTOL,
+                atol=ATOL,
+            )
+
+    def test_solve_vmap_warm_start(self, adata_time: AnnData, mocker: MockerFixture):
+        from moscot.backends.ott import SinkhornSolver
+
+        problem = Problem(adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        problem = problem.solve(epsilon=1e-1, max_iterations=100)
+        potentials = {key: sol.potentials for key, sol in problem.solutions.items()}
+        spy = mocker.spy(SinkhornSolver, "_prepare")
+
+        problem = problem.solve(epsilon=1e-1, max_iterations=100, executor="vmap", warm_start=True)
+
+        assert problem.failed_problems == {}
+        assert spy.call_count == len(potentials)
+        inits = [call.kwargs["init"] for call in spy.call_args_list]
+        for f, g in potentials.values():
+            assert any(np.array_equal(f, init[0]) and np.array_equal(g, init[1]) for init in inits)
+
+    @pytest.mark.fast()
+    def test_solve_collects_failures(self, adata_time: AnnData, mocker: MockerFixture):
+        problem = Problem(adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        failing = problem[0, 1]
+        mocker.patch.object(failing, attribute="solve", side_effect=ValueError("sentinel"))
+
+        problem = problem.solve(max_iterations=2)
+
+        assert list(problem.failed_problems.keys()) == [(0, 1)]
+        assert isinstance(problem.failed_problems[0, 1], ValueError)
+        assert problem[0, 1].stage == "prepared"
+        assert problem[1, 2].stage == "solved"
+
+    @pytest.mark.fast()
+    def test_solve_raises_bugs(self, adata_time: AnnData, mocker: MockerFixture):
+        problem = Problem(adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+        mocker.patch.object(problem[0, 1], attribute="solve", side_effect=TypeError("sentinel"))
+
+        with pytest.raises(TypeError, match="sentinel"):
+            problem.solve(max_iterations=2)
+
+    def test_sweep(self, adata_time: AnnData):
+        grid = {"epsilon": [1e-2, 1e-1], "tau_a": [1.0, 0.9]}
+        problem = Problem(adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time", policy="sequential")
+
+        res = problem.sweep(grid, validation=lambda p, key: p[key].solution.cost, n_jobs=2)
+
+        assert len(res) == 2 * 4
+        assert res["epsilon"].tolist()[:2] == [1e-1, 1e-1]  # solved in decreasing order
+        for col in ["source", "target", "epsilon", "tau_a", "cost", "converged", "n_iters", "validation", "best"]:
+            assert col in res.columns
+        assert res.groupby(["source", "target"])["best"].sum().tolist() == [1, 1]
+        for (src, tgt), df in res.groupby(["source", "target"]):
+            best = df[df["best"]].iloc[0]
+            converged = df[df["converged"]]
+            assert best["validation"] == converged["validation"].min()
+            assert problem[src, tgt].stage == "solved"
+            np.testing.assert_allclose(problem[src, tgt].solution.cost, best["cost"], rtol=RTOL, atol=ATOL)
+
     @pytest.mark.parametrize("scale", [True, False])
     @pytest.mark.fast()
     def test_default_callback(self, adata_time: AnnData, mocker: MockerFixture, scale: bool):
@@ -107,6 +227,65 @@ class TestCompoundProblem:
 
         assert spy.call_count == len(expected_keys)
 
+    @pytest.mark.fast()
+    @pytest.mark.parametrize("sparse", [False, True])
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_cost_matrix_callback(self, adata_time: AnnData, sparse: bool, shuffle: bool):
+        rng = np.random.RandomState(0)
+        if shuffle:  # otherwise, the cells of each time point are contiguous
+            adata_time = adata_time[rng.permutation(adata_time.n_obs)].copy()
+        cost = rng.uniform(size=(adata_time.n_obs, adata_time.n_obs))
+        adata_time.obsp["cost"] = sp.csr_matrix(cost) if sparse else cost
+
+        problem = Problem(adata=adata_time)
+        problem = problem.prepare(
+            xy=None,
+            key="time",
+            policy="sequential",
+            xy_callback="cost-matrix",
+            xy_callback_kwargs={"key": "cost", "n_jobs": 2},
+        )
+
+        assert set(problem.problems.keys()) == {(0, 1), (1, 2)}
+        for (src, tgt), prob in problem.problems.items():
+            src_mask, tgt_mask = adata_time.obs["time"] == src, adata_time.obs["time"] == tgt
+            data = prob.xy.data_src
+            assert sp.issparse(data) == sparse
+            np.testing.assert_array_equal(data.A if sparse else data, cost[np.ix_(src_mask, tgt_mask)])
+
+    @pytest.mark.fast()
+    @pytest.mark.parametrize("fit", ["global", "category"])
+    def test_shared_pca_callback(self, adata_time: AnnData, mocker: MockerFixture, fit: Literal["global", "category"]):
+        _PCA_CACHE.clear()
+        spy = mocker.spy(sc.pp, "pca")
+        kwargs = {
+            "xy": None,
+            "x": {"attr": "X"},
+            "y": {"attr": "X"},
+            "key": "time",
+            "policy": "sequential",
+            "xy_callback": "shared-pca",
+            "x_callback": "shared-pca",
+            "y_callback": "shared-pca",
+            "xy_callback_kwargs": {"n_comps": 5},
+            "x_callback_kwargs": {"n_comps": 5, "fit": fit},
+            "y_callback_kwargs": {"n_comps": 5, "fit": fit},
+        }
+
+        problem = Problem(adata=adata_time).prepare(**kwargs)
+
+        # one global PCA, and one PCA per time point when fitting per category
+        assert spy.call_count == (1 if fit == "global" else 4)
+        p01, p12 = problem[0, 1], problem[1, 2]
+        assert p01.xy.data_src.shape == (p01.adata_src.n_obs, 5)
+        np.testing.assert_array_equal(p01.xy.data_tgt, p12.xy.data_src)
+        np.testing.assert_array_equal(p01.y.data_src, p12.x.data_src)
+        if fit == "global":
+            np.testing.assert_array_equal(p01.x.data_src, p01.xy.data_src)
+
+        _ = Problem(adata=adata_time).prepare(**kwargs)
+        assert spy.call_count == (1 if fit == "global" else 4)
+
     @pytest.mark.fast()
     def test_custom_callback_quad(self, adata_time: AnnData, mocker: MockerFixture):
         expected_keys = [(0, 1), (1, 2)]
@@ -267,3 +446,64 @@ class TestCompoundProblem:
 
         p = Problem.load(file)
         assert isinstance(p, Problem)
+
+    def test_save_load_hdf5(self, adata_time: AnnData, tmp_path):
+        problem = Problem(adata=adata_time)
+        problem = problem.prepare(xy={"x_attr": "X", "y_attr": "X"}, key="time")
+        problem = problem.solve(max_iterations=10)
+        problem.save(dir_path=str(tmp_path), file_prefix="test_save_load", format="hdf5")
+
+        dir_path = tmp_path / "test_save_load_Problem"
+        assert (dir_path / "solutions.h5").is_file()
+        # the data of the subproblems is stored as indices into `adata`
+        assert sorted(f.name for f in dir_path.glob("*.h5ad")) == ["adata.h5ad"]
+        # the original problem is unchanged
+        assert problem.adata is adata_time
+        for subproblem in problem.problems.values():
+            assert not isinstance(subproblem.solution, StoredSolverOutput)
+            assert subproblem.xy is not None
+
+        p = Problem.load(str(dir_path), adatas={"adata": adata_time})
+        assert isinstance(p, Problem)
+        assert p.adata is adata_time
+        for key, subproblem in p.problems.items():
+            expected = problem[key].solution
+            assert isinstance(subproblem.solution, StoredSolverOutput)
+            np.testing.assert_array_equal(subproblem.adata_src.obs_names, problem[key].adata_src.obs_names)
+            np.testing.assert_array_equal(subproblem.adata_src.X.A, problem[key].adata_src.X.A)
+            assert subproblem.solution.shape == expected.shape
+            np.testing.assert_allclose(subproblem.solution.cost, expected.cost, rtol=RTOL, atol=ATOL)
+            np.testing.assert_allclose(
+                subproblem.solution.transport_matrix, expected.transport_matrix, rtol=RTOL, atol=ATOL
+            )
+            np.testing.assert_allclose(subproblem.solution.a, expected.a, rtol=RTOL, atol=ATOL)
+            np.testing.assert_allclose(subproblem.solution.b, expected.b, rtol=RTOL, atol=ATOL)
+            x = np.random.RandomState(0).normal(size=(expected.shape[0], 3))
+            np.testing.assert_allclose(subproblem.solution.push(x), expected.push(x), rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("rank", [-1, 5])
+    @pytest.mark.parametrize("forward", [True, False])
+    @pytest.mark.parametrize("scale_by_marginals", [True, False])
+    def test_transport_operator_cache(self, adata_time: AnnData, forward: bool, rank: int, scale_by_marginals: bool):
+        problem = Problem(adata=adata_time)
+        problem = problem.prepare(
+            xy={"x_attr": "obsm", "x_key": "X_pca", "y_attr": "obsm", "y_key": "X_pca"},
+            key="time",
+            policy="sequential",
+        )
+        problem = problem.solve(rank=rank, max_iterations=10)
+        source, target = (0, 2) if forward else (2, 0)
+        fn = problem.push if forward else problem.pull
+
+        kwargs = {"source": source, "target": target, "scale_by_marginals": scale_by_marginals}
+        expected = fn(return_all=True, **kwargs)[target]
+        actual = fn(**kwargs)
+        np.testing.assert_allclose(np.asarray(actual), np.asarray(expected), rtol=RTOL, atol=ATOL)
+
+        path = [(0, 1), (1, 2)]
+        op = problem._transport_operator(path)
+        assert problem._transport_operator(path) is op
+        assert problem._transport_operator(path, scale_by_marginals=True) is not op
+
+        problem[0, 1].solve(rank=rank, max_iterations=10)
+        assert problem._transport_operator(path) is not op
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Literal
 
 import pytest
@@ -8,10 +9,12 @@ import pandas as pd
 from ott.geometry.pointcloud import PointCloud
 from ott.solvers.linear.sinkhorn import solve as sinkhorn
 
+import anndata as ad
 from anndata import AnnData
 
 from moscot.base.output import BaseSolverOutput
 from moscot.base.problems import OTProblem
+from moscot.utils.tagged_array import LazyArray
 from tests._utils import ATOL, RTOL, Geom_t, MockSolverOutput
 
 
@@ -46,6 +49,46 @@ class TestOTProblem:
 
         np.testing.assert_allclose(gt.matrix, sol.transport_matrix, rtol=RTOL, atol=ATOL)
 
+    @pytest.mark.fast()
+    def test_warm_start(self, adata_x: AnnData):
+        # both plans are only as accurate as the convergence `threshold`
+        eps, threshold = 5e-2, 1e-8
+        prob = OTProblem(adata_x).prepare(xy={"x_attr": "X", "y_attr": "X"})
+        cold = prob.solve(epsilon=eps, threshold=threshold, inner_iterations=1).solution
+
+        warm = prob.solve(epsilon=eps, threshold=threshold, inner_iterations=1, warm_start=True).solution
+
+        assert warm.converged
+        assert warm._output.n_iters < cold._output.n_iters
+        np.testing.assert_allclose(cold.transport_matrix, warm.transport_matrix, rtol=1e-5, atol=1e-7)
+
+    def test_epsilon_schedule(self, adata_x: AnnData):
+        eps, threshold = 1e-2, 1e-8
+        gt = OTProblem(adata_x).prepare(xy={"x_attr": "X", "y_attr": "X"}).solve(epsilon=eps, threshold=threshold)
+
+        prob = OTProblem(adata_x).prepare(xy={"x_attr": "X", "y_attr": "X"})
+        prob = prob.solve(epsilon=eps, threshold=threshold, epsilon_schedule=[1.0, 1e-1])
+
+        assert prob.solution.converged
+        np.testing.assert_allclose(gt.solution.transport_matrix, prob.solution.transport_matrix, rtol=1e-5, atol=1e-7)
+
+    @pytest.mark.fast()
+    def test_lazy_point_cloud(self, adata_x: AnnData, adata_y: AnnData, tmp_path: Path):
+        adata_x.write_h5ad(tmp_path / "adata_x.h5ad")
+        backed = ad.read_h5ad(tmp_path / "adata_x.h5ad", backed="r")
+        gt = OTProblem(adata_x, adata_y).prepare(xy={"x_attr": "X", "y_attr": "X"}).solve(epsilon=5e-1)
+
+        prob = OTProblem(backed, adata_y).prepare(xy={"x_attr": "X", "y_attr": "X", "x_lazy": True})
+        assert isinstance(prob.xy.data_src, LazyArray)
+        assert prob.xy.data_src.shape == adata_x.shape
+        assert prob.xy.shape == (adata_x.n_obs, adata_y.n_obs)
+        dense = prob.xy.data_src.materialize(dtype=np.float32)
+        assert dense.dtype == np.float32
+        np.testing.assert_allclose(dense, np.asarray(adata_x.X, dtype=np.float32))
+        prob = prob.solve(epsilon=5e-1)
+
+        np.testing.assert_allclose(gt.solution.transport_matrix, prob.solution.transport_matrix, rtol=RTOL, atol=ATOL)
+
     @pytest.mark.parametrize("tag", ["cost_matrix", "kernel"])
     def test_set_xy(self, adata_x: AnnData, adata_y: AnnData, tag: Literal["cost_matrix", "kernel"]):
         rng = np.random.RandomState(42)
@@ -8,7 +8,13 @@ from scipy.sparse.linalg import LinearOperator
 
 from anndata import AnnData
 
-from tests._utils import ATOL, RTOL, CompoundProblemWithMixin, MockSolverOutput
+from tests._utils import (
+    ATOL,
+    RTOL,
+    CompoundProblemWithMixin,
+    MockLowRankSolverOutput,
+    MockSolverOutput,
+)
 
 
 class TestBaseAnalysisMixin:
@@ -66,6 +72,51 @@ class TestBaseAnalysisMixin:
             assert isinstance(result[1][0], np.ndarray)
             assert len(np.concatenate(result[1])) == n_samples
 
+    @pytest.mark.parametrize("jax_key", [False, True])
+    def test_sample_from_tmap_distribution(self, gt_temporal_adata: AnnData, jax_key: bool):
+        import jax
+
+        tmap = gt_temporal_adata.uns["tmap_10_105"]
+        source_dim, target_dim = tmap.shape
+        problem = CompoundProblemWithMixin(gt_temporal_adata)
+        problem = problem.prepare("day", subset=[(10, 10.5)], policy="sequential", xy_callback="local-pca")
+        problem[10, 10.5]._solution = MockSolverOutput(tmap)
+        n_samples = 50_000
+
+        rows, cols = problem._sample_from_tmap(
+            10,
+            10.5,
+            n_samples,
+            source_dim=source_dim,
+            target_dim=target_dim,
+            batch_size=17,
+            seed=jax.random.PRNGKey(0) if jax_key else 0,
+        )
+
+        assert len(rows) == len(cols)
+        counts = np.zeros_like(tmap)
+        np.add.at(counts, (np.repeat(rows, [len(c) for c in cols]), np.concatenate(cols)), 1)
+        np.testing.assert_allclose(counts / n_samples, tmap / tmap.sum(), atol=1e-2)
+
+    def test_sample_from_tmap_low_rank(self, gt_temporal_adata: AnnData):
+        source_dim, target_dim = gt_temporal_adata.uns["tmap_10_105"].shape
+        rng = np.random.RandomState(42)
+        q, r = rng.uniform(size=(source_dim, 2)), rng.uniform(size=(target_dim, 2))
+        solution = MockLowRankSolverOutput(q, r, q.sum(0))
+        tmap = solution.transport_matrix
+        problem = CompoundProblemWithMixin(gt_temporal_adata)
+        problem = problem.prepare("day", subset=[(10, 10.5)], policy="sequential", xy_callback="local-pca")
+        problem[10, 10.5]._solution = solution
+
+        rows, cols = problem._sample_from_tmap(
+            10, 10.5, n_samples=50_000, source_dim=source_dim, target_dim=target_dim, seed=0
+        )
+
+        assert len(rows) == len(cols)
+        counts = np.zeros_like(tmap)
+        np.add.at(counts, (np.repeat(rows, [len(c) for c in cols]), np.concatenate(cols)), 1)
+        np.testing.assert_allclose(counts / 50_000, tmap / tmap.sum(), atol=1e-2)
+
     @pytest.mark.parametrize("forward", [True, False])
     @pytest.mark.parametrize("scale_by_marginals", [True, False])
     def test_interpolate_transport(self, gt_temporal_adata: AnnData, forward: bool, scale_by_marginals: bool):
@@ -124,6 +175,86 @@ class TestBaseAnalysisMixin:
             ctr_ordered.values.astype(float), df_res_ordered.values.astype(float), rtol=RTOL, atol=ATOL
         )
 
+    @pytest.mark.parametrize("forward", [True, False])
+    def test_cell_transition_aggregation_annotation(self, gt_temporal_adata: AnnData, forward: bool):
+        problem = CompoundProblemWithMixin(gt_temporal_adata)
+        problem = problem.prepare("day", subset=[(10, 10.5)], policy="explicit", xy_callback="local-pca")
+        tmap = gt_temporal_adata.uns["tmap_10_105"]
+        problem[10, 10.5]._solution = MockSolverOutput(tmap)
+
+        ctr = problem._cell_transition(
+            key="day",
+            source=10,
+            target=10.5,
+            source_groups="cell_type",
+            target_groups="cell_type",
+            forward=forward,
+            aggregation_mode="annotation",
+        )
+
+        early = gt_temporal_adata[gt_temporal_adata.obs["day"] == 10].obs["cell_type"].values
+        late = gt_temporal_adata[gt_temporal_adata.obs["day"] == 10.5].obs["cell_type"].values
+        expected = pd.DataFrame(
+            [[tmap[np.ix_(early == ct_1, late == ct_2)].sum() for ct_2 in ctr.columns] for ct_1 in ctr.index],
+            index=ctr.index,
+            columns=ctr.columns,
+        )
+        expected = expected.div(expected.sum(axis=1 if forward else 0), axis=0 if forward else 1)
+
+        np.testing.assert_allclose(ctr.values.astype(float), expected.values, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("forward", [True, False])
+    def test_cell_transition_aggregation_annotation_low_rank(self, gt_temporal_adata: AnnData, forward: bool):
+        problem = CompoundProblemWithMixin(gt_temporal_adata)
+        problem = problem.prepare("day", subset=[(10, 10.5)], policy="explicit", xy_callback="local-pca")
+        n, m = gt_temporal_adata.uns["tmap_10_105"].shape
+        rng = np.random.RandomState(0)
+        q, r = rng.uniform(size=(n, 3)), rng.uniform(size=(m, 3))
+        lr_solution = MockLowRankSolverOutput(q, r, q.sum(0))
+        kwargs = {
+            "key": "day",
+            "source": 10,
+            "target": 10.5,
+            "source_groups": "cell_type",
+            "target_groups": "cell_type",
+            "forward": forward,
+            "aggregation_mode": "annotation",
+        }
+
+        problem[10, 10.5]._solution = MockSolverOutput(lr_solution.transport_matrix)
+        expected = problem._cell_transition(**kwargs)
+        problem[10, 10.5]._solution = lr_solution
+        actual = problem._cell_transition(**kwargs)
+
+        np.testing.assert_allclose(actual.values.astype(float), expected.values.astype(float), rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("forward", [True, False])
+    def test_cell_transition_aggregation_cell_memmap(self, gt_temporal_adata: AnnData, forward: bool, tmp_path):
+        problem = CompoundProblemWithMixin(gt_temporal_adata)
+        problem = problem.prepare("day", subset=[(10, 10.5)], policy="explicit", xy_callback="local-pca")
+        problem[10, 10.5]._solution = MockSolverOutput(gt_temporal_adata.uns["tmap_10_105"])
+        kwargs = {
+            "key": "day",
+            "source": 10,
+            "target": 10.5,
+            "source_groups": "cell_type",
+            "target_groups": "cell_type",
+            "forward": forward,
+            "aggregation_mode": "cell",
+            "batch_size": 7,
+        }
+
+        expected = problem._cell_transition(**kwargs)
+        actual = problem._cell_transition(**kwargs, memmap_path=tmp_path / "ctr.npy")
+
+        assert (tmp_path / "ctr.npy").is_file()
+        pd.testing.assert_frame_equal(actual, expected)
+        # the result is not copied into memory
+        values = actual.to_numpy()
+        while not isinstance(values, np.memmap) and isinstance(values.base, np.ndarray):
+            values = values.base
+        assert isinstance(values, np.memmap)
+
     def test_cell_transition_aggregation_cell_backward(self, gt_temporal_adata: AnnData):
         # the method used in this test does the same but has to instantiate the transport matrix
         config = gt_temporal_adata.uns
@@ -359,3 +490,32 @@ class TestBaseAnalysisMixin:
 
         assert np.all(res_narrow[f"{key_added}_ci_low"] >= res_wide[f"{key_added}_ci_low"])
         assert np.all(res_narrow[f"{key_added}_ci_high"] <= res_wide[f"{key_added}_ci_high"])
+
+    @pytest.mark.parametrize("corr_method", ["pearson", "spearman"])
+    def test_compute_feature_correlation_sparse(self, adata_time: AnnData, corr_method: Literal["pearson", "spearman"]):
+        from scipy.sparse import csr_matrix
+        from scipy.stats import pearsonr, spearmanr
+
+        key_added = "test"
+        rng = np.random.RandomState(42)
+        adata_time = adata_time[adata_time.obs["time"].isin((0, 1))].copy()
+        X = adata_time.X.toarray()
+        X[np.abs(X) < 0.5] = 0.0  # introduce ties at zero
+        adata_time.X = csr_matrix(X)
+        n0 = adata_time[adata_time.obs["time"] == 0].n_obs
+        n1 = adata_time[adata_time.obs["time"] == 1].n_obs
+        tmap = rng.uniform(1e-6, 1, size=(n0, n1))
+        problem = CompoundProblemWithMixin(adata_time)
+        problem = problem.prepare("time", xy_callback="local-pca")
+        problem[0, 1]._solution = MockSolverOutput(tmap / tmap.sum())
+        adata_time.obs[key_added] = np.hstack((np.zeros(n0), problem.pull(source=0, target=1).squeeze()))
+
+        res_sparse = problem.compute_feature_correlation(obs_key=key_added, corr_method=corr_method)
+        adata_time.X = X
+        res_dense = problem.compute_feature_correlation(obs_key=key_added, corr_method=corr_method)
+
+        corr_fn = pearsonr if corr_method == "pearson" else spearmanr
+        y = adata_time.obs[key_added].values
+        expected = [corr_fn(X[:, adata_time.var_names.get_loc(f)], y)[0] for f in res_sparse.index]
+        np.testing.assert_allclose(res_sparse[f"{key_added}_corr"], expected, rtol=1e-5, atol=1e-8)
+        pd.testing.assert_frame_equal(res_sparse, res_dense.loc[res_sparse.index], rtol=1e-5, atol=1e-8)
@@ -1,2 +1,42 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from moscot.utils.subset_policy import ExternalStarPolicy, SequentialPolicy
+
+
 class TestSubsetPolicy:
-    pass
+    @pytest.fixture()
+    def data(self) -> pd.Series:
+        rng = np.random.RandomState(0)
+        data = pd.Series(rng.choice(["a", "b", "c"], size=50))
+        data[rng.choice(50, size=5, replace=False)] = np.nan
+        return data
+
+    def test_indices(self, data: pd.Series):
+        policy = SequentialPolicy(data)()
+
+        for value in ("a", "b", "c", ["a", "c"]):
+            expected = np.where(data.isin(value if isinstance(value, list) else [value]))[0]
+            np.testing.assert_array_equal(policy.indices(value), expected)
+            np.testing.assert_array_equal(policy.create_mask(value), data.isin(np.atleast_1d(value)).values)
+        # the indices are computed only once
+        assert policy.indices("a") is policy.indices("a")
+
+    def test_indices_empty(self, data: pd.Series):
+        policy = SequentialPolicy(data)()
+
+        with pytest.raises(ValueError, match=r"Unable to construct an empty mask"):
+            policy.indices("d")
+        assert policy.indices("d", allow_empty=True).shape == (0,)
+        assert not policy.create_mask("d", allow_empty=True).any()
+
+    def test_create_masks_external(self, data: pd.Series):
+        policy = ExternalStarPolicy(data)()
+
+        masks = policy.create_masks()
+        assert len(masks) == 3
+        for (src, _), (src_mask, tgt_mask) in masks.items():
+            np.testing.assert_array_equal(src_mask, (data == src).values)
+            assert not tgt_mask.any()
@@ -174,6 +174,36 @@ class TestTemporalMixin:
         batch_distance = problem.compute_batch_distances(time=1, batch_key="batch", epsilon=10)
         assert batch_distance > 0
 
+    def test_batch_distances_pairwise(self, adata_time: AnnData):
+        from moscot.backends.ott._utils import _compute_sinkhorn_divergence
+
+        problem = TemporalProblem(adata_time)
+        problem.prepare("time")
+
+        dist = problem.compute_batch_distances(time=1, batch_key="batch", pairwise=True, epsilon=10)
+        assert isinstance(dist, pd.DataFrame)
+        batches = adata_time[adata_time.obs["time"] == 1].obs["batch"].unique()
+        assert set(dist.index) == set(dist.columns) == set(batches)
+        np.testing.assert_array_equal(np.diag(dist), 0.0)
+        np.testing.assert_allclose(dist.values, dist.values.T)
+
+        # the jointly computed distances match the ones of the single pairs
+        data, adata = problem._get_data(1, posterior_marginals=True, only_start=True)
+        b1, b2 = dist.index[:2]
+        expected = _compute_sinkhorn_divergence(
+            data[(adata.obs["batch"] == b1).values], data[(adata.obs["batch"] == b2).values], epsilon=10
+        )
+        np.testing.assert_allclose(dist.loc[b1, b2], expected, rtol=1e-5)
+
+        mean = problem.compute_batch_distances(time=1, batch_key="batch", epsilon=10)
+        np.testing.assert_allclose(mean, dist.values[np.triu_indices(len(dist), 1)].mean(), rtol=1e-6)
+
+        # solving fewer pairs at a time doesn't change the distances
+        chunked = problem.compute_batch_distances(
+            time=1, batch_key="batch", pairwise=True, epsilon=10, pair_batch_size=2
+        )
+        np.testing.assert_allclose(chunked.values, dist.values, rtol=1e-6)
+
     @pytest.mark.parametrize("account_for_unbalancedness", [True, False])
     def test_compute_interpolated_distance_pipeline(self, gt_temporal_adata: AnnData, account_for_unbalancedness: bool):
         config = gt_temporal_adata.uns
@@ -235,3 +235,18 @@ class TestTemporalNeuralProblem:
         marginal = result.sum(axis=forward == 1).values
         present_cell_type_marginal = marginal[marginal > 0]
         np.testing.assert_almost_equal(present_cell_type_marginal, np.ones(len(present_cell_type_marginal)), decimal=5)
+
+    @pytest.mark.parametrize("forward", [True, False])
+    def test_cell_transition_streamed(self, gt_temporal_adata: ad.AnnData, forward: bool):
+        config = gt_temporal_adata.uns
+        key, key_1, key_2 = config["key"], config["key_1"], config["key_2"]
+        problem = TemporalNeuralProblem(gt_temporal_adata)
+        problem = problem.prepare(key)
+        problem = problem.solve(**neuraldual_args_1)
+
+        # the projected transport matrix is not computed, it is aggregated batch by batch
+        streamed = problem.cell_transition(key_1, key_2, "cell_type", "cell_type", forward=forward, batch_size=7)
+        problem[key_1, key_2].project_transport_matrix(forward=forward, save_transport_matrix=True, batch_size=7)
+        expected = problem.cell_transition(key_1, key_2, "cell_type", "cell_type", forward=forward)
+
+        pd.testing.assert_frame_equal(streamed, expected, check_exact=False, atol=1e-6)
@@ -5,7 +5,7 @@ import pytest
 import numpy as np
 import scipy.sparse as sp
 
-from moscot.base.output import MatrixSolverOutput
+from moscot.base.output import BaseSolverOutput, MatrixSolverOutput
 from tests._utils import ATOL, RTOL, MockSolverOutput
 
 
@@ -83,3 +83,44 @@ class TestBaseSolverOutput:
         assert isinstance(pull1, np.ndarray)
         if threshold < 100:
             np.testing.assert_array_less(0.5, np.corrcoef(pull1.squeeze(), pull2.squeeze())[0, 1])
+
+    @pytest.mark.parametrize("k", [1, 3, 200])
+    @pytest.mark.parametrize("shape", [(7, 2), (91, 103)])
+    def test_sparsify_top_k(self, k: int, shape: Tuple[int, int]) -> None:
+        rng = np.random.RandomState(42)
+        tmap = np.abs(rng.rand(shape[0], shape[1])) + 1e-3  # make sure it's not 0
+        output = MockSolverOutput(tmap)
+        mso = output.sparsify(mode="top_k", k=k, batch_size=4)
+        res = mso.transport_matrix
+        assert isinstance(res, sp.csr_matrix)
+        assert res.shape == shape
+        np.testing.assert_array_equal(res.getnnz(axis=1), min(k, shape[1]))
+        np.testing.assert_allclose(res.max(axis=1).A.squeeze(), tmap.max(axis=1), rtol=RTOL, atol=ATOL)
+        expected = -np.sort(-tmap, axis=1)[:, : min(k, shape[1])].sum(axis=1)
+        np.testing.assert_allclose(res.sum(axis=1).A.squeeze(), expected, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize("mode", ["min_row", "top_k"])
+    def test_sparsify_to_disk(self, mode: str, tmp_path) -> None:
+        rng = np.random.RandomState(0)
+        tmap = np.abs(rng.rand(91, 103)) + 1e-3
+        output = MockSolverOutput(tmap)
+        expected = output.sparsify(mode=mode, k=5, batch_size=8).transport_matrix
+
+        mso = output.sparsify(mode=mode, k=5, batch_size=8, n_jobs=2, path=tmp_path)
+        res = mso.transport_matrix
+        assert isinstance(res, sp.csr_matrix)
+        assert not res.data.flags.owndata  # memory-mapped
+        assert (tmp_path / "data.bin").is_file()
+        np.testing.assert_array_equal(res.indptr, expected.indptr)
+        np.testing.assert_array_equal(res.indices, expected.indices)
+        np.testing.assert_allclose(res.data, expected.data, rtol=RTOL, atol=ATOL)
+
+    @pytest.mark.parametrize(("start", "stop"), [(0, 4), (3, 7), (88, 91)])
+    def test_transport_block_fallback(self, start: int, stop: int) -> None:
+        tmap = np.abs(np.random.RandomState(0).rand(91, 103))
+        output = MockSolverOutput(tmap)
+        # outputs which don't override it push the indicators of the rows
+        res = BaseSolverOutput._transport_block(output, start, stop)
+
+        assert res.shape == (stop - start, 103)
+        np.testing.assert_allclose(res, tmap[start:stop], rtol=RTOL, atol=ATOL)